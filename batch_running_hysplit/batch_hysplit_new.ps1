@@ -5,6 +5,15 @@ $HYSPLIT_EXEC = "C:\hysplit\exec\hyts_std.exe"
 $METEO_DIR = "G:\ERA5_pressure_levels"
 $TRAJ_BASE_DIR = "G:\traj"
 
+# 任务台账和磁盘预算：用完的 .arl 在台账中标记为 consumed，由 disk_budget.py 在空间不足时按顺序删除
+$DOWNLOAD_SCRIPTS = "..\download_scripts"
+$LEDGER_DB = Join-Path $METEO_DIR "download_ledger.sqlite"
+$DISK_BUDGET_GB = 2000
+$MIN_FREE_GB = 50
+
+# 轨迹时长（小时，负数为后向）；气象文件由 arl_index.py 按起始时间和时长挑选
+$RUN_HOURS = -240
+
 # 定义阶段（每阶段四个月）
 $phases = @(
     @{ StartMonth = 1; EndMonth = 4 },
@@ -53,19 +62,18 @@ foreach ($year in $years) {  # 修改: 原为 1971..1973，现改为使用年份
             $controlContent += "33.880 109.000     0.5"
             $controlContent += "32.480 109.540     0.5"
             $controlContent += "32.100 111.300     0.5"
-            $controlContent += "-240"
+            $controlContent += "$RUN_HOURS"
             $controlContent += "0"
             $controlContent += "10000.0"
-            $controlContent += "12"
-
-            # 添加气象数据文件路径（每月三个文件，共四个月）
-            for ($i = $startMonth; $i -le $endMonth; $i++) {
-                $monthStr = "{0:D2}" -f $i
-                for ($j = 1; $j -le 3; $j++) {
-                    $controlContent += "$METEO_DIR\"
-                    $controlContent += "north_6h_${year}_${monthStr}_p$j.arl"
-                }
+
+            # 添加气象数据文件（文件数和每个文件的目录、文件名），只列出这次运行覆盖到的文件
+            $metLines = python "$DOWNLOAD_SCRIPTS\arl_index.py" plan --folder $METEO_DIR --start ($currentTime.ToString("yyyy-MM-dd HH")) --hours $RUN_HOURS --control
+            if ($LASTEXITCODE -ne 0) {
+                Write-Host "***SKIPPED***:$tag (missing meteorology)"
+                $currentTime = $currentTime.Add($interval)
+                continue
             }
+            $controlContent += $metLines
 
             # 添加输出目录和文件名
             $TRAJ_DIR = Join-Path $TRAJ_BASE_DIR $year
@@ -115,13 +123,20 @@ foreach ($year in $years) {  # 修改: 原为 1971..1973，现改为使用年份
                     }
                 }
                 if (-not $shouldKeep) {
-                    $fileToDelete = Join-Path $METEO_DIR "north_6h_${year}_${monthStr}_p$j.arl"
-                    if (Test-Path $fileToDelete) {
-                        Remove-Item $fileToDelete -Force
-                        Write-Host "Deleted: $fileToDelete"
+                    # 标记为已使用；台账中没有该分块时按原来的方式直接删除
+                    python "$DOWNLOAD_SCRIPTS\task_ledger.py" --db $LEDGER_DB set-chunk-state "${year}_${monthStr}_p$j" consumed
+                    if ($LASTEXITCODE -ne 0) {
+                        $fileToDelete = Join-Path $METEO_DIR "north_6h_${year}_${monthStr}_p$j.arl"
+                        if (Test-Path $fileToDelete) {
+                            Remove-Item $fileToDelete -Force
+                            Write-Host "Deleted: $fileToDelete"
+                        }
                     }
                 }
             }
         }
+
+        # 按磁盘预算删除已用过的 GRIB/ARL
+        python "$DOWNLOAD_SCRIPTS\disk_budget.py" --folder $METEO_DIR --budget-gb $DISK_BUDGET_GB --min-free-gb $MIN_FREE_GB evict
     }
 }
@@ -4,6 +4,10 @@ $HYSPLIT_EXEC = "C:\hysplit\exec\hyts_std.exe"
 # 设置气象数据和轨迹输出的基本目录
 $METEO_DIR = "G:\ERA5_pressure_levels"
 $TRAJ_BASE_DIR = "G:\traj"
+$DOWNLOAD_SCRIPTS = "..\download_scripts"
+
+# 轨迹时长（小时，负数为后向）；气象文件由 arl_index.py 按起始时间和时长挑选
+$RUN_HOURS = -240
 
 # 创建输出目录（如果不存在）
 foreach ($year in 1971..1973) {
@@ -52,27 +56,18 @@ foreach ($year in 1971..1973) {
             $controlContent += "33.880 109.000     0.5"
             $controlContent += "32.480 109.540     0.5"
             $controlContent += "32.100 111.300     0.5"
-            $controlContent += "-240"
+            $controlContent += "$RUN_HOURS"
             $controlContent += "0"
             $controlContent += "10000.0"
-            $controlContent += "2"
-
-            # 添加气象数据文件路径
-            # 前一个月的第三个时期
-            $prevMonth = $month - 1
-            $prevYear = $year
-            if ($prevMonth -eq 0) {
-                $prevMonth = 12
-                $prevYear = $year - 1
+
+            # 添加气象数据文件（文件数和每个文件的目录、文件名）：通常是前一个月的最后一个分块加上本月的第一个分块
+            $metLines = python "$DOWNLOAD_SCRIPTS\arl_index.py" plan --folder $METEO_DIR --start ($currentTime.ToString("yyyy-MM-dd HH")) --hours $RUN_HOURS --control
+            if ($LASTEXITCODE -ne 0) {
+                Write-Host "***SKIPPED***:$tag (missing meteorology)"
+                $currentTime = $currentTime.Add($interval)
+                continue
             }
-            $prevMonthStr = "{0:D2}" -f $prevMonth
-            $controlContent += "$METEO_DIR\"
-            $controlContent += "north_6h_${prevYear}_${prevMonthStr}_p3.arl"
-
-            # 当前月的第一个时期
-            $monthStr = "{0:D2}" -f $month
-            $controlContent += "$METEO_DIR\"
-            $controlContent += "north_6h_${year}_${monthStr}_p1.arl"
+            $controlContent += $metLines
 
             # 添加输出目录和文件名
             $TRAJ_DIR = Join-Path $TRAJ_BASE_DIR $year
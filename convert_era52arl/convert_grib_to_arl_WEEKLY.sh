@@ -1,10 +1,32 @@
 #!/bin/bash
 # Modified ERA5 chunked data conversion script (supports _p1/_p2/_p3 chunk format)
 # Processing logic: Each chunk generates corresponding .arl file independently
+# For many years at once use ../download_scripts/convert_chunks.py, which runs one
+# era52arl process per core, each in its own scratch directory
 
 # Define target years list (adjustable)
 target_years=(1960)
 
+# Task ledger shared with download_scripts (skipped if the ledger script is absent)
+LEDGER_DB="${LEDGER_DB:-download_ledger.sqlite}"
+LEDGER_PY="${LEDGER_PY:-../download_scripts/task_ledger.py}"
+ledger() {
+    [[ -f "$LEDGER_PY" ]] && python3 "$LEDGER_PY" --db "$LEDGER_DB" "$@"
+}
+
+# Chunk plan written by the download scripts: surface files may cover more days
+# (e.g. a whole month) than the pressure-level chunk they are paired with
+PLAN_CSV="${PLAN_CSV:-chunk_plan.csv}"
+PLANNER_PY="${PLANNER_PY:-../download_scripts/request_planner.py}"
+surface_for() {
+    if [[ -f "$PLAN_CSV" && -f "$PLANNER_PY" ]]; then
+        python3 "$PLANNER_PY" --plan "$PLAN_CSV" surface-for "$1"
+    else
+        local name=$(basename "$1")
+        echo "${name/_pressure_/_single_}"
+    fi
+}
+
 for target_year in "${target_years[@]}"
 do
     echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
@@ -29,13 +51,19 @@ do
             continue
         fi
         
-        # 2️⃣ Check corresponding surface data file
-        file_single="north_6h_single_${yyyy_mm}_${chunk}.grib"
+        # 2️⃣ Check corresponding surface data file (looked up in the chunk plan)
+        file_single=$(surface_for "$file_pressure")
         if [[ ! -f "$file_single" ]]; then
             echo "[×] Missing surface data: $file_single"
             continue
         fi
         
+        # 3️⃣ Skip chunks the ledger marks as corrupt
+        if [[ "$(ledger get "$file_pressure")" == "failed" || "$(ledger get "$file_single")" == "failed" ]]; then
+            echo "[×] Ledger marks ${yyyy_mm}_${chunk} as failed, skipping"
+            continue
+        fi
+        
         # 🚀 Execute conversion command
         echo "▷ Converting ${yyyy_mm}_${chunk} chunk..."
         ./era52arl -dera52arl.cfg \
@@ -49,6 +77,8 @@ do
         if [[ $? -eq 0 && -f "$output_file" ]]; then
             echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
             echo "[√√√] Successfully generated: $(basename $output_file) ($(date +%H:%M:%S))"
+            ledger set-state "$file_pressure" converted
+            ledger set-state "$file_single" converted
         else
             echo "[×××] Conversion failed: $file_pressure → $output_file"
         fi
@@ -8,53 +8,26 @@ GRIB_DIR="/mnt/f/ERA5_pressure_level"
 # Set the path for the output recording file
 OUTPUT_FILE="incomplete_grib_files.txt"
 
-# 清空输出文件
-# Clear the output file before each run
-> "$OUTPUT_FILE"
-
-# 遍历目录中的所有 GRIB 文件
-# Iterate through all GRIB files in the directory
-for grib_file in "$GRIB_DIR"/north_6h_pressure_*.grib; do
-    # 检查文件是否存在
-    # Check if the file exists
-    if [ ! -f "$grib_file" ]; then
-        continue
-    fi
-
-    # 提取文件名（不含路径和扩展名）
-    # Extract filename (without path and extension)
-    filename=$(basename "$grib_file" .grib)
-
-    # 构造对应的 ARL 文件名
-    # Construct corresponding ARL filename:
-    # 1. Remove prefix 'north_6h_pressure_'
-    # 2. Add prefix 'north_6h_' and extension '.arl'
-    arl_filename="north_6h_${filename#north_6h_pressure_}.arl"
-    arl_file="${GRIB_DIR}/${arl_filename}"
-
-    # 如果对应的 ARL 文件存在，则跳过检查
-    # Skip check if corresponding ARL file already exists
-    if [ -f "$arl_file" ]; then
-        echo "🔁 已存在 ARL 文件，跳过: $grib_file"
-        echo "🔁 ARL file exists, skipping: $grib_file"
-        continue
-    fi
-
-    # 使用 grib_count 获取消息数量
-    # Use grib_count to get message count
-    count_output=$(grib_count "$grib_file" 2>&1)
-
-    # 检查输出是否为纯数字
-    # Check if output is a pure number
-    if [[ ! "$count_output" =~ ^[0-9]+$ ]]; then
-        echo "$grib_file" >> "$OUTPUT_FILE"
-        echo "❌ 不完整或损坏的文件: $grib_file"
-        echo "❌ Incomplete or corrupted file: $grib_file"
-    else
-        echo "✅ 文件完整: $grib_file"
-        echo "✅ File is complete: $grib_file"
-    fi
-done
+# 任务台账（与下载脚本共用）
+# Task ledger (shared with the download scripts)
+LEDGER_DB="$GRIB_DIR/download_ledger.sqlite"
+
+# 并行进程数（默认使用全部 CPU）
+# Number of parallel processes (defaults to every CPU)
+WORKERS="${WORKERS:-$(nproc)}"
+
+# 用 grib_index.py 并行检查目录中的所有 GRIB 文件（不需要 grib_count/ecCodes）：
+# 已有 ARL 或台账中已检查/转换的文件被跳过，结果写入台账，不完整的文件写入 $OUTPUT_FILE，
+# 每个文件的消息索引写入 <文件名>.idx
+# Check every GRIB file in the directory in parallel with grib_index.py (no grib_count/ecCodes needed):
+# files with an ARL or already verified/converted in the ledger are skipped, results go to the ledger,
+# incomplete files to $OUTPUT_FILE, and each file's message index to <filename>.idx
+python3 "$(dirname "$0")/grib_index.py" verify "$GRIB_DIR" \
+    --pattern "north_6h_pressure_*.grib" \
+    --workers "$WORKERS" \
+    --ledger "$LEDGER_DB" \
+    --incomplete "$OUTPUT_FILE" \
+    --skip-done
 
 echo "检查完成。不完整的文件已记录在 $OUTPUT_FILE 中。"
-echo "Check completed. Incomplete files have been recorded in $OUTPUT_FILE."
\ No newline at end of file
+echo "Check completed. Incomplete files have been recorded in $OUTPUT_FILE."
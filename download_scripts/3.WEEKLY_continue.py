@@ -1,37 +1,155 @@
+import json
 import os
+import threading
 import time
-from subprocess import call
 
-# 设置 IDM 的可执行文件路径
-# Set path to IDM executable
-IDM_PATH = r"D:\Internet Download Manager\IDMan.exe"
+from grib_index import index_file
+from grib_inventory import check_inventory
+from grib_stream import GribStreamVerifier
+from http_downloader import download, url_alive
+from task_ledger import LEDGER_NAME, TaskLedger
 
-# 设置记录已提交任务的文件路径
-# Set path to file recording submitted tasks
-submitted_tasks_file = r"G:\ERA5_pressure_levels\submitted_tasks.txt"
+# 设置下载文件夹路径（任务台账所在目录）
+# Set download folder path (where the task ledger lives)
+output_folder = r"G:\ERA5_pressure_levels"
 
 # 设置不完整的 GRIB 文件列表路径
 # Set path to list of incomplete GRIB files
 incomplete_files_list = r"G:\incomplete_grib_files.txt"
 
-# 读取 submitted_tasks.txt，创建文件名到下载链接的映射
-# Read submitted_tasks.txt and create filename to URL mapping
-submitted_tasks = {}
-with open(submitted_tasks_file, "r") as f:
-    for line in f:
-        parts = line.strip().split(" | ")
-        if len(parts) == 2:
-            filename, url = parts
-            submitted_tasks[filename] = url
+# 下载链接的有效期（小时）：无法访问下载服务器判断链接是否有效时，按签发时间判断
+# Lifetime of a download URL (hours): used from the issue time when the server cannot be reached to probe the link
+url_lifetime_hours = 24
+
+# 每个文件的重试次数和总时限（秒，包括在CDS重新排队的时间）；超过时限的文件记为失败，继续处理下一个
+# Attempts per file and the overall deadline (seconds, including CDS requeueing);
+# a file past its deadline is recorded as failed and the next one is processed
+max_attempts = 3
+retry_deadline = 6 * 3600
+
+# 打开任务台账，并导入旧版 submitted_tasks.txt 中的链接
+# Open the task ledger and import URLs from the old submitted_tasks.txt
+ledger = TaskLedger(os.path.join(output_folder, LEDGER_NAME))
+ledger.import_legacy(os.path.join(output_folder, "submitted_tasks.txt"))
+
+# CDS 客户端只在需要重新提交请求时创建
+# The CDS client is only created when a request has to be resubmitted
+client = None
+
+
+# 判断台账中的下载链接能否继续使用
+# Decide whether the download URL in the ledger can still be used
+def usable_url(row):
+    url = row["url"]
+    if not url:
+        return None
+    # 缺少消息的文件用同一个链接下载结果不会变，必须重新提交
+    # A file missing messages would come back the same from the same URL, so it must be resubmitted
+    if (row["error"] or "").startswith("incomplete inventory"):
+        return None
+    alive = url_alive(url)
+    if alive is None:
+        issued = row["url_at"] or row["ready_at"] or 0
+        alive = time.time() - issued < url_lifetime_hours * 3600
+    return url if alive else None
+
+
+# 用台账中记录的请求参数重新提交，最多等待到 deadline
+# Resubmit with the request stored in the ledger, waiting until the deadline at most
+def resubmit(row, deadline):
+    global client
+    if not row["request"] or not row["dataset"]:
+        raise RuntimeError("台账中没有请求参数，无法重新提交。No stored request to resubmit.")
+    if client is None:
+        import cdsapi
+        client = cdsapi.Client()
+    filename = row["filename"]
+    ledger.set_state(filename, "submitted")
+    result = {}
+
+    def retrieve():
+        try:
+            result["location"] = client.retrieve(row["dataset"], json.loads(row["request"])).location
+        except Exception as e:
+            result["error"] = e
+
+    # cdsapi 会阻塞到任务完成，放在线程中以便按时限放弃等待
+    # cdsapi blocks until the job is done; run it in a thread so the wait can be abandoned at the deadline
+    worker = threading.Thread(target=retrieve, daemon=True)
+    worker.start()
+    worker.join(max(0, deadline - time.monotonic()))
+    if worker.is_alive():
+        raise TimeoutError("CDS 请求超过时限。CDS request exceeded its deadline.")
+    if "error" in result:
+        raise result["error"]
+    if not result.get("location"):
+        raise RuntimeError("未能获取下载链接。Failed to get download URL.")
+    ledger.set_state(filename, "ready", url=result["location"])
+    return result["location"]
+
+
+# 重新下载一个文件，返回 None 表示成功，否则返回最后一次的错误
+# Re-download one file; returns None on success, otherwise the last error
+def redownload(windows_path, filename):
+    deadline = time.monotonic() + retry_deadline
+    error = None
+    # 已转换（或已校验、正在等待CDS）的记录不能直接回到 submitted/downloading：先明确记为失败，保留原来的错误信息
+    # A converted (or verified, or still submitted) row cannot go straight back to submitted/downloading:
+    # record it as failed first, keeping its earlier error
+    row = ledger.get(filename)
+    if row["state"] != "failed":
+        ledger.set_state(filename, "failed", error=row["error"] or "listed as incomplete")
+    for attempt in range(1, max_attempts + 1):
+        if time.monotonic() >= deadline:
+            error = error or TimeoutError("retry deadline exceeded")
+            break
+        row = ledger.get(filename)
+        try:
+            # 先确认链接有效（或重新提交得到新链接），再删除不完整的文件；重试时总是重新提交
+            # Make sure there is a valid URL (or get a fresh one) before deleting anything; retries always resubmit
+            download_url = usable_url(row) if attempt == 1 else None
+            if not download_url:
+                print(f"下载链接已过期或不可用，重新提交：{filename}（第 {attempt} 次）")
+                print(f"Download URL expired or unusable, resubmitting: {filename} (attempt {attempt})")
+                download_url = resubmit(row, deadline)
+
+            if os.path.exists(windows_path):
+                os.remove(windows_path)
+                print(f"已删除不完整的文件：{windows_path}")
+                print(f"Deleted incomplete file: {windows_path}")
+
+            # 重新下载，同时检查 GRIB 消息结构（download 返回时文件已完整写入并通过检查）
+            # Re-download with GRIB framing checked on the fly (the file is complete and checked when download returns)
+            ledger.set_state(filename, "downloading", url=download_url)
+            verifier = GribStreamVerifier()
+            # 传输同样受时限约束；超时后 .part 保留，下次运行时续传
+            # The transfer is bound by the deadline too; past it the .part is kept and resumed on the next run
+            nbytes = download(download_url, windows_path, verifier=verifier, deadline=deadline)
+            # 台账中有请求参数时，检查文件是否包含请求的全部消息
+            # With the request in the ledger, check the file holds every requested message
+            if row["request"]:
+                complete, problem = check_inventory(json.loads(row["request"]), index_file(windows_path))
+                if not complete:
+                    os.remove(windows_path)
+                    raise RuntimeError(f"incomplete inventory: {problem}")
+            ledger.set_state(filename, "verified", bytes=nbytes, messages=verifier.messages)
+            return None
+        except Exception as e:
+            error = e
+            ledger.set_state(filename, "failed", error=str(e))
+            print(f"第 {attempt} 次重新下载失败：{filename}，错误信息：{e}")
+            print(f"Re-download attempt {attempt} failed: {filename}, error: {e}")
+    return error
+
 
 # 读取不完整的 GRIB 文件列表
 # Read list of incomplete GRIB files
 with open(incomplete_files_list, "r") as f:
     incomplete_files = [line.strip() for line in f if line.strip()]
 
-# 存储需要重新下载的文件路径
-# Store files that need to be re-downloaded
-files_to_check = []
+# 存储重新下载失败的文件
+# Store files whose re-download failed
+failed_files = []
 
 # 处理每个不完整的 GRIB 文件
 # Process each incomplete GRIB file
@@ -44,58 +162,35 @@ for grib_path in incomplete_files:
     else:
         windows_path = grib_path  # 如果已经是 Windows 路径 / If already Windows path
 
-    if not os.path.isfile(windows_path):
-        print(f"文件不存在，跳过：{windows_path}")
-        print(f"File does not exist, skipping: {windows_path}")
-        continue
-
     # 获取文件名
     # Get filename
     filename = os.path.basename(windows_path)
 
-    # 查找对应的下载链接
-    # Find corresponding download URL
-    download_url = submitted_tasks.get(filename)
-    if not download_url:
-        print(f"未找到下载链接，跳过：{filename}")
-        print(f"Download URL not found, skipping: {filename}")
+    # 台账中既没有链接也没有请求参数的文件无法重新下载
+    # Files with neither a URL nor a request in the ledger cannot be downloaded again
+    row = ledger.get(filename)
+    if not row or not (row["url"] or row["request"]):
+        print(f"未找到下载链接或请求参数，跳过：{filename}")
+        print(f"No download URL or request found, skipping: {filename}")
+        failed_files.append(windows_path)
         continue
 
-    # 删除不完整的 GRIB 文件
-    # Delete incomplete GRIB file
-    try:
-        os.remove(windows_path)
-        print(f"已删除不完整的文件：{windows_path}")
-        print(f"Deleted incomplete file: {windows_path}")
-    except Exception as e:
-        print(f"删除文件时出错：{windows_path}，错误信息：{e}")
-        print(f"Error deleting file: {windows_path}, error: {e}")
+    # 已被 ARL 合并使用过的文件不再重新下载（台账中也不能再改变状态）
+    # Files already consumed by the ARL merge are not downloaded again (their ledger state is final)
+    if row["state"] == "consumed":
+        print(f"文件已合并到 ARL 中，跳过：{filename}")
+        print(f"File already merged into ARL, skipping: {filename}")
         continue
 
-    # 使用 IDM 添加下载任务
-    # Add download task using IDM
-    call([IDM_PATH, '/d', download_url, '/p', os.path.dirname(windows_path), '/f', filename, '/a'])
-    print(f"已添加下载任务：{filename}")
-    print(f"Added download task: {filename}")
-
-    # 添加到检查列表
-    # Add to check list
-    files_to_check.append(windows_path)
-
-# 开始所有下载任务
-# Start all download tasks
-call([IDM_PATH, '/s'])
-print("已启动所有下载任务。")
-print("Started all download tasks.")
-
-# 等待所有文件下载完成
-# Wait for all files to finish downloading
-print("等待所有文件下载完成...")
-print("Waiting for all files to finish downloading...")
-while True:
-    incomplete = [f for f in files_to_check if not os.path.exists(f)]
-    if not incomplete:
-        break
-    time.sleep(10)
-print("所有文件已下载完成。")
-print("All files have finished downloading.")
\ No newline at end of file
+    if redownload(windows_path, filename) is None:
+        print(f"已重新下载：{filename}")
+        print(f"Re-downloaded: {filename}")
+    else:
+        failed_files.append(windows_path)
+
+if failed_files:
+    print(f"{len(failed_files)} 个文件重新下载失败。")
+    print(f"{len(failed_files)} files failed to re-download.")
+else:
+    print("所有文件已下载完成。")
+    print("All files have finished downloading.")
@@ -0,0 +1,241 @@
+"""
+arl_crop.py – 从已有的 ARL 文件裁剪出子区域和/或部分层次的副本（不需要原始 GRIB）
+Crop existing ARL files to a sub-domain and/or a subset of levels (no original GRIB needed)
+
+ARL 存档是 821×361×20 层的完整网格，hyts_std 即使只计算一小块区域的轨迹也要读取整个网格。
+原始 GRIB 通常已经删除，无法重新下载，这里直接从 .arl 生成精简的区域副本：
+The ARL archive holds the full 821×361×20-level grid and hyts_std pages
+through all of it even for trajectories that stay in a small region. The
+original GRIB is usually gone, so slim regional copies are made straight from
+the .arl files:
+
+    - 只减少层次时逐字节复制保留的记录，只改写标签中的层次序号和 INDX，数值与原文件完全相同
+      | with levels removed only, the kept records are copied byte for byte; just
+      | the level numbers in their labels and the INDX are rewritten, so values
+      | are identical to the original
+    - 裁剪区域时解包每个场（WWND/TPP 加上 DIFW/DIFR 还原为原始精度），取出窗口后按 era52arl 的算法
+      重新打包（arl_packer.py），DIFW/DIFR 按新的打包重新计算，INDX 中的网格参数与 MAKNDX 对该区域的写法相同
+      | cropping unpacks every field (WWND/TPP plus DIFW/DIFR back at full
+      | precision), takes the window and repacks it with era52arl's algorithm
+      | (arl_packer.py); DIFW/DIFR are recomputed against the new packing and
+      | the INDX grid values are the ones MAKNDX writes for that area
+    - 区域的四边必须落在网格点上（与 grib_crop.py 相同），只支持规则经纬度网格
+      | the area's edges must fall on grid points (as in grib_crop.py); only
+      | regular lat/lon grids are supported
+    - 多个文件用进程池并行处理，已有的输出跳过，可以中断后继续
+      | many files are processed in parallel by a process pool; existing outputs
+      | are skipped, so an interrupted run resumes
+
+命令行 | Command line:
+    python arl_crop.py --input /mnt/f/ARL --output /mnt/f/ARL_east_asia --years 1950 1951 \\
+        --area 60 100 15 150 --levels 1000 950 900 850 800 750 650 550 450 --workers 8
+    python arl_crop.py --input north_6h_1950_01_p1.arl --output small.arl --levels-file pressure_levels.txt
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from arl_packer import DIFFERENCES, ArlWriter, grid_params
+from arl_reader import ArlFile
+from grib_crop import CropError
+from traj_levels import read_levels
+
+
+def _millidegrees(value):
+    return int(round(float(value) * 1000))
+
+
+def window(arl, area):
+    """
+    area = [北, 西, 南, 东] 在 ARL 网格中的行列范围 → (j0, j1, i0, i1)（含两端，第 0 行为最南）；
+    不在网格上时抛出 CropError
+    Row/column range (inclusive, row 0 southernmost) of area = [north, west,
+    south, east] in the ARL grid → (j0, j1, i0, i1); raises CropError when it is off the grid
+    """
+    g = arl.grid
+    if g["grid_size"] != 0:
+        raise CropError(f"{arl.path}: not a regular lat/lon grid")
+    lat0, lon0 = _millidegrees(g["sync_lat"]), _millidegrees(g["sync_lon"])
+    dj, di = _millidegrees(g["ref_lat"]), _millidegrees(g["ref_lon"])
+    north, west, south, east = (_millidegrees(v) for v in area)
+    if not di or not dj or north < south or east < west:
+        raise CropError(f"bad area {area}")
+    ds, dw = south - lat0, (west - lon0) % 360000
+    if ds % dj or dw % di or (north - south) % dj or (east - west) % di:
+        raise CropError(f"area {area} is not on the grid")
+    j0, i0 = ds // dj, dw // di
+    j1, i1 = j0 + (north - south) // dj, i0 + (east - west) // di
+    if j0 < 0 or j1 >= arl.ny or i1 >= arl.nx:
+        raise CropError(f"area {area} is outside the grid")
+    return j0, j1, i0, i1
+
+
+def kept_levels(arl, pressure_levels=None):
+    """
+    保留的层次序号：地面层（0）总是保留，给出 pressure_levels 时只保留这些高度
+    Level numbers kept: the surface level (0) always, and only pressure_levels when given
+    """
+    if pressure_levels is None:
+        return list(range(len(arl.levels)))
+    keep = {float(p) for p in pressure_levels}
+    missing = keep - {level.height for level in arl.levels[1:]}
+    if missing:
+        raise CropError(f"{arl.path}: no level {', '.join(f'{p:g}' for p in sorted(missing))}")
+    return [n for n, level in enumerate(arl.levels) if n == 0 or level.height in keep]
+
+
+def _copy_levels(arl, writer, keep):
+    # 逐字节复制记录，只改写标签中的层次序号 | Records copied byte for byte, only the label's level number rewritten
+    for t, when in enumerate(arl.times):
+        checksums = arl.checksums(t)
+        records, sums = {}, {}
+        for new, n in enumerate(keep):
+            for variable in arl.levels[n].variables:
+                record = arl.record(t, n, variable)
+                records[(new, variable)] = record[:10] + f"{new:2d}".encode("ascii") + record[12:]
+                sums[(new, variable)] = checksums[(n, variable)]
+        writer.write_records(when, records, sums)
+
+
+def _crop_fields(arl, writer, keep, rows, cols, batch):
+    # 解包、裁剪后重新打包；DIFW/DIFR 加回来源场后由 ArlWriter 重新计算
+    # Unpack, crop and repack; DIFW/DIFR are added back to their sources and recomputed by ArlWriter
+    sources = {}
+    for new, n in enumerate(keep):
+        variables = arl.levels[n].variables
+        for variable in variables:
+            if variable in DIFFERENCES:
+                continue
+            residual = [d for d, froms in DIFFERENCES.items() if variable in froms and d in variables]
+            sources[(new, variable)] = (n, variable, residual[0] if residual else None)
+    for start in range(0, len(arl.times), batch):
+        times = arl.times[start:start + batch]
+        fields = {key: np.empty((len(times), rows.stop - rows.start, cols.stop - cols.start), np.float32)
+                  for key in sources}
+        for t in range(len(times)):
+            for key, (n, variable, residual) in sources.items():
+                data = arl.field(start + t, n, variable)
+                if residual is not None:
+                    data += arl.field(start + t, n, residual)
+                fields[key][t] = data[rows, cols]
+        writer.write(times, fields)
+
+
+def crop_file(src, dst, area=None, pressure_levels=None, batch=4):
+    """
+    把 src 裁剪到 area = [北, 西, 南, 东] 和/或 pressure_levels，写出 dst，返回时次数
+    Crop src to area = [north, west, south, east] and/or pressure_levels and
+    write dst; returns the number of periods
+    """
+    tmp = dst + ".tmp"
+    with ArlFile(src) as arl:
+        keep = kept_levels(arl, pressure_levels)
+        levels = [(arl.levels[n].height, arl.levels[n].variables) for n in keep]
+        if area is None:
+            writer = ArlWriter(tmp, arl.grid, arl.nx, arl.ny, levels, arl.index.model, arl.index.vertical)
+            with writer:
+                _copy_levels(arl, writer, keep)
+        else:
+            j0, j1, i0, i1 = window(arl, area)
+            g = arl.grid
+            nx, ny = i1 - i0 + 1, j1 - j0 + 1
+            grid = grid_params(g["sync_lat"] + j0 * g["ref_lat"], (g["sync_lon"] + i0 * g["ref_lon"]) % 360,
+                               g["ref_lat"], g["ref_lon"], nx, ny)
+            writer = ArlWriter(tmp, grid, nx, ny, levels, arl.index.model, arl.index.vertical)
+            with writer:
+                _crop_fields(arl, writer, keep, slice(j0, j1 + 1), slice(i0, i1 + 1), batch)
+    os.replace(tmp, dst)
+    return writer.periods
+
+
+def _crop_one(src, dst, area, pressure_levels):
+    # 进程池中运行 | Runs in the process pool
+    start = time.monotonic()
+    try:
+        periods = crop_file(src, dst, area, pressure_levels)
+        error = None
+    except Exception as e:
+        periods, error = 0, f"{type(e).__name__}: {e}"
+        if os.path.exists(dst + ".tmp"):
+            os.remove(dst + ".tmp")
+    return src, dst, periods, time.monotonic() - start, error
+
+
+def crop_all(jobs, area=None, pressure_levels=None, workers=None):
+    """
+    并行裁剪 jobs = [(输入, 输出), ...]，逐个返回 (输入, 输出, 时次数, 秒, 错误)
+    Crop jobs = [(input, output), ...] in parallel, yielding (input, output, periods, seconds, error)
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_crop_one, src, dst, area, pressure_levels) for src, dst in jobs]
+        for future in futures:
+            yield future.result()
+
+
+def find_jobs(input_path, output_path, years=None, prefix="north_6h"):
+    """
+    输入为文件时只处理它；为目录时列出其中的 .arl（可按年份筛选），输出同名文件到 output_path 目录
+    A file input is processed on its own; a directory input lists its .arl files
+    (optionally by year), writing same-named files into the output_path folder
+    """
+    if os.path.isfile(input_path):
+        dst = os.path.join(output_path, os.path.basename(input_path)) if os.path.isdir(output_path) else output_path
+        return [(input_path, dst)]
+    patterns = [f"{prefix}_{year}_*.arl" for year in years] if years else ["*.arl"]
+    paths = sorted({p for pattern in patterns for p in glob.glob(os.path.join(input_path, pattern))})
+    return [(p, os.path.join(output_path, os.path.basename(p))) for p in paths]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="裁剪 ARL 文件的区域和层次 | Crop ARL files to a sub-domain and/or fewer levels")
+    ap.add_argument("--input", required=True, help="ARL 文件或目录 | ARL file or folder")
+    ap.add_argument("--output", required=True, help="输出文件或目录 | output file or folder")
+    ap.add_argument("--area", type=float, nargs=4, metavar=("NORTH", "WEST", "SOUTH", "EAST"),
+                    help="子区域，四边须落在网格点上 | sub-domain, edges on grid points")
+    ap.add_argument("--levels", type=float, nargs="+", help="保留的气压层（hPa）| pressure levels to keep (hPa)")
+    ap.add_argument("--levels-file", help="保留的气压层文件 pressure_levels.txt（traj_levels.py）| pressure_levels.txt to keep (traj_levels.py)")
+    ap.add_argument("--years", type=int, nargs="+", help="只处理这些年份（默认全部）| only these years (all by default)")
+    ap.add_argument("--prefix", default="north_6h", help="ARL 文件名前缀 | ARL filename prefix")
+    ap.add_argument("--workers", type=int, default=None, help="并行进程数，默认 CPU 核数 | parallel processes, CPU count by default")
+    ap.add_argument("--force", action="store_true", help="覆盖已有的输出 | overwrite existing outputs")
+    args = ap.parse_args(argv)
+
+    pressure_levels = args.levels or ([float(p) for p in read_levels(args.levels_file)] if args.levels_file else None)
+    if args.area is None and pressure_levels is None:
+        ap.error("需要 --area 或 --levels/--levels-file | --area or --levels/--levels-file is required")
+    if os.path.isdir(args.input):
+        os.makedirs(args.output, exist_ok=True)
+    jobs, skipped = [], 0
+    for src, dst in find_jobs(args.input, args.output, args.years, args.prefix):
+        if os.path.exists(dst) and not args.force:
+            skipped += 1
+            continue
+        jobs.append((src, dst))
+    print(f"待处理 {len(jobs)} 个文件，已有 {skipped} 个输出。")
+    print(f"{len(jobs)} files to crop, {skipped} outputs already exist.")
+
+    start, failed, before, after = time.monotonic(), 0, 0, 0
+    for n, (src, dst, periods, seconds, error) in enumerate(crop_all(jobs, args.area, pressure_levels, args.workers), 1):
+        if error:
+            failed += 1
+            print(f"[×] ({n}/{len(jobs)}) {os.path.basename(src)}：{error}")
+            print(f"[×] ({n}/{len(jobs)}) {os.path.basename(src)}: {error}")
+            continue
+        before += os.path.getsize(src)
+        after += os.path.getsize(dst)
+        print(f"[√] ({n}/{len(jobs)}) {os.path.basename(dst)}：{periods} 个时次（{seconds:.0f} 秒）")
+        print(f"[√] ({n}/{len(jobs)}) {os.path.basename(dst)}: {periods} periods ({seconds:.0f} s)")
+    if before:
+        print(f"大小 | size: {before / 1e9:.2f} GB → {after / 1e9:.2f} GB ({after / before:.0%}), "
+              f"用时 | wall: {time.monotonic() - start:.0f} s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
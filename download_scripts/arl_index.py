@@ -0,0 +1,241 @@
+"""
+arl_index.py – ARL 目录的时间覆盖索引，以及为 CONTROL 挑选气象文件的规划器
+Time-coverage index of an ARL folder, and a planner choosing met files for CONTROL
+
+批处理脚本原来用写死的规则决定 240 小时后向轨迹需要哪些 ARL 文件：batch_hysplit_rest.ps1 用
+“上个月 p3 + 本月 p1”，batch_hysplit_new.ps1 用“四个月的全部 12 个分块”。这里只读取一次各文件的头部
+（arl_reader.py，第一个 INDX 和各时次的标签），记下 文件 → 首末时次、时间间隔、网格和层次，
+再对任意起始时间和运行时长返回覆盖这段时间所需的最少、按时间排列的文件：
+To know which ARL files a 240 h back trajectory needs, the batch scripts used
+hard-coded rules: "previous month p3 plus current month p1"
+(batch_hysplit_rest.ps1) or "all 12 chunks of the four-month phase"
+(batch_hysplit_new.ps1). Here each file's header is read once (arl_reader.py:
+the first INDX and every period's label) into file → first/last period,
+interval, grid and levels, and for any start time and run duration the
+planner returns the fewest files, in time order, that cover the run:
+
+    - 索引保存在目录中的 arl_index.json；大小和修改时间未变的文件不再读取，删除的文件从索引中去掉，
+      因此每次规划前都可以廉价地刷新
+      | the index lives in arl_index.json in the folder; files whose size and
+      | mtime are unchanged are not read again and deleted files drop out, so
+      | it is cheap to refresh before every plan
+    - arl_merge.py 写出的 <文件名>.json 比 .arl 新时直接使用，不再读取 .arl
+      | a <name>.json written by arl_merge.py that is newer than its .arl is
+      | used instead of reading the .arl
+    - 分块和合并后的文件放在同一目录时，规划器自动选择文件数最少的组合（贪心区间覆盖）
+      | with chunks and merged files in the same folder, the planner picks the
+      | combination with the fewest files (greedy interval cover)
+    - 相邻的两个文件之间最多相差一个时间间隔；网格与第一个文件不同的文件不会被选入
+      | consecutive files may be at most one interval apart; files on a grid
+      | other than the first chosen one are not used
+
+命令行 | Command line:
+    python arl_index.py scan --folder /mnt/f/ARL
+    python arl_index.py plan --folder /mnt/f/ARL --start "1971-05-01 00" --hours -240
+    python arl_index.py plan --folder G:\\ERA5_pressure_levels --start "1971-05-01 00" --hours -240 --control
+
+--control 输出 CONTROL 中气象文件部分的各行（文件数，然后每个文件的目录和文件名），
+批处理脚本直接追加到 CONTROL 中。
+--control prints the met-file lines of a CONTROL (the file count, then the
+folder and name of each file) for the batch scripts to append as they are.
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+
+from arl_merge import sidecar_path
+from arl_reader import ArlFile, ArlFormatError, describe
+
+INDEX_NAME = "arl_index.json"
+# hyts_std 一次最多读取的气象文件数 | Most met files hyts_std reads in one run
+MAX_FILES = 12
+
+
+class PlanError(LookupError):
+    pass
+
+
+def _parse_time(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%dT%H:%M")
+
+
+def scan(path):
+    """
+    一个 ARL 文件 → 索引条目（arl_reader.describe 的字段加上大小和修改时间）
+    One ARL file → index entry (arl_reader.describe's fields plus size and mtime)
+    """
+    st = os.stat(path)
+    entry = None
+    sidecar = sidecar_path(path)
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= st.st_mtime:
+        try:
+            with open(sidecar, "r") as f:
+                entry = json.load(f)
+            entry.pop("file", None)
+            entry.pop("sources", None)
+        except (OSError, ValueError):
+            entry = None
+    if entry is None:
+        with ArlFile(path) as arl:
+            entry = describe(arl)
+    return {**entry, "size": st.st_size, "mtime": st.st_mtime}
+
+
+class ArlIndex:
+    """
+    目录中各 .arl 文件的索引（文件名 → 条目），保存在 arl_index.json
+    Index of the .arl files in a folder (filename → entry), kept in arl_index.json
+    """
+
+    def __init__(self, folder, path=None):
+        self.folder = folder
+        self.path = path or os.path.join(folder, INDEX_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def update(self, pattern="*.arl"):
+        """
+        重新读取新增或变化的文件，去掉已删除的文件；返回 (读取数, 删除数)，无法读取的文件给出警告并跳过
+        Re-read new or changed files and drop deleted ones; returns (read,
+        removed). Unreadable files are skipped with a warning
+        """
+        names = {os.path.basename(p) for p in glob.glob(os.path.join(self.folder, pattern))}
+        removed = [name for name in self.entries if name not in names]
+        for name in removed:
+            del self.entries[name]
+        read = 0
+        for name in sorted(names):
+            path = os.path.join(self.folder, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entry = self.entries.get(name)
+            if entry is not None and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                continue
+            try:
+                self.entries[name] = scan(path)
+                read += 1
+            except (ArlFormatError, OSError) as e:
+                self.entries.pop(name, None)
+                # 写到 stderr：plan 的标准输出会被批处理脚本写入 CONTROL | To stderr: plan's stdout goes into CONTROL
+                print(f"⚠ 跳过 {name}：{e}", file=sys.stderr)
+                print(f"⚠ skipping {name}: {e}", file=sys.stderr)
+        if read or removed or not os.path.exists(self.path):
+            self.save()
+        return read, len(removed)
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def plan(self, start, hours):
+        return plan(self.entries, start, hours)
+
+
+def _interval(entries):
+    # 未知间隔的文件（只有一个时次）按目录中最常见的间隔处理 | Files of unknown interval (one period) use the folder's commonest
+    steps = [e["interval"] for e in entries.values() if e.get("interval")]
+    return max(set(steps), key=steps.count) if steps else 360
+
+
+def plan(entries, start, hours):
+    """
+    覆盖 start 起 hours 小时（负数为后向）所需的最少文件，按时间排列 → [文件名, ...]；
+    无法覆盖时抛出 PlanError
+    Fewest files, in time order, covering hours hours from start (negative for
+    backward) → [filename, ...]; raises PlanError when the span is not covered
+    """
+    end = start + datetime.timedelta(hours=hours)
+    first, last = min(start, end), max(start, end)
+    default = _interval(entries)
+    spans = []
+    for name, e in entries.items():
+        if e.get("periods"):
+            step = datetime.timedelta(minutes=e.get("interval") or default)
+            spans.append((_parse_time(e["first"]), _parse_time(e["last"]), step, name))
+    chosen, needed, reference = [], first, None
+    while True:
+        # 开始不晚于 needed 的文件中覆盖到最晚的 | Of the files starting no later than needed, the one reaching furthest
+        candidates = [s for s in spans if s[0] <= needed <= s[1]
+                      and (reference is None or _same_grid(entries[s[3]], reference))]
+        if not candidates:
+            raise PlanError(f"no ARL file covers {needed:%Y-%m-%d %H:%M} "
+                            f"(run {first:%Y-%m-%d %H:%M} – {last:%Y-%m-%d %H:%M})")
+        span = max(candidates, key=lambda s: s[1])
+        chosen.append(span[3])
+        reference = reference or entries[span[3]]
+        if span[1] >= last:
+            return chosen
+        # 下一个文件可以从下一个时次开始 | The next file may start at the next period
+        needed = span[1] + span[2]
+        spans = [s for s in spans if s[1] >= needed]
+
+
+def _same_grid(entry, other):
+    return all(entry[key] == other[key] for key in ("nx", "ny", "grid", "levels"))
+
+
+def control_lines(folder, files):
+    """
+    CONTROL 中气象文件部分的各行 | The met-file lines of a CONTROL
+    """
+    directory = folder if folder.endswith(("/", "\\")) else folder + ("\\" if "\\" in folder else os.sep)
+    lines = [str(len(files))]
+    for name in files:
+        lines += [directory, name]
+    return lines
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ARL 时间覆盖索引和气象文件规划 | ARL time-coverage index and met-file planner")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("scan", help="更新并列出索引 | update and list the index")
+    p.add_argument("--folder", required=True)
+    p.add_argument("--index", help=f"索引文件，默认为目录中的 {INDEX_NAME} | index file, {INDEX_NAME} in the folder by default")
+    p = sub.add_parser("plan", help="列出一次运行需要的气象文件 | list the met files a run needs")
+    p.add_argument("--folder", required=True)
+    p.add_argument("--index", help=f"索引文件，默认为目录中的 {INDEX_NAME} | index file, {INDEX_NAME} in the folder by default")
+    p.add_argument("--start", required=True, help="起始时间 YYYY-MM-DD HH | start time YYYY-MM-DD HH")
+    p.add_argument("--hours", type=float, required=True, help="运行时长（小时），后向轨迹为负数 | run duration in hours, negative for backward")
+    p.add_argument("--control", action="store_true", help="输出 CONTROL 中的气象文件各行 | print CONTROL met-file lines")
+    args = ap.parse_args(argv)
+
+    index = ArlIndex(args.folder, args.index)
+    read, removed = index.update()
+    if args.command == "scan":
+        print(f"读取 {read} 个文件，删除 {removed} 个条目，共 {len(index.entries)} 个文件。")
+        print(f"Read {read} files, dropped {removed} entries, {len(index.entries)} files indexed.")
+        for name, e in sorted(index.entries.items(), key=lambda item: (item[1]["first"] or "", item[0])):
+            print(f"{name:32s} {e['first']} – {e['last']}  {e['periods']:4d} periods  "
+                  f"{e['nx']}×{e['ny']}×{len(e['levels'])}")
+        return
+
+    start = datetime.datetime.strptime(args.start.replace("T", " "), "%Y-%m-%d %H")
+    try:
+        files = index.plan(start, args.hours)
+    except PlanError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        sys.exit(1)
+    if len(files) > MAX_FILES:
+        print(f"⚠ 需要 {len(files)} 个文件，超过 hyts_std 的上限 {MAX_FILES}", file=sys.stderr)
+        print(f"⚠ {len(files)} files needed, more than hyts_std's limit of {MAX_FILES}", file=sys.stderr)
+    if args.control:
+        print("\n".join(control_lines(args.folder, files)))
+    else:
+        print("\n".join(files))
+
+
+if __name__ == "__main__":
+    main()
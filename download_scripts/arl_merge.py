@@ -0,0 +1,255 @@
+"""
+arl_merge.py – 把连续的 ARL 分块合并为按月或按季度的文件，并写出索引 JSON
+Merge consecutive ARL chunks into monthly or seasonal files, with an index JSON
+
+batch_hysplit_new.ps1 的每个 CONTROL 都列出 12 个 north_6h_YYYY_MM_pN.arl，hyts_std 每次运行都要打开并索引
+十几个文件，p1/p2/p3 的边界也要手工处理。这里把同一个月（或连续几个月）的分块按时间顺序拼成一个文件：
+Every CONTROL written by batch_hysplit_new.ps1 lists 12
+north_6h_YYYY_MM_pN.arl files, so each hyts_std run opens and indexes a dozen
+files and the p1/p2/p3 boundaries are handled by hand. Here the chunks of a
+month (or of several consecutive months) are joined in time order into one
+file:
+
+    - 各分块的模型、网格、垂直坐标和层次/变量必须完全相同，否则拒绝合并
+      | every chunk must have the same model, grid, vertical coordinate and
+      | levels/variables, otherwise the merge is refused
+    - 时次按整段逐字节复制（INDX + 各场），数值与分块完全相同
+      | periods are copied whole and byte for byte (INDX + fields), so values
+      | are identical to the chunks
+    - 相邻分块边界上重复的时次只保留第一次出现的那个；内容不同时给出警告
+      | a period repeated at a chunk boundary is kept once (first occurrence);
+      | a warning is printed when the copies differ
+    - HYSPLIT 按固定的时间间隔定位时次，因此时次缺失或间隔不均匀时拒绝合并
+      | HYSPLIT locates periods by a fixed interval, so missing periods or an
+      | uneven interval refuse the merge
+    - 按目录合并时，没有覆盖整个月份范围的组（分块还未全部转换）默认跳过
+      | when merging a folder, groups that do not cover their whole month range
+      | (chunks not all converted yet) are skipped by default
+
+每个合并后的文件旁边写一个 <文件名>.json，记录网格、层次、时间范围和来源分块
+（与 arl_reader.describe 的格式相同），供生成 CONTROL 的脚本使用。分块本身不会被删除。
+Next to every merged file a <name>.json records the grid, levels, time span
+and source chunks (in arl_reader.describe's format) for the scripts that
+write CONTROL files. The chunks themselves are not removed.
+
+命令行 | Command line:
+    python arl_merge.py --input /mnt/f/ARL --output /mnt/f/ARL_monthly --years 1950 1951
+    python arl_merge.py --input /mnt/f/ARL --output /mnt/f/ARL_phase --years 1971 --months-per-file 4
+    python arl_merge.py --input a_p1.arl a_p2.arl a_p3.arl --output a.arl
+"""
+
+import argparse
+import calendar
+import contextlib
+import datetime
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+from arl_reader import ArlFile, describe
+
+# 必须一致的头部字段 | Header fields that must agree
+HEADER_KEYS = ("model", "nx", "ny", "vertical", "grid", "levels")
+
+
+class MergeError(ValueError):
+    pass
+
+
+# 分块没有覆盖要求的时间范围（缺少时次，通常是分块还未全部转换）
+# The chunks do not cover the required time range (periods missing, usually chunks not all converted yet)
+class IncompleteError(MergeError):
+    pass
+
+
+def sidecar_path(arl_path):
+    return arl_path + ".json"
+
+
+def _time(value):
+    return f"{value:%Y-%m-%dT%H:%M}"
+
+
+def _check_headers(arls):
+    # 与第一个文件逐项比较 | Compared field by field with the first file
+    reference = describe(arls[0])
+    for arl in arls[1:]:
+        header = describe(arl)
+        for key in HEADER_KEYS:
+            if header[key] != reference[key]:
+                raise MergeError(f"{os.path.basename(arl.path)}: {key} differs from "
+                                 f"{os.path.basename(arls[0].path)}")
+
+
+def plan(arls):
+    """
+    按时间排列的 [(ArlFile, 时次序号), ...] 和每个来源的统计；重复的时次只保留第一次出现的，
+    时次缺失或间隔不均匀时抛出 MergeError
+    Time-ordered [(ArlFile, period), ...] plus per-source statistics; a repeated
+    period is kept at its first occurrence, and MergeError is raised for missing
+    periods or an uneven interval
+    """
+    arls = sorted((arl for arl in arls if arl.times), key=lambda arl: arl.times[0])
+    if not arls:
+        raise MergeError("no time periods to merge")
+    _check_headers(arls)
+    kept, seen, sources = [], {}, []
+    for arl in arls:
+        stats = {"file": os.path.basename(arl.path), "first": _time(arl.times[0]),
+                 "last": _time(arl.times[-1]), "periods": len(arl.times), "duplicates": 0}
+        for t, when in enumerate(arl.times):
+            if when in seen:
+                stats["duplicates"] += 1
+                first, ft = seen[when]
+                if first.period(ft) != arl.period(t):
+                    print(f"⚠ {when:%Y-%m-%d %H:%M} 在 {os.path.basename(first.path)} 和 "
+                          f"{os.path.basename(arl.path)} 中内容不同，保留前者")
+                    print(f"⚠ {when:%Y-%m-%d %H:%M} differs between {os.path.basename(first.path)} "
+                          f"and {os.path.basename(arl.path)}; keeping the former")
+                continue
+            if kept and when < kept[-1][0].times[kept[-1][1]]:
+                raise MergeError(f"{stats['file']}: {when:%Y-%m-%d %H:%M} overlaps an earlier chunk out of order")
+            seen[when] = (arl, t)
+            kept.append((arl, t))
+        sources.append(stats)
+    times = [arl.times[t] for arl, t in kept]
+    steps = sorted({b - a for a, b in zip(times, times[1:])})
+    if len(steps) > 1:
+        step = steps[0]
+        gaps = [f"{a:%Y-%m-%d %H:%M} → {b:%Y-%m-%d %H:%M}" for a, b in zip(times, times[1:]) if b - a != step]
+        # 间隔都是最小间隔的整数倍时只是缺少时次 | When every gap is a multiple of the smallest step, periods are just missing
+        error = IncompleteError if all(s % step == datetime.timedelta(0) for s in steps) else MergeError
+        raise error(f"uneven interval, missing periods after {', '.join(gaps[:5])}"
+                    + (f" and {len(gaps) - 5} more" if len(gaps) > 5 else ""))
+    return kept, sources
+
+
+def merge_files(paths, dst, span=None):
+    """
+    合并 paths 写出 dst 和 dst.json，返回索引内容；span = (开始, 结束) 时要求覆盖 [开始, 结束)
+    Merge paths into dst plus dst.json and return the index; with span = (start,
+    end) the result must cover [start, end)
+    """
+    tmp = dst + ".tmp"
+    with contextlib.ExitStack() as stack:
+        arls = [stack.enter_context(ArlFile(p)) for p in paths]
+        kept, sources = plan(arls)
+        first, last = (arl.times[t] for arl, t in (kept[0], kept[-1]))
+        if span is not None:
+            step = (kept[1][0].times[kept[1][1]] - first) if len(kept) > 1 else None
+            if first != span[0] or step is None or last + step != span[1]:
+                raise IncompleteError(f"incomplete: {first:%Y-%m-%d %H:%M} – {last:%Y-%m-%d %H:%M} "
+                                 f"does not cover {span[0]:%Y-%m-%d} – {span[1]:%Y-%m-%d}")
+        try:
+            with open(tmp, "wb") as f:
+                for arl, t in kept:
+                    f.write(arl.period(t))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    os.replace(tmp, dst)
+    with ArlFile(dst) as merged:
+        index = {"file": os.path.basename(dst), **describe(merged), "sources": sources}
+    with open(sidecar_path(dst) + ".tmp", "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(sidecar_path(dst) + ".tmp", sidecar_path(dst))
+    return index
+
+
+def group_name(prefix, year, first_month, last_month):
+    if first_month == last_month:
+        return f"{prefix}_{year}_{first_month:02d}.arl"
+    return f"{prefix}_{year}_{first_month:02d}-{last_month:02d}.arl"
+
+
+def find_groups(folder, years=None, months_per_file=1, prefix="north_6h"):
+    """
+    目录中的分块 {prefix}_YYYY_MM_pN.arl 按年和每 months_per_file 个月（从一月开始）分组
+    → [(输出文件名, (开始, 结束), [分块, ...]), ...]
+    Chunks {prefix}_YYYY_MM_pN.arl in folder grouped by year and by
+    months_per_file months (starting in January)
+    → [(output name, (start, end), [chunks, ...]), ...]
+    """
+    if 12 % months_per_file:
+        raise ValueError("months_per_file must divide 12 (1, 2, 3, 4, 6 or 12)")
+    pattern = re.compile(rf"^{re.escape(prefix)}_(\d{{4}})_(\d{{2}})_p(\d+)\.arl$")
+    groups = {}
+    for path in glob.glob(os.path.join(folder, f"{prefix}_*_p*.arl")):
+        match = pattern.match(os.path.basename(path))
+        if not match:
+            continue
+        year, month, part = (int(g) for g in match.groups())
+        if years and year not in years:
+            continue
+        first = (month - 1) // months_per_file * months_per_file + 1
+        groups.setdefault((year, first), []).append(((month, part), path))
+    result = []
+    for (year, first), chunks in sorted(groups.items()):
+        last = first + months_per_file - 1
+        start = datetime.datetime(year, first, 1)
+        end = datetime.datetime(year, last, calendar.monthrange(year, last)[1]) + datetime.timedelta(days=1)
+        result.append((group_name(prefix, year, first, last), (start, end), [p for _, p in sorted(chunks)]))
+    return result
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="合并连续的 ARL 分块 | Merge consecutive ARL chunks")
+    ap.add_argument("--input", required=True, nargs="+", help="ARL 目录，或要合并的多个文件 | ARL folder, or the files to merge")
+    ap.add_argument("--output", required=True, help="输出目录（按目录合并时）或文件 | output folder (folder mode) or file")
+    ap.add_argument("--years", type=int, nargs="+", help="只处理这些年份（默认全部）| only these years (all by default)")
+    ap.add_argument("--months-per-file", type=int, default=1, choices=(1, 2, 3, 4, 6, 12),
+                    help="每个输出文件的月数，从一月开始分组 | months per output file, grouped from January")
+    ap.add_argument("--prefix", default="north_6h", help="ARL 文件名前缀 | ARL filename prefix")
+    ap.add_argument("--partial", action="store_true", help="也合并没有覆盖整个月份范围的组 | also merge groups that do not cover their whole month range")
+    ap.add_argument("--force", action="store_true", help="覆盖已有的输出 | overwrite existing outputs")
+    args = ap.parse_args(argv)
+
+    if len(args.input) == 1 and os.path.isdir(args.input[0]):
+        os.makedirs(args.output, exist_ok=True)
+        jobs = [(os.path.join(args.output, name), span, chunks) for name, span, chunks
+                in find_groups(args.input[0], args.years, args.months_per_file, args.prefix)]
+    else:
+        jobs = [(args.output, None, args.input)]
+
+    start, failed, skipped = time.monotonic(), 0, 0
+    for n, (dst, span, chunks) in enumerate(jobs, 1):
+        name = os.path.basename(dst)
+        if os.path.exists(dst) and not args.force:
+            print(f"[-] ({n}/{len(jobs)}) {name} 已存在 | already exists")
+            continue
+        try:
+            index = merge_files(chunks, dst, None if args.partial else span)
+        except IncompleteError as e:
+            # 按目录合并时，分块还不全的组跳过（不算失败），除非指定了 --partial
+            # In folder mode a group whose chunks are not all there yet is skipped (not a failure) unless --partial
+            if span is None or args.partial:
+                failed += 1
+                print(f"[×] ({n}/{len(jobs)}) {name}：{e}")
+                print(f"[×] ({n}/{len(jobs)}) {name}: {e}")
+            else:
+                skipped += 1
+                print(f"[-] ({n}/{len(jobs)}) {name} 分块不全，跳过：{e}")
+                print(f"[-] ({n}/{len(jobs)}) {name} chunks incomplete, skipped: {e}")
+            continue
+        except (MergeError, OSError) as e:
+            failed += 1
+            print(f"[×] ({n}/{len(jobs)}) {name}：{e}")
+            print(f"[×] ({n}/{len(jobs)}) {name}: {e}")
+            continue
+        duplicates = sum(s["duplicates"] for s in index["sources"])
+        print(f"[√] ({n}/{len(jobs)}) {name}：{len(chunks)} 个分块，{index['periods']} 个时次"
+              f"（{index['first']} – {index['last']}），去掉 {duplicates} 个重复时次")
+        print(f"[√] ({n}/{len(jobs)}) {name}: {len(chunks)} chunks, {index['periods']} periods "
+              f"({index['first']} – {index['last']}), {duplicates} duplicate periods dropped")
+    if skipped:
+        print(f"{skipped} 个组分块不全，已跳过（--partial 可合并）| {skipped} incomplete groups skipped (--partial merges them)")
+    print(f"用时 | wall: {time.monotonic() - start:.0f} s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
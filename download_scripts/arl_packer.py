@@ -0,0 +1,485 @@
+"""
+arl_packer.py – 用 NumPy 向量化地把 ERA5 场打包为 ARL（era52arl 的 Python 后端）
+Vectorised NumPy packing of ERA5 fields into ARL (a Python backend for era52arl)
+
+era52arl 用 HYSPLIT 库中的 PAKREC/PAKOUT 逐个格点打包，只能在编译了 ecCodes Fortran 接口的环境中运行，
+转换也只能在整对 GRIB 文件下载完成后另起进程进行。这里按 PAKOUT 的算法打包：
+era52arl packs grid point by grid point with PAKREC/PAKOUT from the HYSPLIT
+library, only runs where the ecCodes Fortran bindings are compiled, and has
+to run as a separate process once a GRIB pair is complete. This packs with
+PAKOUT's algorithm:
+
+    - 相邻格点之差的最大值决定 NEXP，每个字节为 (值 − 上一个重建值) × 2^(7−NEXP) + 127.5 取整
+      | the largest neighbour difference sets NEXP and every byte is
+      | trunc((value − previous reconstructed value) × 2^(7−NEXP) + 127.5)
+    - 误差反馈使每行依赖前一个格点，但各行只依赖第一列：先沿第一列逐行计算，
+      再对其余各列逐列计算，每一步同时处理所有行、所有场和所有时次
+      | error feedback makes every row depend on the previous point, but rows only
+      | depend on each other through the first column: that column is done row by
+      | row, then the other columns one at a time, each step covering every row,
+      | field and time period at once
+    - 全部运算用 float32，顺序与 Fortran 相同，INDX 和标签按 PAKNDX/PAKREC 的格式写出，
+      因此文件与 era52arl 的输出逐字节相同（包括 DIFW/DIFR 残差场和大网格的字母网格号）
+      | all arithmetic is float32 in Fortran's order and INDX and labels use
+      | PAKNDX/PAKREC's formats, so files are byte-identical to era52arl's output
+      | (DIFW/DIFR residual fields and the letter grid codes of large grids included)
+
+convert() 读取 GRIB1 文件对（grib_decode.py，不需要 ecCodes），按 era52arl.cfg 选择变量、层次和单位换算，
+一次打包 batch 个时次。内存约为每个时次 记录数 × NX × NY × 12 字节。
+convert() reads a GRIB1 pair (grib_decode.py, no ecCodes), selects
+variables, levels and unit conversions from era52arl.cfg, and packs batch time
+periods per call. Memory is about records × NX × NY × 12 bytes per period.
+
+命令行 | Command line:
+    python arl_packer.py --pressure north_6h_pressure_1950_01_p1.grib --single north_6h_single_1950_01.grib \\
+        --cfg ../convert_era52arl/era52arl.cfg -o north_6h_1950_01_p1.arl
+"""
+
+import argparse
+import mmap
+import time
+
+import numpy as np
+
+from arl_reader import GRID_FIELDS, unpack
+from grib_crop import CropError, grid_of
+from grib_decode import GribDecodeError, decode
+from grib_index import scan
+from met_config import read_era52arl
+
+# 与 PAKOUT 中的常数相同（float32）| The constants PAKOUT uses (float32)
+LN2 = np.float32(0.6931472)
+HALF = np.float32(127.5)
+
+# era52arl 写出的残差场及其来源 | Residual fields era52arl writes and what they come from
+DIFFERENCES = {"DIFW": ("WWND",), "DIFR": ("TPP1", "TPP3")}
+
+# era52arl 读取气压层文件时替换的缺测值 | Missing values era52arl replaces when reading the pressure file
+MISSING = {"WWND": 0.0, "RGHS": 0.01}
+
+
+# ---------- Fortran 格式 | Fortran formats ----------
+def fortran_f(x, w, d):
+    """
+    与 gfortran 的 Fw.d 相同：放不下时省略整数部分的 0，仍放不下时输出 w 个 *
+    As gfortran's Fw.d: the leading 0 is dropped when it does not fit, and w
+    asterisks are written when it still does not fit
+    """
+    text = f"{float(x):.{d}f}"
+    if len(text) > w:
+        text = text.replace("0.", ".", 1) if text.startswith(("0.", "-0.")) else text
+    return "*" * w if len(text) > w else text.rjust(w)
+
+
+def fortran_e(x, w, d):
+    # Ew.d：0.ddd…E±ee | Ew.d: 0.ddd…E±ee
+    x = float(x)
+    digits, exponent = f"{abs(x):.{d - 1}e}".split("e")
+    digits = digits.replace(".", "")
+    exponent = int(exponent) + 1 if x != 0 else 0
+    text = f"{'-' if x < 0 else ''}0.{digits}E{exponent:+03d}"
+    if len(text) > w:
+        text = text.replace("0.", ".", 1)
+    return "*" * w if len(text) > w else text.rjust(w)
+
+
+def _grid_value(x):
+    # PAKNDX 按数量级选择 F7.2 … F7.6 | PAKNDX picks F7.2 … F7.6 by magnitude
+    x = np.float32(x)
+    for bound, d in ((1000, 2), (100, 3), (10, 4), (1, 5), (0, 6)):
+        if x >= bound:
+            return fortran_f(x, 7, d)
+    for bound, d in ((-1, 5), (-10, 4), (-100, 3), (-1000, 2)):
+        if x > bound:
+            return fortran_f(x, 7, d)
+    return fortran_e(x, 7, 1)
+
+
+def _height_value(height):
+    # 层次高度 F6.0 … F6.5 | Level heights F6.0 … F6.5
+    height = np.float32(height)
+    for bound, d in ((10000, 0), (1000, 1), (100, 2), (10, 3), (1, 4)):
+        if height >= bound:
+            return fortran_f(height, 6, d)
+    return fortran_f(height, 6, 5)
+
+
+def grid_code(nx, ny):
+    """
+    标签中的网格号：NX 或 NY 达到 1000 时用两个字母记录千位（"A" 为 1000）
+    Grid number of the labels: two letters holding the thousands of NX and NY once either reaches 1000 ("A" is 1000)
+    """
+    if nx < 1000 and ny < 1000:
+        return "99"
+    return chr(64 + nx // 1000) + chr(64 + ny // 1000)
+
+
+def grid_params(south, west, dlat, dlon, nx, ny):
+    """
+    与 MAKNDX 相同的规则经纬度网格参数（float32 运算，经 arldata.cfg 的 F10.2 往返）→ {名称: 值}
+    The regular lat-lon grid parameters MAKNDX derives (float32 arithmetic,
+    round-tripped through arldata.cfg's F10.2) → {name: value}
+    """
+    f = np.float32
+    clat, clon, dlat, dlon = f(south), f(west), f(dlat), f(dlon)
+    if clon < 0:
+        clon = f(360) + clon
+    values = (clat + dlat * f(ny - 1), np.fmod(clon + dlon * f(nx - 1), f(360)), dlat, dlon,
+              0, 0, 0, 1, 1, clat, clon, 0)
+    return {name: float(f(fortran_f(v, 10, 2))) for name, v in zip(GRID_FIELDS, values)}
+
+
+def format_label(time, level, grid, variable, exponent=0, precision=0.0, value=0.0, forecast=0):
+    """
+    50 字节标签 (7I2,A4,I4,2E14.7) | 50-byte label (7I2,A4,I4,2E14.7)
+    """
+    text = (f"{time.year % 100:2d}{time.month:2d}{time.day:2d}{time.hour:2d}{forecast:2d}{level:2d}{grid:>2s}"
+            f"{variable:4s}{exponent:4d}{fortran_e(precision, 14, 7)}{fortran_e(value, 14, 7)}")
+    return text.encode("ascii")
+
+
+def format_index(model, grid, nx, ny, levels, checksums, forecast=0, minutes=0, vertical=2):
+    """
+    INDX 记录的数据部分；levels = [(高度, [变量...]), ...]，checksums = {(层次, 变量): 校验和}
+    Data part of an INDX record; levels = [(height, [variables...]), ...],
+    checksums = {(level, variable): checksum}
+    """
+    body = "".join(f"{_height_value(height)}{len(variables):2d}"
+                   + "".join(f"{v:4s}{checksums[(n, v)]:3d} " for v in variables)
+                   for n, (height, variables) in enumerate(levels))
+    length = 108 + len(body)
+    head = (f"{model:4s}{forecast:3d}{minutes:2d}" + "".join(_grid_value(grid[name]) for name in GRID_FIELDS)
+            + f"{nx % 1000:3d}{ny % 1000:3d}{len(levels):3d}{vertical:2d}{length:4d}")
+    return (head + body).encode("ascii")
+
+
+# ---------- 打包 | Packing ----------
+def _exponents(fields):
+    # NEXP：相邻格点之差的最大值（每行从上一行的第一个值开始）
+    # NEXP from the largest neighbour difference (each row starting from the first value of the row before)
+    n, ny, nx = fields.shape
+    rmax = np.zeros(n, dtype=np.float32)
+    if nx > 1:
+        rmax = np.maximum(rmax, np.abs(np.diff(fields, axis=2)).max(axis=(1, 2)))
+    if ny > 1:
+        rmax = np.maximum(rmax, np.abs(np.diff(fields[:, :, 0], axis=1)).max(axis=1))
+    # 与 Fortran 相同：logf(RMAX)/LOG(2.) 截断，非负或为整数时加 1；RMAX 为 0 时 NEXP = 1
+    # As in Fortran: logf(RMAX)/LOG(2.) truncated, plus 1 when non-negative or whole; NEXP = 1 when RMAX is 0
+    with np.errstate(divide="ignore"):
+        sexp = np.where(rmax > 0, np.log(rmax.astype(np.float64)).astype(np.float32) / LN2, np.float32(0))
+    whole = np.trunc(sexp)
+    return whole.astype(np.int32) + ((sexp >= 0) | (sexp == whole))
+
+
+def _checksums(codes):
+    # 循环校验和；字节都在 0–255 之内时等价于对 255 取模，否则逐个累加
+    # Rotating checksum; equals the sum modulo 255 when every code is within 0–255, otherwise summed one by one
+    total = codes.sum(axis=(1, 2), dtype=np.int64)
+    sums = np.where(total == 0, 0, (total - 1) % 255 + 1)
+    for k in np.flatnonzero((codes.min(axis=(1, 2)) < 0) | (codes.max(axis=(1, 2)) > 255)):
+        ksum = 0
+        for code in codes[k].ravel().tolist():
+            ksum += code
+            if ksum > 255:
+                ksum -= 255
+        sums[k] = ksum
+    return sums
+
+
+def pack(fields):
+    """
+    (…, NY, NX) 的场（第 0 行为最南）→ (字节 uint8 (…, NY, NX), NEXP, 精度, 第一个值, 校验和)，后四项形状为 (…)
+    Fields (…, NY, NX) (row 0 southernmost) → (bytes uint8 (…, NY, NX), NEXP,
+    precision, first value, checksum), the last four shaped (…)
+    """
+    fields = np.asarray(fields, dtype=np.float32)
+    lead, (ny, nx) = fields.shape[:-2], fields.shape[-2:]
+    f = fields.reshape(-1, ny, nx)
+    exponent = _exponents(f)
+    scale = np.ldexp(np.float32(1), 7 - exponent)
+    precision = np.ldexp(np.float32(1), exponent) / np.float32(254)
+    value = f[:, 0, 0].copy()
+
+    # 按列存放，每一步读写连续的内存 | Column-major copy, so every step reads and writes contiguous memory
+    columns = np.ascontiguousarray(np.moveaxis(f, 2, 0))
+    codes = np.empty(columns.shape, dtype=np.int32)
+    step = np.empty(columns.shape[1:], dtype=np.float32)
+    # 第一列：逐行，每行从上一行重建的第一个值开始 | First column: row by row, each from the row before's reconstructed first value
+    old = value.copy()
+    for j in range(ny):
+        code = np.trunc((columns[0, :, j] - old) * scale + HALF).astype(np.int32)
+        old = (code - 127).astype(np.float32) / scale + old
+        codes[0, :, j] = code
+        step[:, j] = old
+    # 其余各列：所有行、所有场同时计算 | Other columns: every row of every field at once
+    old = step.copy()
+    scale = scale[:, None]
+    for i in range(1, nx):
+        np.subtract(columns[i], old, out=step)
+        step *= scale
+        step += HALF
+        np.trunc(step, out=step)
+        codes[i] = step
+        step -= np.float32(127)
+        step /= scale
+        old += step
+    codes = np.moveaxis(codes, 0, 2)
+    checksum = _checksums(codes)
+    packed = np.ascontiguousarray(codes & 0xFF, dtype=np.uint8)
+    return (packed.reshape(lead + (ny, nx)), exponent.reshape(lead), precision.reshape(lead),
+            value.reshape(lead), checksum.reshape(lead))
+
+
+# ---------- 写出 | Writing ----------
+class ArlWriter:
+    """
+    按 era52arl 的记录顺序写出 ARL：每个时次先写 INDX，再按 层次 → 变量 写各个场
+    Writes ARL in era52arl's record order: INDX first in every period, then
+    the fields level by level, variable by variable
+    """
+
+    def __init__(self, path, grid, nx, ny, levels, model="ERA5", vertical=2):
+        self.path = path
+        self.grid = grid
+        self.nx, self.ny = nx, ny
+        self.levels = [(float(height), list(variables)) for height, variables in levels]
+        self.model = model
+        self.vertical = vertical
+        self.code = grid_code(nx, ny)
+        self.keys = [(n, v) for n, (_, variables) in enumerate(self.levels) for v in variables]
+        self.periods = 0
+        self._file = open(path, "wb")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _unpacked(self, packed, exponent, precision, value):
+        # 与 PAKINP 相同：第一列以外绝对值小于精度的值记为 0 | As PAKINP: values below the precision become 0 outside the first column
+        data = unpack(packed, self.nx, self.ny, exponent, value)
+        rest = data[:, 1:]
+        rest[np.abs(rest) < precision] = 0
+        return data
+
+    def _residual(self, key, fields, results):
+        # 残差场 = 来源场 − PAKINP(来源场的字节) | Residual field = source field − PAKINP(source bytes)
+        n, variable = key
+        for source in DIFFERENCES.get(variable, ()):
+            if (n, source) in results:
+                packed, exponent, precision, value, _ = results[(n, source)]
+                rvalue = np.asarray(fields[(n, source)], dtype=np.float32)
+                return np.stack([rvalue[t] - self._unpacked(packed[t], exponent[t], precision[t], value[t])
+                                 for t in range(len(rvalue))])
+        raise ValueError(f"no field for {variable} at level {n}")
+
+    def _write_index(self, when, checksums):
+        nxy = self.nx * self.ny
+        index = format_index(self.model, self.grid, self.nx, self.ny, self.levels, checksums,
+                             minutes=when.minute, vertical=self.vertical)
+        label = format_label(when, 0, self.code, "INDX")
+        # INDX 比一条记录长时跨越多条记录，每条都带 INDX 标签 | A long INDX spans several records, each with an INDX label
+        for start in range(0, len(index), nxy):
+            self._file.write(label + index[start:start + nxy].ljust(nxy, b"\0"))
+
+    def write_records(self, when, records, checksums):
+        """
+        写出一个已打包的时次；records = {(层次, 变量): 整条记录（标签 + 字节）}，checksums 为 INDX 中的校验和
+        Write one already packed period; records = {(level, variable): whole
+        record (label + bytes)} and checksums are the INDX checksums
+        """
+        self._write_index(when, checksums)
+        for key in self.keys:
+            self._file.write(records[key])
+        self.periods += 1
+
+    def write(self, times, fields):
+        """
+        写出多个时次；fields = {(层次, 变量): (时次数, NY, NX) 数组}，已换算单位、第 0 行为最南。
+        INDX 中列出但 fields 中没有的 DIFW/DIFR 按 era52arl 的方式由 WWND/TPP1/TPP3 计算
+        Write several periods; fields = {(level, variable): (periods, NY, NX)
+        array}, units converted and row 0 southernmost. DIFW/DIFR listed in the
+        INDX but missing from fields are derived from WWND/TPP1/TPP3 as era52arl does
+        """
+        direct = [k for k in self.keys if k in fields]
+        stack = np.stack([np.asarray(fields[k], dtype=np.float32) for k in direct])
+        if stack.shape[1:] != (len(times), self.ny, self.nx):
+            raise ValueError(f"fields are {stack.shape[1:]}, expected {(len(times), self.ny, self.nx)}")
+        results = dict(zip(direct, zip(*pack(stack))))
+        derived = [k for k in self.keys if k not in fields]
+        if derived:
+            residuals = np.stack([self._residual(k, fields, results) for k in derived])
+            results.update(zip(derived, zip(*pack(residuals))))
+
+        for t, when in enumerate(times):
+            self._write_index(when, {k: int(results[k][4][t]) for k in self.keys})
+            for key in self.keys:
+                packed, exponent, precision, value, _ = results[key]
+                self._file.write(format_label(when, key[0], self.code, key[1], int(exponent[t]),
+                                              precision[t], value[t]))
+                self._file.write(packed[t].tobytes())
+        self.periods += len(times)
+
+
+# ---------- GRIB → ARL ----------
+def era52arl_levels(setup, surface, upper):
+    """
+    与 MAKNDX 相同的层次和变量列表；surface 为找到的地面变量短名，upper 为找到的 (短名, 气压层)
+    The level and variable lists MAKNDX writes; surface holds the surface short
+    names found and upper the (short name, pressure level) pairs found
+    """
+    numsfc, numatm = setup["numsfc"][0], setup["numatm"][0]
+    variables = [arl for grb, arl in zip(setup["sfcgrb"][:numsfc], setup["sfcarl"][:numsfc]) if grb in surface]
+    if {"TPP1", "TPP3"} & set(variables):
+        variables.append("DIFR")
+    levels = [(0.0, variables)]
+    for p in setup["plev"][:setup["numlev"][0]]:
+        variables = [arl for grb, arl in zip(setup["atmgrb"][:numatm], setup["atmarl"][:numatm])
+                     if (grb, p) in upper]
+        if "WWND" in variables:
+            variables.append("DIFW")
+        levels.append((float(p), variables))
+    return levels
+
+
+def _messages(buf, names, levels=None):
+    # 所需的消息 → {(有效时间, 短名, 层次): 消息}，同一个键后出现的覆盖先出现的（与 era52arl 相同）
+    # Wanted messages → {(valid time, short name, level): message}; later duplicates win, as in era52arl
+    found = {}
+    for m in scan(buf):
+        if m.short_name in names and (levels is None or m.level in levels):
+            found[(m.valid_time, m.short_name, m.level)] = m
+    return found
+
+
+def variable_table(setup, prefix):
+    # ARL 变量 → (GRIB 短名, 单位换算) | ARL variable → (GRIB short name, unit conversion)
+    count = setup[f"num{prefix}"][0]
+    return {arl: (grb, np.float32(cnv)) for grb, arl, cnv in
+            zip(setup[f"{prefix}grb"][:count], setup[f"{prefix}arl"][:count], setup[f"{prefix}cnv"][:count])}
+
+
+def record_sources(setup, levels):
+    """
+    每条直接读取的记录的来源 {(层次, 变量): (产品, GRIB 短名, GRIB 层次, 单位换算, 缺测替换值)}；
+    地面变量来自 "single"，高空变量来自 "pressure"，DIFW/DIFR 由 ArlWriter 计算
+    Where every directly read record comes from: {(level, variable): (product,
+    short name, GRIB level, unit conversion, missing-value replacement)}; surface
+    variables come from "single", upper-air ones from "pressure", and
+    DIFW/DIFR are derived by ArlWriter
+    """
+    sfc, atm = variable_table(setup, "sfc"), variable_table(setup, "atm")
+    sources = {}
+    for n, (height, variables) in enumerate(levels):
+        for variable in variables:
+            if variable in DIFFERENCES:
+                continue
+            if n == 0:
+                grb, units = sfc[variable]
+                sources[(n, variable)] = ("single", grb, 0, units, None)
+            else:
+                grb, units = atm[variable]
+                sources[(n, variable)] = ("pressure", grb, int(height), units, MISSING.get(variable))
+    return sources
+
+
+def message_grid(msg):
+    """
+    GRIB1 消息 → (NX, NY, MAKNDX 的 12 个网格参数) | GRIB1 message → (NX, NY, the 12 MAKNDX grid values)
+    """
+    try:
+        ni, nj, _, lo1, la2, _, di, dj = grid_of(msg)
+    except CropError as e:
+        raise GribDecodeError(str(e)) from None
+    if not ni or not nj:
+        raise GribDecodeError("message has no lat/lon grid")
+    return ni, nj, grid_params(la2 / 1000, lo1 / 1000, dj / 1000, di / 1000, ni, nj)
+
+
+def read_field(msg, ni, nj, units, missing, out):
+    """
+    解码一条消息到 out（NY, NX）：替换缺测值、换算单位并翻转为自南向北
+    Decode one message into out (NY, NX): replace missing values, convert units
+    and flip it to run south to north
+    """
+    values = decode(msg)
+    if values.shape != (nj, ni):
+        raise GribDecodeError(f"message is {values.shape[1]}×{values.shape[0]}, not on the {ni}×{nj} grid")
+    if missing is not None:
+        values[values == np.float32(9999.0)] = missing
+    # GRIB 自北向南，ARL 自南向北 | GRIB runs north to south, ARL south to north
+    np.multiply(values[::-1], units, out=out)
+
+
+def convert(pressure_path, single_path, arl_path, cfg_path, batch=4):
+    """
+    GRIB1 气压层/地面文件对 → ARL 文件（与 era52arl -i pressure -a single -f single 相同），返回时次数
+    GRIB1 pressure/surface pair → ARL file (as era52arl -i pressure -a single
+    -f single); returns the number of periods
+    """
+    setup = read_era52arl(cfg_path)
+    sfc, atm = variable_table(setup, "sfc"), variable_table(setup, "atm")
+    plev = setup["plev"][:setup["numlev"][0]]
+
+    with open(pressure_path, "rb") as pf, open(single_path, "rb") as sf:
+        pbuf = mmap.mmap(pf.fileno(), 0, access=mmap.ACCESS_READ)
+        sbuf = mmap.mmap(sf.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            upper = _messages(pbuf, {grb for grb, _ in atm.values()}, set(plev))
+            surface = _messages(sbuf, {grb for grb, _ in sfc.values()})
+            if not upper:
+                raise GribDecodeError(f"{pressure_path}: no pressure-level messages listed in {cfg_path}")
+            # 时次按气压层文件中的顺序 | Periods in pressure file order
+            times = list(dict.fromkeys(t for t, _, _ in upper))
+            levels = era52arl_levels(setup, {s for _, s, _ in surface}, {(s, p) for _, s, p in upper})
+            first = next(iter(upper.values()))
+            ni, nj, grid = message_grid(pbuf[first.offset:first.offset + first.length])
+
+            sources = record_sources(setup, levels)
+            files = {"pressure": (pbuf, upper), "single": (sbuf, surface)}
+            with ArlWriter(arl_path, grid, ni, nj, levels) as writer:
+                for start in range(0, len(times), batch):
+                    chunk = times[start:start + batch]
+                    fields = {key: np.empty((len(chunk), nj, ni), np.float32) for key in sources}
+                    for t, when in enumerate(chunk):
+                        for key, (product, grb, level, units, missing) in sources.items():
+                            buf, messages = files[product]
+                            m = messages.get((when, grb, level))
+                            if m is None:
+                                raise GribDecodeError(f"no {grb} at level {level} for {when:%Y-%m-%d %H:%M}")
+                            try:
+                                read_field(buf[m.offset:m.offset + m.length], ni, nj, units, missing, fields[key][t])
+                            except GribDecodeError as e:
+                                raise GribDecodeError(f"{grb} at {when:%Y-%m-%d %H:%M}: {e}") from None
+                    writer.write(chunk, fields)
+        finally:
+            pbuf.close()
+            sbuf.close()
+    return len(times)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="用 NumPy 把 GRIB1 文件对转换为 ARL | Convert a GRIB1 pair to ARL with NumPy")
+    ap.add_argument("--pressure", required=True, help="气压层 GRIB 文件 | pressure-level GRIB file")
+    ap.add_argument("--single", required=True, help="地面 GRIB 文件 | single-level GRIB file")
+    ap.add_argument("--cfg", required=True, help="era52arl.cfg")
+    ap.add_argument("-o", "--output", required=True, help="输出的 ARL 文件 | output ARL file")
+    ap.add_argument("--batch", type=int, default=4, help="每次打包的时次数 | periods packed per call")
+    args = ap.parse_args(argv)
+
+    start = time.monotonic()
+    periods = convert(args.pressure, args.single, args.output, args.cfg, args.batch)
+    print(f"已写出 {periods} 个时次（{time.monotonic() - start:.1f} 秒）")
+    print(f"Wrote {periods} periods ({time.monotonic() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+arl_qa.py – ARL 存档质量检查：逐记录统计、缺失/重复时次和异常值
+ARL archive QA: per-record statistics, missing/duplicate periods and outliers
+
+有问题的 ARL 分块（缺少时次、常数场、atmcnv/sfccnv 单位换算错误）往往要到几个月后轨迹看起来不对时才被发现。
+这里用进程池并行读取目录中的每个 .arl（arl_reader.py，内存映射），对每个 (时次, 层次, 变量) 记录
+解包后的最小值、最大值、平均值和打包精度，存入一个紧凑的 SQLite 库（每个文件一行，统计量为 float32 数组），
+并检查：
+A bad ARL chunk (missing period, constant field, wrong atmcnv/sfccnv units)
+is usually only found when trajectories look odd months later. Here every
+.arl in a folder is read in parallel by a process pool (arl_reader.py, memory
+mapped); each (time, level, variable) record is unpacked and its min, max,
+mean and packing precision go into a compact SQLite store (one row per file,
+the statistics as a float32 array), and the archive is checked for:
+
+    - 文件内：记录标签与位置不符、校验和与 INDX 不符、非有限值、常数场（降水等允许为常数的变量除外）、
+      时次重复或间隔不均匀
+      | within a file: labels not matching their position, checksums not
+      | matching the INDX, non-finite values, constant fields (except variables
+      | such as precipitation that may be), repeated periods or an uneven interval
+    - 整个存档：时次缺失（按最常见的间隔），同一时次出现在多个文件中且统计量不同
+      | across the archive: missing periods (at the commonest interval) and
+      | periods present in several files with different statistics
+    - 气候异常：按 (层次, 变量, 月份) 把所有文件的记录放在一起，最小值、最大值或平均值偏离中位数超过
+      --sigma 倍稳健标准差（1.4826 × MAD）的记录，单位换算错误会在这里出现
+      | climatology: records of each (level, variable, calendar month) across
+      | all files are pooled, and a record whose min, max or mean is more than
+      | --sigma robust standard deviations (1.4826 × MAD) from the median is
+      | flagged; wrong units show up here
+
+重新扫描时只读取新增或大小/修改时间变化的文件，删除的文件从库中去掉。
+A re-scan reads only new files or files whose size or mtime changed;
+deleted files are dropped from the store.
+
+命令行 | Command line:
+    python arl_qa.py scan --folder /mnt/f/ARL --workers 8
+    python arl_qa.py report --folder /mnt/f/ARL --sigma 10
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from arl_packer import DIFFERENCES
+from arl_reader import ArlFile, ArlFormatError, checksum, unpack
+
+STORE_NAME = "arl_qa.sqlite"
+
+# 每条记录的统计量 | Statistics per record
+STATS = ("min", "max", "mean", "precision")
+
+# 可以整场为常数的变量（无降水、无对流时为 0）| Variables that may be constant over the grid (0 without rain or convection)
+CONSTANT_OK = {"TPP1", "TPP3", "TPP6", "CAPE", *DIFFERENCES}
+
+# 每组至少这么多条记录才做气候异常检查 | Records needed in a group before it is checked against climatology
+MIN_GROUP = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime    REAL NOT NULL,
+    times    TEXT NOT NULL,
+    layout   TEXT NOT NULL,
+    stats    BLOB NOT NULL,
+    scanned  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flags (
+    name     TEXT NOT NULL,
+    time     TEXT,
+    level    REAL,
+    variable TEXT,
+    kind     TEXT NOT NULL,
+    detail   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_flags_name ON flags(name);
+"""
+
+
+def _time(value):
+    return f"{value:%Y-%m-%dT%H:%M}"
+
+
+def scan_file(path):
+    """
+    读取一个 ARL 文件 → {size, mtime, times, layout, stats, flags}；stats 为 (时次, 记录, 4) float32，
+    layout 为 [(层次高度, 变量), ...]，flags 为 [(时间, 层次高度, 变量, 类别, 说明), ...]
+    Read one ARL file → {size, mtime, times, layout, stats, flags}; stats is
+    (period, record, 4) float32, layout is [(level height, variable), ...] and
+    flags is [(time, level height, variable, kind, detail), ...]
+    """
+    st = os.stat(path)
+    flags = []
+    with ArlFile(path) as arl:
+        records = [(n, level.height, v) for n, level in enumerate(arl.levels) for v in level.variables]
+        stats = np.full((len(arl.times), len(records), len(STATS)), np.nan, np.float32)
+        for t, when in enumerate(arl.times):
+            try:
+                sums = arl.checksums(t)
+            except ArlFormatError as e:
+                flags.append((_time(when), None, None, "index", str(e)))
+                continue
+            for r, (n, height, variable) in enumerate(records):
+                try:
+                    label, packed = arl.raw(t, n, variable)
+                except ArlFormatError as e:
+                    flags.append((_time(when), height, variable, "label", str(e)))
+                    continue
+                data = unpack(packed, arl.nx, arl.ny, label.exponent, label.value)
+                lo, hi, mean = float(data.min()), float(data.max()), float(data.mean(dtype=np.float64))
+                stats[t, r] = lo, hi, mean, label.precision
+                if checksum(packed) != sums.get((n, variable)):
+                    flags.append((_time(when), height, variable, "checksum", "does not match the INDX"))
+                if not np.isfinite(mean):
+                    flags.append((_time(when), height, variable, "nonfinite", f"mean {mean}"))
+                elif lo == hi and variable not in CONSTANT_OK:
+                    flags.append((_time(when), height, variable, "constant", f"{lo:g} everywhere"))
+        steps = Counter(b - a for a, b in zip(arl.times, arl.times[1:]))
+        if steps:
+            step = steps.most_common(1)[0][0]
+            for a, b in zip(arl.times, arl.times[1:]):
+                if b <= a:
+                    flags.append((_time(b), None, None, "duplicate" if b == a else "order",
+                                  f"follows {a:%Y-%m-%d %H:%M}"))
+                elif b - a != step:
+                    flags.append((_time(a), None, None, "gap", f"next period {b:%Y-%m-%d %H:%M}"))
+        times = [_time(t) for t in arl.times]
+    return {"size": st.st_size, "mtime": st.st_mtime, "times": times,
+            "layout": [(height, v) for _, height, v in records], "stats": stats, "flags": flags}
+
+
+def _scan_one(path):
+    # 进程池中运行 | Runs in the process pool
+    start = time.monotonic()
+    try:
+        return path, scan_file(path), time.monotonic() - start, None
+    except Exception as e:
+        return path, None, time.monotonic() - start, f"{type(e).__name__}: {e}"
+
+
+class QaStore:
+    """
+    统计库：files 表每个文件一行（时次、记录排列和统计数组），flags 表为扫描时发现的文件内问题
+    Statistics store: one files row per file (periods, record layout and the
+    statistics array); the flags table holds in-file problems found while scanning
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.con = sqlite3.connect(path)
+        self.con.executescript(SCHEMA)
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def known(self):
+        return {name: (size, mtime) for name, size, mtime in self.con.execute("SELECT name, size, mtime FROM files")}
+
+    def put(self, name, result):
+        with self.con:
+            self.con.execute("DELETE FROM flags WHERE name = ?", (name,))
+            self.con.execute(
+                "INSERT OR REPLACE INTO files (name, size, mtime, times, layout, stats, scanned) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, result["size"], result["mtime"], json.dumps(result["times"]), json.dumps(result["layout"]),
+                 result["stats"].astype(np.float32).tobytes(), time.time()))
+            self.con.executemany("INSERT INTO flags (name, time, level, variable, kind, detail) VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(name, *flag) for flag in result["flags"]])
+
+    def remove(self, name):
+        with self.con:
+            self.con.execute("DELETE FROM flags WHERE name = ?", (name,))
+            self.con.execute("DELETE FROM files WHERE name = ?", (name,))
+
+    def files(self):
+        """
+        逐个返回 (文件名, [datetime, ...], [(层次高度, 变量), ...], (时次, 记录, 4) 数组)
+        Yield (filename, [datetime, ...], [(level height, variable), ...], (period, record, 4) array)
+        """
+        for name, times, layout, stats in self.con.execute("SELECT name, times, layout, stats FROM files ORDER BY name"):
+            times = [datetime.datetime.strptime(t, "%Y-%m-%dT%H:%M") for t in json.loads(times)]
+            layout = [tuple(r) for r in json.loads(layout)]
+            yield name, times, layout, np.frombuffer(stats, np.float32).reshape(len(times), len(layout), len(STATS))
+
+    def file_flags(self):
+        return self.con.execute("SELECT name, time, level, variable, kind, detail FROM flags "
+                                "ORDER BY name, time, level, variable").fetchall()
+
+
+def scan(folder, store, workers=None, pattern="*.arl"):
+    """
+    扫描新增或变化的文件并去掉已删除的文件，逐个返回 (文件名, 秒, 错误)
+    Scan new or changed files and drop deleted ones, yielding (filename, seconds, error)
+    """
+    paths = {os.path.basename(p): p for p in glob.glob(os.path.join(folder, pattern))}
+    known = store.known()
+    for name in set(known) - set(paths):
+        store.remove(name)
+    jobs = []
+    for name, path in sorted(paths.items()):
+        st = os.stat(path)
+        if known.get(name) != (st.st_size, st.st_mtime):
+            jobs.append(path)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, result, seconds, error in pool.map(_scan_one, jobs):
+            name = os.path.basename(path)
+            if error is None:
+                store.put(name, result)
+            yield name, seconds, error
+
+
+def archive_flags(store, sigma=10.0):
+    """
+    跨文件的检查：时次缺失、内容不同的重复时次和气候异常 → [(文件名, 时间, 层次高度, 变量, 类别, 说明), ...]
+    Checks across files: missing periods, duplicate periods with different
+    contents and climatology outliers → [(filename, time, level height, variable, kind, detail), ...]
+    """
+    flags = []
+    owners = defaultdict(list)
+    groups = defaultdict(list)
+    for name, times, layout, stats in store.files():
+        for t, when in enumerate(times):
+            owners[when].append((name, layout, stats[t]))
+        months = np.array([when.month for when in times])
+        for r, (height, variable) in enumerate(layout):
+            if variable in DIFFERENCES:
+                continue
+            for month in np.unique(months):
+                rows = np.nonzero(months == month)[0]
+                groups[(height, variable, int(month))].append((name, [times[t] for t in rows], stats[rows, r]))
+
+    # 时次缺失和重复 | Missing and duplicate periods
+    times = sorted(owners)
+    steps = Counter(b - a for a, b in zip(times, times[1:]))
+    if steps:
+        step = steps.most_common(1)[0][0]
+        for a, b in zip(times, times[1:]):
+            if b - a > step:
+                flags.append((owners[a][-1][0], _time(a), None, None, "gap",
+                              f"{(b - a) // step - 1} missing periods before {b:%Y-%m-%d %H:%M}"))
+    for when, copies in owners.items():
+        name, layout, first = copies[0]
+        for other, other_layout, values in copies[1:]:
+            # 同一文件中的重复已在扫描时报告 | Repeats within one file were reported by the scan
+            if other != name and (other_layout != layout or not np.array_equal(values, first, equal_nan=True)):
+                flags.append((other, _time(when), None, None, "duplicate", f"differs from {name}"))
+
+    # 气候异常 | Climatology outliers
+    for (height, variable, month), members in groups.items():
+        values = np.concatenate([m[2] for m in members])
+        if len(values) < MIN_GROUP:
+            continue
+        median = np.nanmedian(values[:, :3], axis=0)
+        # 几乎不变的量（如全为 0 的降水）不小于打包精度 | Near-constant quantities (e.g. all-zero rain) no finer than the packing precision
+        scale = 1.4826 * np.nanmedian(np.abs(values[:, :3] - median), axis=0)
+        scale = np.maximum(scale, max(float(np.nanmedian(values[:, 3])), 1e-6 * float(np.nanmax(np.abs(median)))))
+        for name, when, rows in members:
+            z = np.abs(rows[:, :3] - median) / scale
+            for t, k in zip(*np.nonzero(z > sigma)):
+                flags.append((name, _time(when[t]), height, variable, "outlier",
+                              f"{STATS[k]} {rows[t, k]:g} vs median {median[k]:g} ± {scale[k]:g} ({z[t, k]:.0f}σ)"))
+    return flags
+
+
+def report(store, sigma=10.0, limit=20):
+    """
+    打印所有问题（每类最多 limit 条），返回问题总数
+    Print every problem (at most limit per kind) and return the total count
+    """
+    flags = [tuple(f) for f in store.file_flags()] + archive_flags(store, sigma)
+    by_kind = defaultdict(list)
+    for flag in flags:
+        by_kind[flag[4]].append(flag)
+    files = sum(1 for _ in store.con.execute("SELECT name FROM files"))
+    print(f"{files} 个文件，{len(flags)} 个问题。")
+    print(f"{files} files, {len(flags)} problems.")
+    for kind, items in sorted(by_kind.items()):
+        print(f"--- {kind}: {len(items)}")
+        for name, when, height, variable, _, detail in sorted(items, key=lambda f: (f[0], f[1] or ""))[:limit]:
+            where = f" {height:g} {variable}" if variable else ""
+            print(f"  {name} {when or ''}{where}: {detail}")
+        if len(items) > limit:
+            print(f"  ... {len(items) - limit} more")
+    return len(flags)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ARL 存档质量检查 | ARL archive QA")
+    sub = ap.add_subparsers(dest="command", required=True)
+    for command, text in (("scan", "扫描新增或变化的文件后报告 | scan new or changed files, then report"),
+                          ("report", "只报告 | report only")):
+        p = sub.add_parser(command, help=text)
+        p.add_argument("--folder", required=True, help="ARL 目录 | ARL folder")
+        p.add_argument("--db", help=f"统计库，默认为目录中的 {STORE_NAME} | statistics store, {STORE_NAME} in the folder by default")
+        p.add_argument("--sigma", type=float, default=10.0, help="气候异常阈值（稳健标准差倍数）| climatology threshold (robust standard deviations)")
+        p.add_argument("--limit", type=int, default=20, help="每类最多列出的问题数 | problems listed per kind")
+        if command == "scan":
+            p.add_argument("--workers", type=int, default=None, help="并行进程数，默认 CPU 核数 | parallel processes, CPU count by default")
+    args = ap.parse_args(argv)
+
+    failed = 0
+    with QaStore(args.db or os.path.join(args.folder, STORE_NAME)) as store:
+        if args.command == "scan":
+            start = time.monotonic()
+            for name, seconds, error in scan(args.folder, store, args.workers):
+                if error:
+                    failed += 1
+                    print(f"[×] {name}：{error}")
+                    print(f"[×] {name}: {error}")
+                else:
+                    print(f"[√] {name}（{seconds:.0f} 秒 | s）")
+            print(f"用时 | wall: {time.monotonic() - start:.0f} s")
+        problems = report(store, args.sigma, args.limit)
+    sys.exit(1 if failed or problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+arl_reader.py – 用内存映射随机读取 era52arl 写出的 ARL 文件
+Random access to the ARL files era52arl writes, through a memory map
+
+ARL 文件由等长的记录组成（50 字节标签 + NX×NY 字节数据）。每个时次以 INDX 记录开始，
+其中列出网格、层次和每层的变量（及校验和），随后按 层次 → 变量 的顺序排列各个场，
+因此任一 (时次, 层次, 变量) 的位置可以直接算出。打开文件只读取第一个 INDX 和各时次的标签，
+取一个场只读取它自己的那一条记录，几 GB 的文件也能立即打开，检查和绘图脚本不必读完整个文件。
+An ARL file is a sequence of equal-length records (a 50-byte label plus
+NX×NY bytes of data). Every time period starts with INDX records listing the
+grid, the levels and each level's variables (with checksums), followed by the
+fields level by level, variable by variable, so the record of any
+(time, level, variable) can be computed directly. Opening a file reads only
+the first INDX and each period's label, and reading a field touches only its
+own record, so multi-GB files open instantly and QA or plotting scripts never
+read the whole file.
+
+数据采用差分打包：每个字节是与前一格点之差按 2^(7−NEXP) 缩放后加 127，每行从上一行的第一个值开始。
+这里用 NumPy 按行累加解包，运算顺序与 HYSPLIT 的 UNPACK 相同（float32）。
+Data use differential packing: every byte is the difference from the previous
+grid point scaled by 2^(7−NEXP) plus 127, each row starting from the first
+value of the row before. Unpacking accumulates row-wise with NumPy in the same
+order as HYSPLIT's UNPACK (float32).
+
+用法 | Usage:
+    with ArlFile("north_6h_1950_01_p1.arl") as arl:
+        print(arl.times[0], arl.levels[3].height, arl.levels[3].variables)
+        temp = arl.field(0, 3, "TEMP")         # (NY, NX)，第 0 行为最南 | row 0 is southernmost
+    python arl_reader.py north_6h_1950_01_p1.arl
+    python arl_reader.py north_6h_1950_01_p1.arl --field 1950-01-01T06 3 TEMP
+"""
+
+import argparse
+import datetime
+import mmap
+import os
+from collections import namedtuple
+
+import numpy as np
+
+LABEL_LEN = 50
+INDEX_LEN = 108
+
+# INDX 记录中 12 个网格参数的顺序（与 arldata.cfg 相同）
+# Order of the 12 grid parameters in the INDX record (same as arldata.cfg)
+GRID_FIELDS = ("pole_lat", "pole_lon", "ref_lat", "ref_lon", "grid_size", "orientation", "cone_angle",
+               "sync_x", "sync_y", "sync_lat", "sync_lon", "reserved")
+
+Label = namedtuple("Label", "time forecast level grid variable exponent precision value")
+Level = namedtuple("Level", "height variables checksums")
+Index = namedtuple("Index", "model forecast minutes grid nx ny nz vertical length levels")
+
+
+class ArlFormatError(ValueError):
+    pass
+
+
+def _year(yy):
+    # 两位年份：与 HYSPLIT 相同，40 以上为 19xx | Two-digit years: 40 and above are 19xx, as in HYSPLIT
+    return 1900 + yy if yy >= 40 else 2000 + yy
+
+
+def parse_label(raw):
+    """
+    50 字节标签 (7I2,A4,I4,2E14.7) → Label；网格号为两个字母时是大网格的 NX/NY 千位
+    50-byte label (7I2,A4,I4,2E14.7) → Label; a two-letter grid number holds the
+    thousands of NX/NY on large grids
+    """
+    text = bytes(raw).decode("ascii")
+    try:
+        yy, mm, dd, hh, fc, level = (int(text[i:i + 2]) for i in range(0, 12, 2))
+        time = datetime.datetime(_year(yy), mm, dd, hh)
+        return Label(time, fc, level, text[12:14], text[14:18], int(text[18:22]),
+                     float(text[22:36]), float(text[36:50]))
+    except ValueError as e:
+        raise ArlFormatError(f"bad record label {text!r}: {e}") from None
+
+
+def _index_head(text, grid_code):
+    # INDX 的固定部分（前 108 个字符）| The fixed part of an INDX (first 108 characters)
+    try:
+        model, forecast, minutes = text[0:4], int(text[4:7]), int(text[7:9])
+        grid = {name: float(text[9 + 7 * i:16 + 7 * i]) for i, name in enumerate(GRID_FIELDS)}
+        nx, ny, nz = int(text[93:96]), int(text[96:99]), int(text[99:102])
+        vertical, length = int(text[102:104]), int(text[104:108])
+    except ValueError as e:
+        raise ArlFormatError(f"bad INDX record: {e}") from None
+    if not grid_code.isdigit():
+        # 大网格：千位写在标签的网格号中 | Large grids keep the thousands in the label's grid number
+        nx += (ord(grid_code[0]) - 64) * 1000
+        ny += (ord(grid_code[1]) - 64) * 1000
+    return model, forecast, minutes, grid, nx, ny, nz, vertical, length
+
+
+def parse_index(text, grid_code="99"):
+    """
+    INDX 记录的数据部分 → Index
+    Data part of an INDX record → Index
+    """
+    head = _index_head(text, grid_code)
+    nz = head[6]
+    levels, pos = [], INDEX_LEN
+    try:
+        for _ in range(nz):
+            height, nvar = float(text[pos:pos + 6]), int(text[pos + 6:pos + 8])
+            pos += 8
+            variables, checksums = [], {}
+            for _ in range(nvar):
+                name, checksum = text[pos:pos + 4], int(text[pos + 4:pos + 7])
+                variables.append(name)
+                checksums[name] = checksum
+                pos += 8
+            levels.append(Level(height, variables, checksums))
+    except ValueError as e:
+        raise ArlFormatError(f"bad INDX level list: {e}") from None
+    return Index(*head, levels)
+
+
+def checksum(packed):
+    """
+    HYSPLIT 的循环校验和：逐字节相加，超过 255 时减去 255
+    HYSPLIT's rotating checksum: bytes summed, subtracting 255 whenever the sum passes 255
+    """
+    # 等价于对 255 取模（0 除外）| Equivalent to the sum modulo 255, except that 0 stays 0
+    total = int(np.frombuffer(packed, dtype=np.uint8).sum(dtype=np.int64))
+    return 0 if total == 0 else (total - 1) % 255 + 1
+
+
+def unpack(packed, nx, ny, exponent, value):
+    """
+    差分打包的字节 → (NY, NX) float32 数组，第 0 行为第一行（ARL 中为最南）
+    Differentially packed bytes → (NY, NX) float32 array, row 0 first (southernmost in ARL)
+    """
+    scale = np.float32(2.0 ** (7 - exponent))
+    diff = (np.frombuffer(packed, dtype=np.uint8, count=nx * ny).reshape(ny, nx).astype(np.float32)
+            - np.float32(127)) / scale
+    # 第一列沿行向下累加，再从第一列沿每行累加 | Accumulate down the first column, then along each row from it
+    first = np.add.accumulate(np.concatenate(([np.float32(value)], diff[:, 0])), dtype=np.float32)[1:]
+    diff[:, 0] = first
+    return np.add.accumulate(diff, axis=1, dtype=np.float32)
+
+
+class ArlFile:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < LABEL_LEN + INDEX_LEN:
+            self._file.close()
+            raise ArlFormatError(f"{path}: too short for an ARL file")
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        first = parse_label(self._buf[:LABEL_LEN])
+        if first.variable != "INDX":
+            self.close()
+            raise ArlFormatError(f"{path}: first record is {first.variable!r}, not INDX")
+        # 先按标签中的网格号读出 NX×NY，再确定记录长度 | NX×NY first, from the label's grid code, then the record length
+        _, _, _, _, self.nx, self.ny, _, _, length = _index_head(
+            self._buf[LABEL_LEN:LABEL_LEN + INDEX_LEN].decode("ascii"), first.grid)
+        self.record_length = LABEL_LEN + self.nx * self.ny
+        # INDX 比一条记录长时跨越多条记录 | An INDX longer than one record spans several
+        self.index_records = -(-length // (self.nx * self.ny))
+        self.index = self._index_at(0)
+        self.levels = self.index.levels
+        self.grid = self.index.grid
+        self._offsets = {}
+        record = self.index_records
+        for n, level in enumerate(self.levels):
+            for variable in level.variables:
+                self._offsets[(n, variable)] = record
+                record += 1
+        self.records_per_time = record
+        self.period_length = record * self.record_length
+        if size % self.period_length:
+            print(f"⚠ {path}: 文件大小不是整数个时次（可能写入未完成）")
+            print(f"⚠ {path}: size is not a whole number of time periods (possibly truncated)")
+        self.times = []
+        for t in range(size // self.period_length):
+            label = parse_label(self._record(t * record, LABEL_LEN))
+            self.times.append(label.time + datetime.timedelta(minutes=self._minutes(t)))
+
+    def close(self):
+        if getattr(self, "_buf", None) is not None:
+            self._buf.close()
+            self._buf = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ---------- 记录 | Records ----------
+    def _record(self, number, length=None):
+        # 只复制这一条记录（或其开头 length 字节）| Copies this record only (or its first length bytes)
+        start = number * self.record_length
+        return self._buf[start:start + (length or self.record_length)]
+
+    def _minutes(self, t):
+        start = t * self.period_length + LABEL_LEN
+        return int(self._buf[start + 7:start + 9])
+
+    def _index_at(self, first):
+        label = parse_label(self._record(first, LABEL_LEN))
+        if label.variable != "INDX":
+            raise ArlFormatError(f"{self.path}: record {first} is {label.variable!r}, not INDX")
+        text = b"".join(self._record(first + k)[LABEL_LEN:] for k in range(self.index_records))
+        return parse_index(text.decode("ascii", errors="replace"), label.grid)
+
+    def time_index(self, time):
+        """
+        时次序号或 datetime → 时次序号
+        Period number or datetime → period number
+        """
+        if isinstance(time, datetime.datetime):
+            try:
+                return self.times.index(time)
+            except ValueError:
+                raise KeyError(f"{self.path}: no time period {time:%Y-%m-%d %H:%M}") from None
+        if not 0 <= time < len(self.times):
+            raise IndexError(f"{self.path}: time period {time} out of range 0..{len(self.times) - 1}")
+        return time
+
+    def record_number(self, time, level, variable):
+        try:
+            offset = self._offsets[(level, variable)]
+        except KeyError:
+            raise KeyError(f"{self.path}: no {variable} at level {level}") from None
+        return self.time_index(time) * self.records_per_time + offset
+
+    def record(self, time, level, variable):
+        """
+        整条记录（标签 + 打包的字节）| The whole record (label + packed bytes)
+        """
+        return self._record(self.record_number(time, level, variable))
+
+    def period(self, time):
+        """
+        一个时次的全部记录（INDX + 各场），可以原样写入另一个网格相同的 ARL 文件
+        All records of one period (INDX + fields), ready to be written unchanged
+        into another ARL file on the same grid
+        """
+        start = self.time_index(time) * self.period_length
+        return self._buf[start:start + self.period_length]
+
+    def raw(self, time, level, variable):
+        """
+        (Label, 打包的字节) —— 只读取这一条记录
+        (Label, packed bytes) – touches this record only
+        """
+        record = self.record(time, level, variable)
+        label = parse_label(record[:LABEL_LEN])
+        if label.variable != variable or label.level != level:
+            raise ArlFormatError(f"{self.path}: expected {variable} at level {level}, "
+                                 f"found {label.variable} at level {label.level}")
+        return label, record[LABEL_LEN:]
+
+    def field(self, time, level, variable):
+        """
+        解包一个场 → (NY, NX) float32，第 0 行为最南，第 0 列为最西
+        Unpack one field → (NY, NX) float32, row 0 southernmost, column 0 westernmost
+        """
+        label, packed = self.raw(time, level, variable)
+        return unpack(packed, self.nx, self.ny, label.exponent, label.value)
+
+    def checksums(self, time):
+        """
+        该时次 INDX 中记录的校验和 → {(层次, 变量): 校验和}
+        Checksums stored in the period's INDX → {(level, variable): checksum}
+        """
+        index = self._index_at(self.time_index(time) * self.records_per_time)
+        return {(n, v): c for n, level in enumerate(index.levels) for v, c in level.checksums.items()}
+
+    # ---------- 网格 | Grid ----------
+    def lats(self):
+        return self.grid["sync_lat"] + self.grid["ref_lat"] * np.arange(self.ny)
+
+    def lons(self):
+        return self.grid["sync_lon"] + self.grid["ref_lon"] * np.arange(self.nx)
+
+
+def describe(arl):
+    """
+    文件的网格、层次和时间范围 → 可写成 JSON 的 dict（时间为 YYYY-MM-DDTHH:MM）
+    Grid, levels and time span of a file → JSON-ready dict (times as YYYY-MM-DDTHH:MM)
+    """
+    steps = {int((b - a).total_seconds()) // 60 for a, b in zip(arl.times, arl.times[1:])}
+    return {
+        "model": arl.index.model,
+        "nx": arl.nx,
+        "ny": arl.ny,
+        "vertical": arl.index.vertical,
+        "grid": arl.grid,
+        "levels": [{"height": level.height, "variables": level.variables} for level in arl.levels],
+        "first": f"{arl.times[0]:%Y-%m-%dT%H:%M}" if arl.times else None,
+        "last": f"{arl.times[-1]:%Y-%m-%dT%H:%M}" if arl.times else None,
+        "periods": len(arl.times),
+        # 时次间隔（分钟），不均匀时为 None | Interval between periods (minutes), None when uneven
+        "interval": steps.pop() if len(steps) == 1 else None,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="查看 ARL 文件 | Inspect an ARL file")
+    ap.add_argument("path")
+    ap.add_argument("--field", nargs=3, metavar=("TIME", "LEVEL", "VARIABLE"),
+                    help="打印一个场的统计，TIME 为序号或 YYYY-MM-DDTHH | print statistics of one field; TIME is a number or YYYY-MM-DDTHH")
+    args = ap.parse_args(argv)
+
+    with ArlFile(args.path) as arl:
+        g = arl.grid
+        print(f"{arl.index.model} {arl.nx}×{arl.ny}, {len(arl.levels)} levels, {len(arl.times)} periods "
+              f"({arl.times[0]:%Y-%m-%d %H:%M} – {arl.times[-1]:%Y-%m-%d %H:%M})" if arl.times else "no periods")
+        print(f"lat {g['sync_lat']:g}–{arl.lats()[-1]:g}, lon {g['sync_lon']:g}–{arl.lons()[-1]:g}, "
+              f"step {g['ref_lat']:g}×{g['ref_lon']:g}")
+        for n, level in enumerate(arl.levels):
+            print(f"{n:3d} {level.height:8g}  {' '.join(level.variables)}")
+        if args.field:
+            time, level, variable = args.field
+            time = datetime.datetime.fromisoformat(time) if "-" in time else int(time)
+            data = arl.field(time, int(level), variable)
+            print(f"{variable} @ {level}: min {data.min():g}, mean {data.mean():g}, max {data.max():g}")
+
+
+if __name__ == "__main__":
+    main()
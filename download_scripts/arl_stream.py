@@ -0,0 +1,421 @@
+"""
+arl_stream.py – 边接收 GRIB 消息边转换：每个时次的消息到齐后立即写出该时次的 ARL 记录
+Streaming GRIB → ARL conversion: every period is written as soon as all its messages have arrived
+
+转换原本要等整对 10 天的气压层/地面 GRIB 文件都下载完成，再把两个文件重新读一遍。
+CDS 的 GRIB 按有效时间排列，这里按到达顺序接收消息：
+Conversion used to wait for the whole 10-day pressure/surface GRIB pair and
+then read both files again. CDS GRIB files are ordered by valid time, so this
+takes messages as they arrive:
+
+    - 每条消息只解析头部并暂存，一个时次的全部 变量 × 层次 到齐后立即解码、打包并写出
+      （arl_packer.py，与 era52arl 的输出逐字节相同），内存中最多保留约一个时次的消息
+      | each message's header is parsed and the message held until its period
+      | has every variable × level; the period is then decoded, packed and
+      | written (arl_packer.py, byte-identical to era52arl), so about one
+      | period of messages is held in memory
+    - 第一个时次的层次和变量：如果 era52arl.cfg 中的全部变量和气压层都已出现就立即确定，
+      否则等两个输入都进入下一个时次（或结束）后按已有的消息确定，与 era52arl 一样只写出找到的变量
+      | the first period's levels and variables are fixed as soon as every
+      | variable and level in era52arl.cfg is present, otherwise once both
+      | inputs have moved past it (or ended), writing only the variables found
+      | as era52arl does
+    - 消息可以来自下载流（标准输入、HTTP 响应）、正在增长的文件或 http_downloader.py 正在写入的 .part，
+      GRIB 不必落盘 | messages can come from a download stream (stdin, an
+      | HTTP response), a growing file or a .part http_downloader.py is still
+      | writing, so the GRIB never has to be kept on disk
+
+命令行 | Command line:
+    curl -s "$URL" | python arl_stream.py --pressure - --single north_6h_single_1950_01.grib \\
+        --cfg ../convert_era52arl/era52arl.cfg -o north_6h_1950_01_p1.arl
+    python arl_stream.py --pressure north_6h_pressure_1950_01_p1.grib --follow --single north_6h_single_1950_01.grib \\
+        --cfg ../convert_era52arl/era52arl.cfg -o north_6h_1950_01_p1.arl
+"""
+
+import argparse
+import mmap
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from arl_packer import (ArlWriter, era52arl_levels, message_grid, read_field, record_sources,
+                        variable_table)
+from grib_decode import GribDecodeError
+from grib_index import scan
+from grib_stream import GribStreamVerifier
+from http_downloader import CHUNK_SIZE, written_prefix
+from met_config import read_era52arl
+
+STREAMS = ("pressure", "single")
+
+
+class MessageReader:
+    """
+    按文件顺序接收数据块，返回其中完整的 GRIB 消息（结构由 GribStreamVerifier 检查）
+    Takes data chunks in file order and returns the complete GRIB messages in
+    them (framing checked by GribStreamVerifier)
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._base = 0
+        self._ready = []
+        self._verifier = GribStreamVerifier(on_message=lambda offset, length: self._ready.append((offset, length)))
+
+    @property
+    def position(self):
+        return self._base + len(self._buf)
+
+    def feed(self, data):
+        self._verifier.feed(self.position, data)
+        self._buf += data
+        if self._verifier.error is not None:
+            raise self._verifier.error
+        messages = [bytes(self._buf[offset - self._base:offset - self._base + length])
+                    for offset, length in self._ready]
+        if self._ready:
+            offset, length = self._ready[-1]
+            del self._buf[:offset + length - self._base]
+            self._base = offset + length
+            self._ready.clear()
+        return messages
+
+    def finish(self):
+        # 检查最后一条消息完整 | Check the last message is complete
+        return self._verifier.finish(self.position)
+
+
+def read_messages(stream, chunk_size=CHUNK_SIZE):
+    """
+    从可读的流（标准输入、HTTP 响应）中逐条读出 GRIB 消息
+    Yield the GRIB messages of a readable stream (stdin, an HTTP response) one by one
+    """
+    reader = MessageReader()
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        yield from reader.feed(data)
+    reader.finish()
+
+
+def follow(path, done=None, poll=1.0, chunk_size=CHUNK_SIZE):
+    """
+    逐条读出正在写入的 GRIB 文件中的消息。下载进行中读取 path.part 已连续写入的部分，
+    改名为 path 后继续读取；done() 为真（默认：path 存在且 .part 已消失）且没有新数据时结束
+    Yield the messages of a GRIB file while it is being written. During a
+    download the contiguously written part of path.part is read, then path once
+    it has been renamed; stops when done() is true (by default: path exists and
+    the .part is gone) and no new data is left
+    """
+    part = path + ".part"
+    if done is None:
+        done = lambda: os.path.exists(path) and not os.path.exists(part)
+    reader = MessageReader()
+    while True:
+        # 先判断是否结束再读取，结束前写入的数据都会被读到 | Checked before reading, so everything written before the end is read
+        finished = done()
+        if os.path.exists(part):
+            source, end = part, written_prefix(part)
+        else:
+            source, end = path, os.path.getsize(path) if os.path.exists(path) else 0
+        if end > reader.position:
+            try:
+                # 每次读取后立即关闭，Windows 上下载器才能把 .part 改名 | Closed after every read so the downloader can rename the .part on Windows
+                with open(source, "rb") as f:
+                    f.seek(reader.position)
+                    data = f.read(min(chunk_size, end - reader.position))
+            except FileNotFoundError:
+                continue
+            yield from reader.feed(data)
+        elif finished:
+            reader.finish()
+            return
+        else:
+            time.sleep(poll)
+
+
+class StreamConverter:
+    """
+    按到达顺序接收 气压层（"pressure"）和地面（"single"）GRIB 消息，每个时次齐全后立即写入 ARL 文件。
+    时次按气压层消息中出现的顺序写出（与 era52arl 相同）；各输入内的消息须按有效时间排列
+    Takes pressure ("pressure") and surface ("single") GRIB messages in arrival
+    order and writes every period to the ARL file as soon as it is complete.
+    Periods are written in the order they appear in the pressure messages (as
+    era52arl does); messages within each input must be in valid-time order
+    """
+
+    def __init__(self, arl_path, cfg_path, streams=STREAMS):
+        self.arl_path = arl_path
+        self.setup = read_era52arl(cfg_path)
+        sfc, atm = variable_table(self.setup, "sfc"), variable_table(self.setup, "atm")
+        plev = [int(p) for p in self.setup["plev"][:self.setup["numlev"][0]]]
+        self._wanted = {"pressure": ({grb for grb, _ in atm.values()}, set(plev)),
+                        "single": ({grb for grb, _ in sfc.values()}, {0})}
+        # era52arl.cfg 中的全部消息：第一个时次包含它们时层次立即确定
+        # Every message era52arl.cfg lists: once the first period has them all, the levels are fixed at once
+        self._full = ({("pressure", grb, p) for grb in self._wanted["pressure"][0] for p in plev}
+                      | {("single", grb, 0) for grb in self._wanted["single"][0]})
+        self._streams = tuple(streams)
+        self._last = dict.fromkeys(self._streams)
+        self._ended = set()
+        self._pending = {}                # 有效时间 → {(输入, 短名, 层次): (数据, 偏移, 长度)} | valid time → {(input, short name, level): (data, offset, length)}
+        self._order = {}                  # 尚未写出的气压层时次（按出现顺序）| Pressure periods not yet written, in order of appearance
+        self._written = set()
+        self._lock = threading.Lock()
+        self._grid = None
+        self._sources = None
+        self._keys = None
+        self.writer = None
+
+    @property
+    def periods(self):
+        return self.writer.periods if self.writer is not None else 0
+
+    # ---------- 输入 | Input ----------
+    def add(self, stream, msg):
+        """
+        接收一条完整的 GRIB 消息（bytes）| Take one complete GRIB message (bytes)
+        """
+        m = scan(msg)[0]
+        with self._lock:
+            self._add(stream, m, msg)
+            self._flush()
+
+    def add_file(self, stream, buf):
+        """
+        接收一个完整文件（bytes 或 mmap）中的全部消息，随后该输入结束。
+        只记录消息位置，写出时才读取，buf 须保持打开直到 close()
+        Take every message of a complete file (bytes or mmap); the input then
+        ends. Only message positions are kept and read when written, so buf
+        must stay open until close()
+        """
+        with self._lock:
+            for m in scan(buf):
+                self._add(stream, m, buf)
+            self._ended.add(stream)
+            self._flush()
+
+    def end(self, stream):
+        # 该输入不会再有消息 | No more messages will come on this input
+        with self._lock:
+            self._ended.add(stream)
+            self._flush()
+
+    def close(self):
+        """
+        写出剩余的完整时次并关闭 ARL 文件；仍有不完整的气压层时次时抛出 GribDecodeError
+        Write the remaining complete periods and close the ARL file; raises
+        GribDecodeError if a pressure period is still incomplete
+        """
+        with self._lock:
+            try:
+                self._ended.update(self._streams)
+                self._flush()
+                if self.writer is None:
+                    raise GribDecodeError("no pressure-level messages listed in era52arl.cfg")
+            finally:
+                self._pending.clear()
+                self._order.clear()
+                if self.writer is not None:
+                    self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pending.clear()
+            if self.writer is not None:
+                self.writer.close()
+        return False
+
+    # ---------- 内部 | Internals ----------
+    def _add(self, stream, m, buf):
+        last = self._last[stream]
+        if last is None or m.valid_time > last:
+            self._last[stream] = m.valid_time
+        names, levels = self._wanted[stream]
+        if m.short_name not in names or m.level not in levels:
+            return
+        when = m.valid_time
+        if when in self._written:
+            if stream == "pressure":
+                raise GribDecodeError(f"{m.short_name} at level {m.level} for {when:%Y-%m-%d %H:%M} "
+                                      "arrived after its period was written")
+            return
+        if stream == "pressure":
+            if self._grid is None:
+                self._grid = message_grid(buf[m.offset:m.offset + m.length])
+            self._order.setdefault(when, None)
+        # 同一个键后出现的覆盖先出现的（与 era52arl 相同）| Later duplicates win, as in era52arl
+        self._pending.setdefault(when, {})[(stream, m.short_name, m.level)] = (buf, m.offset, m.length)
+
+    def _closed(self, when):
+        # 每个输入都已进入更晚的时次或已结束 | Every input has moved past this time or ended
+        return all(s in self._ended or (self._last[s] is not None and self._last[s] > when) for s in self._streams)
+
+    def _flush(self):
+        while self._order:
+            when = next(iter(self._order))
+            found = self._pending.get(when, {})
+            if self._keys is None:
+                if not (self._full <= found.keys() or self._closed(when)):
+                    return
+                self._open(found)
+            missing = self._keys - found.keys()
+            if missing:
+                if self._closed(when):
+                    _, grb, level = sorted(missing)[0]
+                    raise GribDecodeError(f"no {grb} at level {level} for {when:%Y-%m-%d %H:%M}")
+                return
+            self._write(when, found)
+
+    def _open(self, found):
+        # 按第一个时次中找到的变量确定层次（MAKNDX）| Levels from the variables found in the first period (MAKNDX)
+        surface = {grb for stream, grb, _ in found if stream == "single"}
+        upper = {(grb, level) for stream, grb, level in found if stream == "pressure"}
+        levels = era52arl_levels(self.setup, surface, upper)
+        self._sources = record_sources(self.setup, levels)
+        self._keys = {(stream, grb, level) for stream, grb, level, _, _ in self._sources.values()}
+        ni, nj, grid = self._grid
+        self.writer = ArlWriter(self.arl_path, grid, ni, nj, levels)
+
+    def _write(self, when, found):
+        ni, nj = self.writer.nx, self.writer.ny
+        fields = {}
+        for key, (stream, grb, level, units, missing) in self._sources.items():
+            buf, offset, length = found[(stream, grb, level)]
+            fields[key] = np.empty((1, nj, ni), np.float32)
+            try:
+                read_field(buf[offset:offset + length], ni, nj, units, missing, fields[key][0])
+            except GribDecodeError as e:
+                raise GribDecodeError(f"{grb} at {when:%Y-%m-%d %H:%M}: {e}") from None
+        self.writer.write([when], fields)
+        self.writer.flush()
+        del self._order[when]
+        self._written.add(when)
+        # 已写出的时次和更早的仅有地面消息的时次不再需要 | Written periods and earlier surface-only times are no longer needed
+        for t in [t for t in self._pending if t <= when and t not in self._order]:
+            del self._pending[t]
+
+
+class StreamJob:
+    """
+    在后台线程中转换一个正在下载的气压层文件：先读入完整的地面文件，再跟随 pressure_path(.part) 的写入。
+    下载器的 on_event 经 watch() 包装后，收到第一个字节时才开始读取 .part
+    Converts one pressure file on a background thread while it downloads: the
+    complete surface file is read first, then pressure_path(.part) is followed
+    as it is written. With the downloader's on_event wrapped by watch(), the
+    .part is only read once its first byte has arrived
+    """
+
+    def __init__(self, pressure_path, single_path, arl_path, cfg_path, poll=1.0):
+        self.pressure_path = pressure_path
+        self.single_path = single_path
+        self.arl_path = arl_path
+        self.cfg_path = cfg_path
+        self.poll = poll
+        self.periods = 0
+        self.error = None
+        self._started = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def watch(self, on_event):
+        def wrapped(name, **fields):
+            if name in ("first_byte", "last_byte"):
+                self._started.set()
+            on_event(name, **fields)
+        return wrapped
+
+    def finish(self):
+        """
+        下载已结束（成功或失败）：等待转换读完剩余的数据，返回是否成功
+        The download has ended (successfully or not): wait for the conversion to
+        read what is left; returns whether it succeeded
+        """
+        self._done.set()
+        self._started.set()
+        self._thread.join()
+        return self.error is None
+
+    def _run(self):
+        try:
+            with open(self.single_path, "rb") as f:
+                sbuf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    with StreamConverter(self.arl_path, self.cfg_path) as converter:
+                        converter.add_file("single", sbuf)
+                        while not self._started.wait(self.poll) and not os.path.exists(self.pressure_path):
+                            pass
+                        for msg in follow(self.pressure_path, self._done.is_set, self.poll):
+                            converter.add("pressure", msg)
+                    self.periods = converter.periods
+                finally:
+                    sbuf.close()
+        except Exception as e:
+            self.error = e
+
+
+def _idle_done(path, idle):
+    # follow() 的 done：文件（或 .part）idle 秒没有增长即结束 | done for follow(): stop once the file (or .part) has not grown for idle seconds
+    grown = [None, time.monotonic()]
+
+    def done():
+        size = written_prefix(path + ".part") or written_prefix(path)
+        if size != grown[0]:
+            grown[:] = [size, time.monotonic()]
+        return time.monotonic() - grown[1] > idle
+    return done
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="边接收 GRIB 消息边转换为 ARL | Convert GRIB to ARL as the messages arrive")
+    ap.add_argument("--pressure", required=True,
+                    help="气压层 GRIB 文件，- 表示标准输入 | pressure-level GRIB file, - for stdin")
+    ap.add_argument("--single", required=True, help="地面 GRIB 文件（完整）| single-level GRIB file (complete)")
+    ap.add_argument("--cfg", required=True, help="era52arl.cfg")
+    ap.add_argument("-o", "--output", required=True, help="输出的 ARL 文件 | output ARL file")
+    ap.add_argument("--follow", action="store_true",
+                    help="跟随正在写入的文件或 .part，直到下载完成 | follow a file or .part being written until the download completes")
+    ap.add_argument("--idle", type=float, default=None,
+                    help="与 --follow 一起使用：文件这么多秒没有增长即结束 | with --follow: stop once the file has not grown for this many seconds")
+    args = ap.parse_args(argv)
+
+    start = time.monotonic()
+    with open(args.single, "rb") as f:
+        sbuf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with StreamConverter(args.output, args.cfg) as converter:
+                converter.add_file("single", sbuf)
+                if args.pressure == "-":
+                    messages = read_messages(sys.stdin.buffer)
+                else:
+                    if args.follow:
+                        done = _idle_done(args.pressure, args.idle) if args.idle is not None else None
+                    else:
+                        done = lambda: True
+                    messages = follow(args.pressure, done)
+                for msg in messages:
+                    periods = converter.periods
+                    converter.add("pressure", msg)
+                    if converter.periods != periods:
+                        print(f"\r已写出 | written: {converter.periods} periods", end="", flush=True)
+        finally:
+            sbuf.close()
+    print(f"\n已写出 {converter.periods} 个时次（{time.monotonic() - start:.1f} 秒）")
+    print(f"Wrote {converter.periods} periods ({time.monotonic() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
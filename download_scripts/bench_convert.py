@@ -0,0 +1,379 @@
+"""
+bench_convert.py – GRIB → ARL 转换的吞吐量基准测试和分阶段计时
+Throughput benchmark and per-phase timing of the GRIB → ARL conversion
+
+按给定的区域、分辨率、气压层和时次生成类似 ERA5 的合成 GRIB1 文件对（真实的 GDS 和 16 位简单打包，
+与 CDS 提供的消息结构相同），再用每个可用的后端转换：
+Generates a synthetic ERA5-like GRIB1 pair for a given area, resolution,
+pressure levels and time steps (real GDS and 16-bit simple packing, the
+structure of the messages the CDS delivers) and converts it with every
+available backend:
+
+    - era52arl：convert_chunks.py 调用的 Fortran 程序（需要编译好的 era52arl 和 ecCodes）
+      | the Fortran program convert_chunks.py runs (needs a built era52arl and ecCodes)
+    - numpy：arl_packer.py（convert_chunks.py --backend numpy）| arl_packer.py (convert_chunks.py --backend numpy)
+    - stream：arl_stream.py，气压层消息逐条送入 | arl_stream.py with the pressure messages fed one by one
+
+每次转换在新的子进程中运行，报告 字段记录/秒、输入 GRIB MB/秒、峰值内存（RSS）和 CPU 用户/系统时间，
+并检查各后端的输出是否逐字节相同。NumPy 后端还按阶段计时：
+Every conversion runs in a fresh child process and reports field records/s,
+input GRIB MB/s, peak memory (RSS) and user/system CPU time, and whether the
+backends' outputs are byte-identical. The NumPy backends are also timed by phase:
+
+    index 扫描消息头 | scanning message headers · decode GRIB 解码 | GRIB decoding ·
+    flip_units 南北翻转和单位换算 | north–south flip and unit conversion ·
+    pack 差分打包（PAKINP 的算法）| differential packing (PAKINP's algorithm) ·
+    write 残差场、标签和写盘 | residual fields, labels and disk writes · other 其余 | the rest
+
+era52arl 是外部程序，没有分阶段计时；它与 numpy 后端的算法相同，后者的分阶段结果可以作为参考，
+CPU 用户/系统时间则显示计算与 I/O 的比例。
+era52arl is an external program and has no phase timing; it runs the same
+algorithm as the numpy backend, whose breakdown serves as a guide, and its
+user/system CPU time shows the share of computing versus I/O.
+
+用法 | Usage:
+    python bench_convert.py --days 1 --levels 1000 850 500 --area 60 100 15 150
+    python bench_convert.py --backends numpy stream --repeat 3 --json results.jsonl
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from met_config import read_era52arl, write_era52arl
+from mock_cds import PARAM_IDS
+
+try:
+    import resource
+except ImportError:                      # Windows：没有峰值内存 | Windows: no peak memory
+    resource = None
+
+BACKENDS = ("era52arl", "numpy", "stream")
+DEFAULT_AREA = [90, -25, 0, 180]
+
+ERA52ARL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "convert_era52arl")
+
+
+# ---------- 合成 GRIB | Synthetic GRIB ----------
+def _height(p):
+    # 标准大气中气压层的高度（米）| Height of a pressure level in the standard atmosphere (m)
+    return 44331.0 * (1 - (p / 1013.25) ** 0.1903)
+
+
+def field_range(short_name, level):
+    """
+    ERA5 单位下该变量的典型 (平均值, 变化幅度) | Typical (mean, spread) of the variable in ERA5 units
+    """
+    h = _height(level) if level else 0.0
+    return {
+        "z": (9.80665 * h, 400.0 + 0.02 * h), "t": (max(288.15 - 0.0065 * h, 216.65), 10.0),
+        "u": (5.0, 15.0), "v": (0.0, 15.0), "w": (0.0, 0.5), "r": (60.0, 30.0),
+        "q": (0.01 * np.exp(-h / 2500), 0.004 * np.exp(-h / 2500)),
+        "2t": (280.0, 10.0), "10u": (0.0, 8.0), "10v": (0.0, 8.0), "sp": (95000.0, 3000.0),
+    }.get(short_name, (1.0, 0.5))
+
+
+def _ibm(x):
+    # 整数 → IBM 单精度浮点（|x| < 2^24 时精确）| Integer → IBM single float (exact for |x| < 2^24)
+    if x == 0:
+        return bytes(4)
+    sign, m, e = (0x80 if x < 0 else 0), abs(int(x)), 70
+    while m >= 1 << 24:
+        m >>= 4
+        e += 1
+    while m < 1 << 20:
+        m <<= 4
+        e -= 1
+    return bytes([sign | e]) + m.to_bytes(3, "big")
+
+
+def _signed2(value):
+    return ((0x8000 | -value) if value < 0 else value).to_bytes(2, "big")
+
+
+def _signed3(value):
+    return ((0x800000 | -value) if value < 0 else value).to_bytes(3, "big")
+
+
+def grib1_field(short_name, level, valid_time, values, area, step):
+    """
+    (NJ, NI) 数组（自北向南）→ 一条 16 位简单打包的 GRIB1 消息；level 为 0 表示地面
+    (NJ, NI) array (north to south) → one GRIB1 message with 16-bit simple packing; level 0 means surface
+    """
+    north, west, south, east = area
+    nj, ni = values.shape
+    reference = float(np.floor(values.min()))
+    span = float(values.max()) - reference
+    binary = int(np.ceil(np.log2(span / 65535))) if span > 0 else 0
+    x = np.clip(np.round((values - reference) / 2.0 ** binary), 0, 65535).astype(">u2")
+
+    # 与 CDS 的 ERA5 消息相同，PDS 带 ECMWF 本地定义 1（class=ea, type=an, stream=oper, expver=0001）；
+    # era52arl 读取其中的 perturbationNumber
+    # As in the CDS's ERA5 messages the PDS carries ECMWF local definition 1 (class=ea,
+    # type=an, stream=oper, expver=0001); era52arl reads its perturbationNumber
+    pds = bytearray(52)
+    pds[0:3] = len(pds).to_bytes(3, "big")
+    pds[40:49] = bytes([1, 23, 2]) + (1025).to_bytes(2, "big") + b"0001"
+    pds[3], pds[4], pds[7] = 128, 98, 0x80
+    pds[8] = PARAM_IDS[short_name]
+    pds[9] = 100 if level else 1
+    pds[10:12] = int(level).to_bytes(2, "big")
+    pds[12] = (valid_time.year - 1) % 100 + 1
+    pds[13:17] = bytes([valid_time.month, valid_time.day, valid_time.hour, valid_time.minute])
+    pds[17] = 1
+    pds[24] = (valid_time.year - 1) // 100 + 1
+    gds = bytearray(32)
+    gds[0:3] = len(gds).to_bytes(3, "big")
+    gds[4] = 255
+    gds[6:8], gds[8:10] = ni.to_bytes(2, "big"), nj.to_bytes(2, "big")
+    gds[10:13], gds[13:16] = _signed3(round(north * 1000)), _signed3(round(west * 1000))
+    gds[16] = 0x80
+    gds[17:20], gds[20:23] = _signed3(round(south * 1000)), _signed3(round(east * 1000))
+    gds[23:25] = gds[25:27] = round(step * 1000).to_bytes(2, "big")
+    data = x.tobytes()
+    fill = (11 + len(data)) % 2
+    bds = ((11 + len(data) + fill).to_bytes(3, "big") + bytes([8 * fill]) + _signed2(binary)
+           + _ibm(reference) + bytes([16]) + data + bytes(fill))
+    body = bytes(pds) + bytes(gds) + bds
+    return b"GRIB" + (8 + len(body) + 4).to_bytes(3, "big") + b"\x01" + body + b"7777"
+
+
+def write_inputs(folder, cfg_template, area, step, levels, times, seed=0):
+    """
+    在 folder 中写出 pressure.grib、single.grib 和 era52arl.cfg（按 CDS 的顺序：时次 → 变量 → 层次），
+    返回三个路径
+    Write pressure.grib, single.grib and era52arl.cfg into folder (in CDS
+    order: time → variable → level) and return the three paths
+    """
+    north, west, south, east = area
+    ni, nj = round((east - west) / step) + 1, round((north - south) / step) + 1
+    cfg = os.path.join(folder, "era52arl.cfg")
+    write_era52arl(cfg, cfg_template, levels)
+    setup = read_era52arl(cfg)
+    atm = setup["atmgrb"][:setup["numatm"][0]]
+    sfc = setup["sfcgrb"][:setup["numsfc"][0]]
+    levels = sorted((int(p) for p in levels), reverse=True)
+
+    # 平滑的形态加上几种噪声，逐条消息轮换，生成速度不成为瓶颈
+    # A smooth pattern plus a few noise fields rotated per message, so generation is not the bottleneck
+    rng = np.random.default_rng(seed)
+    pattern = np.sin(np.linspace(0, 3, ni))[None, :] + np.cos(np.linspace(0, 2, nj))[:, None]
+    noise = [0.3 * rng.standard_normal((nj, ni)) for _ in range(4)]
+    count = [0]
+
+    def values(short_name, level):
+        mean, spread = field_range(short_name, level)
+        count[0] += 1
+        return mean + spread * (pattern + np.roll(noise[count[0] % 4], count[0], axis=1))
+
+    pressure, single = os.path.join(folder, "pressure.grib"), os.path.join(folder, "single.grib")
+    with open(pressure, "wb") as pf, open(single, "wb") as sf:
+        for when in times:
+            for short_name in atm:
+                for level in levels:
+                    pf.write(grib1_field(short_name, level, when, values(short_name, level), area, step))
+            for short_name in sfc:
+                sf.write(grib1_field(short_name, 0, when, values(short_name, 0), area, step))
+    return pressure, single, cfg
+
+
+# ---------- 计时 | Timing ----------
+def _install_timers(totals):
+    # 在子进程中包装各阶段的函数，累计耗时 | Wrap each phase's functions in the child process and add up their time
+    import arl_packer
+    import arl_stream
+
+    def timed(name, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                totals[name] = totals.get(name, 0.0) + time.perf_counter() - start
+        return wrapper
+
+    # arl_stream 导入的是同一个函数 | arl_stream imported the very same functions
+    arl_packer.scan = arl_stream.scan = timed("index", arl_packer.scan)
+    arl_packer.read_field = arl_stream.read_field = timed("read", arl_packer.read_field)
+    arl_packer.decode = timed("decode", arl_packer.decode)
+    arl_packer.pack = timed("pack", arl_packer.pack)
+    arl_packer.ArlWriter.write = timed("writer", arl_packer.ArlWriter.write)
+
+
+def _phases(totals, wall):
+    # 嵌套的计时相减得到各阶段的独占时间 | Nested timers subtracted into exclusive phase times
+    read, writer = totals.get("read", 0.0), totals.get("writer", 0.0)
+    phases = {
+        "index": totals.get("index", 0.0),
+        "decode": totals.get("decode", 0.0),
+        "flip_units": read - totals.get("decode", 0.0),
+        "pack": totals.get("pack", 0.0),
+        "write": writer - totals.get("pack", 0.0),
+    }
+    phases["other"] = wall - phases["index"] - read - writer
+    return {k: round(v, 3) for k, v in phases.items()}
+
+
+def _convert_stream(pressure, single, cfg, arl):
+    from arl_stream import StreamConverter, read_messages
+    with open(single, "rb") as f, open(pressure, "rb") as p:
+        sbuf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with StreamConverter(arl, cfg) as converter:
+                converter.add_file("single", sbuf)
+                for msg in read_messages(p):
+                    converter.add("pressure", msg)
+        finally:
+            sbuf.close()
+
+
+def run_backend(backend, folder, pressure, single, cfg, era52arl_dir):
+    """
+    在子进程中运行：转换一次，返回耗时、资源占用和（NumPy 后端）分阶段计时
+    Runs in a child process: convert once and return the wall time, resource
+    usage and (NumPy backends) the phase breakdown
+    """
+    arl = os.path.join(folder, f"{backend}.arl")
+    totals = {}
+    if backend != "era52arl":
+        _install_timers(totals)
+    start = time.perf_counter()
+    if backend == "stream":
+        _convert_stream(pressure, single, cfg, arl)
+    else:
+        from convert_chunks import convert_pair
+        convert_pair(era52arl_dir, folder, os.path.basename(pressure), os.path.basename(single),
+                     os.path.basename(arl), backend=backend)
+    wall = time.perf_counter() - start
+    result = {"wall_s": wall, "phases": _phases(totals, wall) if totals else None}
+    if resource is not None:
+        own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        # Linux 上 ru_maxrss 的单位为 KB | ru_maxrss is in KB on Linux
+        result["peak_rss_mb"] = max(own.ru_maxrss, children.ru_maxrss) / 1024
+        result["cpu_user_s"] = own.ru_utime + children.ru_utime
+        result["cpu_sys_s"] = own.ru_stime + children.ru_stime
+    return result
+
+
+def available(backend, era52arl_dir):
+    if backend == "era52arl":
+        return os.access(os.path.join(era52arl_dir, "era52arl"), os.X_OK)
+    return True
+
+
+def _digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def run_once(args, folder, inputs, backend):
+    from arl_reader import ArlFile
+    pressure, single, cfg = inputs
+    arl = os.path.join(folder, f"{backend}.arl")
+    if os.path.exists(arl):
+        os.remove(arl)
+    # 每次一个新进程（spawn），峰值内存不受之前运行的影响 | A fresh (spawned) process each time, so peak memory is its own
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        result = pool.submit(run_backend, backend, folder, pressure, single, cfg, args.era52arl_dir).result()
+    with ArlFile(arl) as out:
+        records = len(out.times) * sum(len(level.variables) for level in out.levels)
+        periods = len(out.times)
+    wall = result["wall_s"]
+    grib = os.path.getsize(pressure) + os.path.getsize(single)
+    return {
+        "backend": backend,
+        "wall_s": round(wall, 3),
+        "periods": periods,
+        "records": records,
+        "records_per_s": round(records / wall, 1),
+        "mb_per_s": round(grib / wall / 1e6, 2),
+        "arl_mb": round(os.path.getsize(arl) / 1e6, 2),
+        "peak_rss_mb": round(result.get("peak_rss_mb", 0.0), 1) if resource is not None else None,
+        "cpu_user_s": round(result["cpu_user_s"], 2) if resource is not None else None,
+        "cpu_sys_s": round(result["cpu_sys_s"], 2) if resource is not None else None,
+        "sha1": _digest(arl),
+        "phases": result["phases"],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="GRIB → ARL 转换基准测试 | GRIB → ARL conversion benchmark")
+    ap.add_argument("--area", type=float, nargs=4, metavar=("NORTH", "WEST", "SOUTH", "EAST"), default=DEFAULT_AREA,
+                    help="合成数据的区域（默认与下载相同）| area of the synthetic data (the download area by default)")
+    ap.add_argument("--step", type=float, default=0.25, help="网格间距（度）| grid spacing (degrees)")
+    ap.add_argument("--levels", type=float, nargs="+",
+                    help="气压层（hPa），默认为 era52arl.cfg 中的全部 | pressure levels (hPa), all of era52arl.cfg by default")
+    ap.add_argument("--days", type=float, default=1, help="合成数据的天数 | days of synthetic data")
+    ap.add_argument("--hours", type=int, default=6, help="时次间隔（小时）| hours between periods")
+    ap.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    ap.add_argument("--era52arl-dir", default=ERA52ARL_DIR, help="era52arl 程序和 era52arl.cfg 所在目录 | folder with the era52arl program and era52arl.cfg")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--keep", help="把合成数据和输出留在这个目录 | keep the synthetic data and outputs in this folder")
+    ap.add_argument("--json", help="把结果追加到 JSON Lines 文件 | append results to a JSON Lines file")
+    args = ap.parse_args(argv)
+
+    template = os.path.join(args.era52arl_dir, "era52arl.cfg")
+    setup = read_era52arl(template)
+    levels = args.levels or setup["plev"][:setup["numlev"][0]]
+    start = datetime.datetime(2000, 1, 1)
+    times = [start + datetime.timedelta(hours=h) for h in range(0, int(args.days * 24), args.hours)]
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+    folder = args.keep or tempfile.mkdtemp(prefix="bench_convert_")
+    try:
+        t0 = time.perf_counter()
+        inputs = write_inputs(folder, template, args.area, args.step, levels, times, args.seed)
+        grib_mb = sum(os.path.getsize(p) for p in inputs[:2]) / 1e6
+        print(f"合成数据 | synthetic data: {len(times)} periods × {len(levels)} levels, "
+              f"{grib_mb:.1f} MB GRIB ({time.perf_counter() - t0:.1f} s)")
+
+        results = []
+        for backend in args.backends:
+            if not available(backend, args.era52arl_dir):
+                print(f"跳过 {backend}：没有可执行的 {os.path.join(args.era52arl_dir, 'era52arl')}")
+                print(f"skipping {backend}: no executable {os.path.join(args.era52arl_dir, 'era52arl')}")
+                continue
+            for _ in range(args.repeat):
+                try:
+                    results.append(run_once(args, folder, inputs, backend))
+                except Exception as e:
+                    print(f"[×] {backend}: {type(e).__name__}: {e}")
+                    break
+
+        columns = ["backend", "wall_s", "records", "records_per_s", "mb_per_s", "peak_rss_mb", "cpu_user_s", "cpu_sys_s"]
+        print(" ".join(f"{c:>13s}" for c in columns) + "  identical")
+        reference = results[0]["sha1"] if results else None
+        for r in results:
+            print(" ".join(f"{str(r[c]):>13s}" for c in columns) + f"  {'yes' if r['sha1'] == reference else 'NO'}")
+        for r in results:
+            if r["phases"]:
+                share = "  ".join(f"{k} {v:.2f}s ({v / r['wall_s']:.0%})" for k, v in r["phases"].items())
+                print(f"{r['backend']:>13s}: {share}")
+
+        if args.json:
+            config = {k: v for k, v in vars(args).items() if k not in ("json", "keep")}
+            config["levels"] = [float(p) for p in levels]
+            with open(args.json, "a") as f:
+                for r in results:
+                    f.write(json.dumps({"config": config, **r}) + "\n")
+    finally:
+        if not args.keep:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
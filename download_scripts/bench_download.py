@@ -0,0 +1,104 @@
+"""
+bench_download.py – 用本地 CDS 替身回放多年下载计划的基准测试
+Benchmark that replays a multi-year download plan against the local CDS stand-in
+
+每次运行在临时目录中用 mock_cds.MockCDS 跑完整的 DownloadEngine（提交 → 下载 → 检查 → 重试），
+报告耗时、最大并发任务数、吞吐量以及重试/失败次数，便于离线、可重复地比较下载引擎的改动。
+Each run drives the full DownloadEngine (submit → download → verify → retry)
+against mock_cds.MockCDS in a temporary folder and reports wall time, peak
+in-flight jobs, throughput and retry/failure counts, so download-engine
+changes can be compared offline and reproducibly.
+
+用法 | Usage:
+    python bench_download.py --start 1950 --end 1951 --max-in-flight 8 --latency 0.5 --truncate-rate 0.05
+    python bench_download.py ... --json results.jsonl      # 追加一行 JSON 结果 | append one JSON line of results
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import time
+
+from era5_download import PRODUCTS, DownloadEngine
+from mock_cds import MockCDS
+
+
+def run_once(args, seed):
+    cds = MockCDS(latency=args.latency, running_jobs=args.running_jobs, url_ttl=args.url_ttl,
+                  truncate_rate=args.truncate_rate, corrupt_rate=args.corrupt_rate,
+                  field_bytes=args.field_bytes, seed=seed)
+    folder = tempfile.mkdtemp(prefix="bench_download_")
+    log = io.StringIO()
+    try:
+        start = time.perf_counter()
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(log):
+            engine = DownloadEngine(folder, {name: PRODUCTS[name] for name in args.products}, client=cds.client(),
+                                    max_in_flight=args.max_in_flight, download_segments=args.segments,
+                                    target_mb=args.target_mb, max_retries=args.retries, retry_delay=args.retry_delay)
+            engine.run(args.start, args.end)
+        wall = time.perf_counter() - start
+        rows = engine.ledger.in_state("verified")
+        nbytes = sum(row["bytes"] or 0 for row in rows)
+        result = {
+            "seed": seed,
+            "wall_s": round(wall, 3),
+            "chunks": len(rows),
+            "failed": len(engine.ledger.in_state("failed")),
+            "bytes": nbytes,
+            "mb_per_s": round(nbytes / wall / 1e6, 3) if wall else 0.0,
+            "peak_in_flight": engine.scheduler.peak_in_flight,
+            "peak_cds_jobs": cds.peak_jobs,
+            "cds_submitted": cds.submitted,
+            "cds_rejected": cds.rejected,
+            "failed_attempts": sum(engine._attempts.values()),
+            "truncated_transfers": cds.truncated,
+            "corrupted_results": cds.corrupted,
+        }
+        engine.ledger.close()
+        return result
+    finally:
+        cds.close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="下载引擎基准测试 | Download engine benchmark")
+    ap.add_argument("--start", type=int, default=1950)
+    ap.add_argument("--end", type=int, default=1951)
+    ap.add_argument("--products", nargs="+", choices=sorted(PRODUCTS), default=sorted(PRODUCTS))
+    ap.add_argument("--max-in-flight", type=int, default=8)
+    ap.add_argument("--segments", type=int, default=4)
+    ap.add_argument("--target-mb", type=float, default=3200)
+    ap.add_argument("--retries", type=int, default=3)
+    ap.add_argument("--retry-delay", type=float, default=0.2)
+    ap.add_argument("--latency", type=float, default=0.2, help="CDS 处理一个任务的平均秒数 | mean seconds per CDS job")
+    ap.add_argument("--running-jobs", type=int, default=4, help="CDS 同时运行的任务数 | CDS jobs running at once")
+    ap.add_argument("--url-ttl", type=float, default=3600)
+    ap.add_argument("--truncate-rate", type=float, default=0.0)
+    ap.add_argument("--corrupt-rate", type=float, default=0.0)
+    ap.add_argument("--field-bytes", type=int, default=2048, help="每条消息数据部分的字节数 | data bytes per message")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="把结果追加到 JSON Lines 文件 | append results to a JSON Lines file")
+    ap.add_argument("--verbose", action="store_true", help="显示下载引擎的输出 | show the engine output")
+    args = ap.parse_args(argv)
+
+    results = [run_once(args, args.seed + i) for i in range(args.repeat)]
+    columns = ["seed", "wall_s", "chunks", "failed", "mb_per_s", "peak_in_flight", "peak_cds_jobs", "failed_attempts",
+               "truncated_transfers", "corrupted_results"]
+    print(" ".join(f"{c:>12s}" for c in columns))
+    for r in results:
+        print(" ".join(f"{r[c]:>12}" for c in columns))
+
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k not in ("json", "verbose")}
+        with open(args.json, "a") as f:
+            for r in results:
+                f.write(json.dumps({"config": config, **r}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+cds_scheduler.py – 有界并发的 CDS 请求调度器
+Bounded-concurrency scheduler for CDS requests
+
+固定数量的工作线程从队列中取任务，任何一个任务结束后立即补上下一个，
+因此同时在 CDS 排队/下载的任务数始终保持为 N（不超过 CDS 的 150 个任务限制）。
+A fixed pool of worker threads pulls tasks from a queue; as soon as one task
+finishes the next one starts, so exactly N requests are in flight at any time
+(keep N below the CDS limit of 150 queued tasks).
+
+用法 | Usage:
+    scheduler = CDSScheduler(max_in_flight=8)
+    scheduler.submit("north_6h_pressure_1950_01_p1.grib", download_task, ...)
+    scheduler.join()
+"""
+
+import queue
+import threading
+
+# CDS 对单个账号同时排队的任务上限
+# CDS limit of queued tasks per account
+CDS_TASK_LIMIT = 150
+
+
+class CDSScheduler:
+    def __init__(self, max_in_flight=8, report_interval=60):
+        if not 1 <= max_in_flight <= CDS_TASK_LIMIT:
+            raise ValueError(f"max_in_flight must be in 1..{CDS_TASK_LIMIT}, got {max_in_flight}")
+        self.max_in_flight = max_in_flight
+        self.report_interval = report_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stop = threading.Event()
+        self._delayed = 0
+        self._delayed_done = threading.Condition(self._lock)
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.peak_in_flight = 0
+
+    # 排队等待的任务数 | Number of tasks waiting in the queue
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    # 添加任务，工作线程按提交顺序执行
+    # Add a task; workers run tasks in submission order
+    def submit(self, name, func, *args, **kwargs):
+        self._queue.put((name, func, args, kwargs))
+        self._start_workers()
+
+    # delay 秒后再加入队列（用于失败重试），join() 会等待这些任务
+    # Add a task to the queue after delay seconds (for retries); join() waits for these too
+    def submit_later(self, delay, name, func, *args, **kwargs):
+        with self._lock:
+            self._delayed += 1
+
+        def fire():
+            self.submit(name, func, *args, **kwargs)
+            with self._lock:
+                self._delayed -= 1
+                self._delayed_done.notify_all()
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        timer.start()
+
+    # 打印当前队列深度 | Print current queue depth
+    def report(self):
+        with self._lock:
+            in_flight, completed, failed, delayed = self.in_flight, self.completed, self.failed, self._delayed
+        print(f"[队列] 进行中 {in_flight}/{self.max_in_flight}，等待 {self.pending}，"
+              f"已完成 {completed}，失败 {failed}，等待重试 {delayed}")
+        print(f"[Queue] In flight {in_flight}/{self.max_in_flight}, pending {self.pending}, "
+              f"completed {completed}, failed {failed}, awaiting retry {delayed}")
+
+    # 阻塞直到所有任务完成 | Block until all tasks have finished
+    def join(self):
+        reporter = threading.Thread(target=self._report_loop, daemon=True)
+        reporter.start()
+        while True:
+            self._queue.join()
+            with self._lock:
+                if self._delayed == 0:
+                    break
+                self._delayed_done.wait()
+        self._stop.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        for t in self._workers:
+            t.join()
+        self._workers = []
+        self.report()
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._workers) < self.max_in_flight:
+                t = threading.Thread(target=self._worker, daemon=True)
+                self._workers.append(t)
+                t.start()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            name, func, args, kwargs = item
+            with self._lock:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            ok = False
+            try:
+                # 任务函数返回 False 视为失败
+                # A task returning False is counted as failed
+                ok = func(*args, **kwargs) is not False
+            except Exception as e:
+                print(f"任务 {name} 发生错误：{e}")
+                print(f"Error occurred in task {name}: {e}")
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                self._queue.task_done()
+                # 每完成一个任务报告一次队列深度
+                # Report queue depth every time a task finishes
+                self.report()
+
+    def _report_loop(self):
+        while not self._stop.wait(self.report_interval):
+            self.report()
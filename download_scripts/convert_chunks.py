@@ -0,0 +1,246 @@
+"""
+convert_chunks.py – 并行把 GRIB 分块转换为 ARL（替代 convert_grib_to_arl_WEEKLY.sh 的串行循环）
+Convert GRIB chunks to ARL in parallel (replaces the serial loop of convert_grib_to_arl_WEEKLY.sh)
+
+convert_grib_to_arl_WEEKLY.sh 在写死的 target_years 循环中逐个转换，但每个分块互不依赖。
+era52arl 在当前目录写固定名称的辅助文件（ERA52ARL.MESSAGE、arldata.cfg），
+因此这里为每个任务建立单独的临时目录，在其中运行 era52arl，成功后再把 .arl 改名到数据目录，
+多个 era52arl 进程可以同时运行：
+convert_grib_to_arl_WEEKLY.sh converts one chunk at a time inside a hard-coded
+target_years loop, although every chunk is independent. era52arl writes
+fixed-name side files (ERA52ARL.MESSAGE, arldata.cfg) into its working
+directory, so every job here runs in its own scratch directory and the .arl
+is renamed into the data folder only on success, letting several era52arl
+processes run at once:
+
+    - 自动列出数据目录中所有 气压层/地面 文件对（按 chunk_plan.csv，没有计划时按同名规则）
+      | discovers every pressure/surface pair in the data folder (via chunk_plan.csv, or the same-name rule without a plan)
+    - 已有 .arl 的分块和台账中标记为 failed 的分块跳过，中断后重新运行即可继续
+      | skips chunks whose .arl exists or that the ledger marks failed, so a rerun resumes
+    - 每个分块的输出和 ERA52ARL.MESSAGE 写入 convert_logs/<分块>.log
+      | each chunk's output and ERA52ARL.MESSAGE go to convert_logs/<chunk>.log
+    - 结束时打印吞吐量汇总 | prints a throughput summary at the end
+
+命令行（在能运行 era52arl 的 Linux/WSL 环境中）| Command line (in a Linux/WSL environment that runs era52arl):
+    python convert_chunks.py --folder /mnt/f/ERA5_pressure_level --era52arl-dir ../convert_era52arl --years 1960
+    python convert_chunks.py --folder /mnt/f/ERA5_pressure_level --era52arl-dir ../convert_era52arl --workers 12
+    python convert_chunks.py --folder /mnt/f/ERA5_pressure_level --era52arl-dir ../convert_era52arl --backend numpy
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from request_planner import PLAN_NAME, read_plan, surface_for
+from task_ledger import LEDGER_NAME, LedgerError, TaskLedger, parse_filename
+from telemetry import EVENTS_NAME, Telemetry
+
+LOG_DIR = "convert_logs"
+SCRATCH_PREFIX = ".era52arl_"
+
+
+def scratch_dir(folder, arl):
+    """
+    一个转换任务的临时目录（在数据目录内，改名不跨磁盘）
+    Scratch directory of one conversion job (inside the data folder, so the rename stays on one drive)
+    """
+    return os.path.join(folder, SCRATCH_PREFIX + os.path.splitext(arl)[0])
+
+
+def era52arl_cfg(era52arl_dir, folder):
+    """
+    转换使用的 era52arl.cfg：数据目录中的（traj_levels.py 写出的裁剪层次）优先
+    The era52arl.cfg conversion uses: the data folder's (pruned levels written by traj_levels.py) takes precedence
+    """
+    cfg = os.path.join(folder, "era52arl.cfg")
+    return cfg if os.path.exists(cfg) else os.path.join(era52arl_dir, "era52arl.cfg")
+
+
+# 在单独的临时目录中转换一个分块，先写入临时文件，成功后再重命名到数据目录。
+# era52arl 的文件名参数最长 80 个字符，因此 GRIB 文件使用相对路径。
+# 数据目录中有 era52arl.cfg（traj_levels.py 写出的裁剪层次）时优先使用它。
+# Convert one chunk in its own scratch directory, writing to a temporary name
+# that is renamed into the data folder only on success. era52arl file
+# arguments are limited to 80 characters, so the GRIB files are passed as
+# relative names. An era52arl.cfg in the data folder (the pruned levels
+# written by traj_levels.py) takes precedence.
+# backend="numpy" 用 arl_packer.py 在本进程中转换（输出与 era52arl 逐字节相同）。
+# backend="numpy" converts in-process with arl_packer.py (byte-identical to era52arl).
+def convert_pair(era52arl_dir, folder, pressure, single, arl, log_path=None, backend="era52arl"):
+    scratch = scratch_dir(folder, arl)
+    shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch)
+    try:
+        shutil.copyfile(era52arl_cfg(era52arl_dir, folder), os.path.join(scratch, "era52arl.cfg"))
+        tmp = arl + ".tmp"
+        if backend == "numpy":
+            _convert_numpy(folder, scratch, pressure, single, tmp, log_path)
+            os.replace(os.path.join(scratch, tmp), os.path.join(folder, arl))
+            return
+        cmd = [os.path.abspath(os.path.join(era52arl_dir, "era52arl")), "-dera52arl.cfg",
+               f"-i{os.path.join(os.pardir, pressure)}", f"-a{os.path.join(os.pardir, single)}",
+               f"-f{os.path.join(os.pardir, single)}", f"-o{tmp}"]
+        result = subprocess.run(cmd, cwd=scratch, capture_output=True, text=True)
+        if log_path:
+            message = os.path.join(scratch, "ERA52ARL.MESSAGE")
+            with open(log_path, "w") as f:
+                f.write(" ".join(cmd) + f"\nexit {result.returncode}\n\n{result.stdout}{result.stderr}")
+                if os.path.exists(message):
+                    with open(message, "r", errors="replace") as m:
+                        f.write("\n--- ERA52ARL.MESSAGE ---\n" + m.read())
+        if result.returncode != 0 or not os.path.exists(os.path.join(scratch, tmp)):
+            raise RuntimeError(f"era52arl exit {result.returncode}: {result.stdout[-500:]}")
+        os.replace(os.path.join(scratch, tmp), os.path.join(folder, arl))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _convert_numpy(folder, scratch, pressure, single, tmp, log_path=None):
+    # 延迟导入：只有选择 numpy 后端时才需要 NumPy | Imported lazily: NumPy is needed only for the numpy backend
+    from arl_packer import convert
+    start = time.monotonic()
+    try:
+        periods = convert(os.path.join(folder, pressure), os.path.join(folder, single),
+                          os.path.join(scratch, tmp), os.path.join(scratch, "era52arl.cfg"))
+        status = f"ok: {periods} periods in {time.monotonic() - start:.1f} s\n"
+    except Exception as e:
+        status = f"error: {e}\n"
+        raise RuntimeError(f"arl_packer: {e}") from e
+    finally:
+        if log_path:
+            with open(log_path, "w") as f:
+                f.write(f"arl_packer {pressure} {single} -> {tmp}\n{status}")
+
+
+def find_pairs(folder, years=None, arl_prefix="north_6h"):
+    """
+    数据目录中的全部分块 → [(气压层文件, 地面文件, ARL 文件), ...]，按分块排序
+    Every chunk in the data folder → [(pressure file, surface file, ARL file), ...] in chunk order
+    """
+    plan = read_plan(os.path.join(folder, PLAN_NAME))
+    pairs = []
+    for path in glob.glob(os.path.join(folder, "*_pressure_*_p*.grib")):
+        pressure = os.path.basename(path)
+        product, chunk = parse_filename(pressure)
+        if product != "pressure" or (years and int(chunk[:4]) not in years):
+            continue
+        pairs.append((pressure, surface_for(plan, pressure), f"{arl_prefix}_{chunk}.arl"))
+    pairs.sort(key=lambda p: parse_filename(p[0])[1])
+    return pairs
+
+
+def _convert_one(era52arl_dir, folder, pressure, single, arl, backend="era52arl"):
+    # 在池中运行：era52arl 后端每个任务是一个独立的进程，numpy 后端在进程池的工作进程中计算
+    # Runs in the pool: with era52arl every job is its own process, with numpy it computes in a pool worker process
+    start = time.monotonic()
+    log_path = os.path.join(folder, LOG_DIR, os.path.splitext(arl)[0] + ".log")
+    try:
+        convert_pair(era52arl_dir, folder, pressure, single, arl, log_path, backend)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return pressure, single, arl, time.monotonic() - start, error
+
+
+def _record(ledger, filename, state):
+    if ledger is None:
+        return
+    try:
+        ledger.set_state(filename, state)
+    except LedgerError as e:
+        print(f"⚠ 台账未更新 | ledger not updated: {e}")
+
+
+def convert_all(folder, era52arl_dir, pairs, workers=None, ledger=None, telemetry=None, backend="era52arl"):
+    """
+    并行转换 pairs，返回 [(气压层文件, 地面文件, ARL 文件, 秒, 错误), ...]
+    Convert pairs in parallel; returns [(pressure, surface, ARL, seconds, error), ...]
+    """
+    os.makedirs(os.path.join(folder, LOG_DIR), exist_ok=True)
+    results = []
+    # era52arl 在子进程中运行，线程足够；numpy 后端在 Python 中计算，要用进程池才不受 GIL 限制
+    # era52arl runs as a child process, so threads suffice; the numpy backend computes in
+    # Python and needs a process pool to get past the GIL
+    executor = ProcessPoolExecutor if backend == "numpy" else ThreadPoolExecutor
+    with executor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_convert_one, era52arl_dir, folder, *pair, backend) for pair in pairs]
+        for n, future in enumerate(as_completed(futures), 1):
+            pressure, single, arl, seconds, error = result = future.result()
+            results.append(result)
+            if error:
+                print(f"[×] ({n}/{len(pairs)}) 转换失败 {arl}：{error}")
+                print(f"[×] ({n}/{len(pairs)}) Conversion failed {arl}: {error}")
+                continue
+            _record(ledger, pressure, "converted")
+            _record(ledger, single, "converted")
+            if telemetry is not None:
+                telemetry.emit("converted", pressure, arl=arl, seconds=round(seconds, 1))
+                telemetry.emit("converted", single, arl=arl)
+            print(f"[√] ({n}/{len(pairs)}) 已生成 {arl}（{seconds:.0f} 秒）")
+            print(f"[√] ({n}/{len(pairs)}) Generated {arl} ({seconds:.0f} s)")
+    return results
+
+
+def print_summary(folder, results, wall):
+    done = [r for r in results if not r[4]]
+    grib = sum(os.path.getsize(os.path.join(folder, r[0])) for r in done)
+    arl = sum(os.path.getsize(os.path.join(folder, r[2])) for r in done)
+    busy = sum(r[3] for r in results)
+    print("\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print(f"转换 | converted: {len(done)}, 失败 | failed: {len(results) - len(done)}, "
+          f"用时 | wall: {wall:.0f} s")
+    if done and wall > 0:
+        print(f"吞吐量 | throughput: {len(done) / wall * 3600:.1f} chunks/h, "
+              f"GRIB {grib / 1e6 / wall:.1f} MB/s → ARL {arl / 1e6 / wall:.1f} MB/s")
+        print(f"每个分块 | per chunk: {busy / len(results):.0f} s, 并行度 | parallelism: {busy / wall:.1f}×")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="并行转换 GRIB 分块为 ARL | Convert GRIB chunks to ARL in parallel")
+    ap.add_argument("--folder", required=True, help="数据目录 | data folder")
+    ap.add_argument("--era52arl-dir", required=True, help="era52arl 所在目录 | era52arl folder")
+    ap.add_argument("--years", type=int, nargs="+", help="只转换这些年份（默认全部）| only these years (all by default)")
+    ap.add_argument("--workers", type=int, default=None, help="同时转换的分块数（era52arl 进程或 numpy 工作进程），默认 CPU 核数 | concurrent conversions (era52arl processes or numpy worker processes), CPU count by default")
+    ap.add_argument("--backend", choices=("era52arl", "numpy"), default="era52arl",
+                    help="转换后端：era52arl 程序或 arl_packer.py（需要 NumPy）| converter: the era52arl binary or arl_packer.py (needs NumPy)")
+    ap.add_argument("--events", default="", help="计时事件日志路径，默认在数据目录中 | timing event log, in the data folder by default")
+    args = ap.parse_args(argv)
+
+    pairs, skipped = [], 0
+    ledger_path = os.path.join(args.folder, LEDGER_NAME)
+    ledger = TaskLedger(ledger_path) if os.path.exists(ledger_path) else None
+    for pressure, single, arl in find_pairs(args.folder, args.years):
+        if os.path.exists(os.path.join(args.folder, arl)):
+            skipped += 1
+            continue
+        if not os.path.exists(os.path.join(args.folder, single)):
+            print(f"[×] 缺少地面数据 | missing surface data: {single}")
+            continue
+        if ledger is not None and "failed" in (ledger.state(pressure), ledger.state(single)):
+            print(f"[×] 台账标记为 failed，跳过 | ledger marks it failed, skipping: {pressure}")
+            continue
+        pairs.append((pressure, single, arl))
+    print(f"待转换 {len(pairs)} 个分块，已有 {skipped} 个 .arl。")
+    print(f"{len(pairs)} chunks to convert, {skipped} .arl files already exist.")
+    if not pairs:
+        return
+
+    events = os.path.join(args.folder, EVENTS_NAME) if args.events == "" else args.events
+    start = time.monotonic()
+    try:
+        results = convert_all(args.folder, args.era52arl_dir, pairs, args.workers, ledger, Telemetry(events),
+                              args.backend)
+    finally:
+        if ledger is not None:
+            ledger.close()
+    print_summary(args.folder, results, time.monotonic() - start)
+    sys.exit(1 if any(r[4] for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
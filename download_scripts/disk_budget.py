@@ -0,0 +1,297 @@
+"""
+disk_budget.py – 下载、转换和 HYSPLIT 共用的磁盘空间预算
+Disk space budget shared by the download, conversion and HYSPLIT stages
+
+下载引擎原来会一次排入数 TB 的 GRIB 请求，HYSPLIT 批处理脚本又自行删除 .arl 文件，
+F:/G: 盘写满后任务中途失败。DiskBudget 只在预计大小能放下时才允许开始新的下载或转换：
+The download engine used to queue terabytes of GRIB while the HYSPLIT batch
+script deleted .arl files on its own, so the F:/G: drives filled up and jobs
+died halfway. DiskBudget only admits a new download or conversion once its
+projected size fits:
+
+    预计大小 | projected size
+        GRIB：分块计划的估算 × 同产品已下载文件的 实际/估算 比例（中位数）
+              | chunk plan estimate × median actual/estimate ratio of the product's finished files
+        ARL： 气压层 GRIB 大小 × 已转换文件的 ARL/GRIB 比例（没有记录时按 1）
+              | pressure GRIB size × ARL/GRIB ratio of finished conversions (1 until one is seen)
+    可用空间 | room
+        min(磁盘剩余 − min_free, budget − 数据目录已用) − 进行中任务尚未写入的部分
+        | min(disk free − min_free, budget − data folder usage) − bytes still to come from admitted tasks
+
+空间不足时按依赖顺序删除已经用过的文件，每类中最早的先删：
+When room is short, files that are no longer needed are evicted in
+dependency order, oldest first within each class:
+    1. 已生成 ARL（或已 consumed）的气压层 GRIB（及 .idx）| pressure GRIB (and .idx) whose ARL exists (or is consumed)
+    2. 覆盖的气压层分块都已转换的地面 GRIB | surface GRIB whose pressure chunks are all converted
+    3. 台账中标记为 consumed（HYSPLIT 已用完）的 ARL | ARL marked consumed (HYSPLIT is done with it)
+
+仍然放不下时等待其他任务完成或 HYSPLIT 释放文件，超过 max_wait 秒抛出 DiskBudgetError。
+调度器中的任务使用 try_admit：放不下时立即返回 False，由调用方稍后重新排队，不占用工作线程。
+If it still does not fit the call waits for other tasks to finish or HYSPLIT
+to release files, raising DiskBudgetError after max_wait seconds. Scheduler
+tasks use try_admit instead, which returns False right away so the caller can
+requeue the task later without holding a worker thread.
+
+命令行（供 HYSPLIT 批处理脚本使用）| Command line (for the HYSPLIT batch script):
+    python disk_budget.py --folder G:\\ERA5_pressure_levels --budget-gb 2000 --min-free-gb 50 status
+    python disk_budget.py --folder G:\\ERA5_pressure_levels --budget-gb 2000 --min-free-gb 50 evict
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import threading
+import time
+
+from convert_chunks import SCRATCH_PREFIX
+from task_ledger import LEDGER_NAME, TaskLedger
+
+# 计入数据目录用量的文件 | Files counted as data folder usage
+DATA_SUFFIXES = (".grib", ".part", ".idx", ".arl", ".tmp")
+
+
+class DiskBudgetError(RuntimeError):
+    pass
+
+
+class DiskBudget:
+    def __init__(self, folder, ledger, budget_bytes=None, min_free_bytes=0, arl_prefix="north_6h",
+                 max_wait=6 * 3600, poll_interval=60):
+        self.folder = folder
+        self.ledger = ledger
+        self.budget_bytes = budget_bytes
+        self.min_free_bytes = min_free_bytes
+        self.arl_prefix = arl_prefix
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.plan = []
+        self._ratios = {}
+        self._admitted = {}   # 名称 → (字节数, [路径]) | name → (bytes, [paths])
+        self._waiting = {}    # 名称 → 优先级 | name → priority
+        self._queued = {}     # try_admit 中等待的名称 → 第一次尝试的时刻 | name waiting in try_admit → time of its first try
+        self._cond = threading.Condition()
+        self.evicted_bytes = 0
+
+    # ---------- 估算 | Estimates ----------
+    def observe(self, kind, estimate, actual):
+        """
+        记录一次 实际/估算 比例（kind 为产品名或 "arl"）
+        Record one actual/estimate ratio (kind is a product name or "arl")
+        """
+        if estimate and actual:
+            with self._cond:
+                self._ratios.setdefault(kind, []).append(actual / estimate)
+
+    def projected(self, kind, estimate):
+        with self._cond:
+            ratios = self._ratios.get(kind)
+            ratio = statistics.median(ratios) if ratios else 1.0
+        return int(estimate * ratio)
+
+    def load_history(self, plan):
+        """
+        用台账中已下载文件的大小初始化各产品的比例
+        Seed the per-product ratios from the sizes of files already in the ledger
+        """
+        self.plan = plan
+        for row in plan:
+            ledger_row = self.ledger.get(row["filename"])
+            if ledger_row and ledger_row["bytes"]:
+                self.observe(row["product"], row["est_bytes"], ledger_row["bytes"])
+
+    # ---------- 空间 | Space ----------
+    def used(self):
+        # 包括转换临时目录（.era52arl_*）中正在写入的 ARL
+        # Includes the ARL being written in the conversion scratch directories (.era52arl_*)
+        total = 0
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.startswith(SCRATCH_PREFIX) and entry.is_dir():
+                    with os.scandir(entry.path) as scratch:
+                        total += sum(e.stat().st_size for e in scratch if e.is_file())
+                elif entry.name.endswith(DATA_SUFFIXES) and entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def _pending(self):
+        # 已允许的任务还要写入的字节数 | Bytes admitted tasks have yet to write
+        pending = 0
+        for nbytes, paths in self._admitted.values():
+            written = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+            pending += max(0, nbytes - written)
+        return pending
+
+    def room(self):
+        room = shutil.disk_usage(self.folder).free - self.min_free_bytes
+        if self.budget_bytes is not None:
+            room = min(room, self.budget_bytes - self.used())
+        return room - self._pending()
+
+    # ---------- 准入 | Admission ----------
+    def admit(self, name, nbytes, paths, priority=(), reserve=0):
+        """
+        等到 nbytes 能放下（必要时先删除已用过的文件），然后登记；paths 是该任务会写出的文件。
+        等待的任务按 priority 从小到大依次放行；reserve 是放行后仍须留下的空间
+        （下载为一次转换留出空间，否则 GRIB 占满预算后转换无法进行，也就没有文件可以删除）。
+        Wait until nbytes fits (evicting used files first if needed), then register
+        the task; paths are the files it will write. Waiting tasks go in
+        ascending priority; reserve is room that must remain afterwards (downloads
+        keep room for one conversion, otherwise GRIB could fill the budget, no
+        conversion could run and nothing would become evictable).
+        """
+        if self.budget_bytes is not None and nbytes + reserve > self.budget_bytes:
+            raise DiskBudgetError(f"{name}: {nbytes / 1e9:.1f} GB is larger than the whole disk budget")
+        deadline = time.monotonic() + self.max_wait
+        waiting = False
+        with self._cond:
+            self._waiting[name] = priority
+            try:
+                while True:
+                    if min(self._waiting.values()) == priority:
+                        short = nbytes + reserve - self.room()
+                        if short > 0:
+                            short -= self.evict(short)
+                        if short <= 0:
+                            self._admitted[name] = (nbytes, list(paths))
+                            return
+                    if time.monotonic() >= deadline:
+                        raise DiskBudgetError(f"{name}: not enough room within the disk budget")
+                    if not waiting:
+                        waiting = True
+                        print(f"⏸ {name} 需要 {nbytes / 1e9:.1f} GB，空间不足，等待释放……")
+                        print(f"⏸ {name} needs {nbytes / 1e9:.1f} GB, waiting for disk space...")
+                    self._cond.wait(self.poll_interval)
+            finally:
+                del self._waiting[name]
+                self._cond.notify_all()
+
+    def try_admit(self, name, nbytes, paths, priority=(), reserve=0):
+        """
+        不等待的 admit：能放下时登记并返回 True；否则返回 False，任务仍按 priority 留在等待队列中
+        （优先级更低的任务继续让行），由调用方稍后再试。从第一次尝试起超过 max_wait 仍放不下时抛出 DiskBudgetError。
+        admit without waiting: registers the task and returns True if it fits,
+        otherwise returns False and keeps the task queued at its priority (so
+        lower-priority tasks still give way) for the caller to try again later.
+        Raises DiskBudgetError once max_wait has passed since the first try.
+        """
+        if self.budget_bytes is not None and nbytes + reserve > self.budget_bytes:
+            raise DiskBudgetError(f"{name}: {nbytes / 1e9:.1f} GB is larger than the whole disk budget")
+        with self._cond:
+            first = name not in self._queued
+            since = self._queued.setdefault(name, time.monotonic())
+            self._waiting[name] = priority
+            admitted = False
+            if min(self._waiting.values()) == priority:
+                short = nbytes + reserve - self.room()
+                if short > 0:
+                    short -= self.evict(short)
+                admitted = short <= 0
+            if admitted or time.monotonic() - since >= self.max_wait:
+                del self._waiting[name]
+                del self._queued[name]
+                self._cond.notify_all()
+                if not admitted:
+                    raise DiskBudgetError(f"{name}: not enough room within the disk budget")
+                self._admitted[name] = (nbytes, list(paths))
+                return True
+        if first:
+            print(f"⏸ {name} 需要 {nbytes / 1e9:.1f} GB，空间不足，稍后重试……")
+            print(f"⏸ {name} needs {nbytes / 1e9:.1f} GB, retrying once disk space is freed...")
+        return False
+
+    def release(self, name):
+        with self._cond:
+            self._admitted.pop(name, None)
+            self._cond.notify_all()
+
+    # ---------- 清理 | Eviction ----------
+    def _arl_path(self, chunk):
+        return os.path.join(self.folder, f"{self.arl_prefix}_{chunk}.arl")
+
+    def _covered_converted(self, single):
+        # 地面文件覆盖的气压层分块是否都已转换 | Whether every pressure chunk the surface file covers is converted
+        rows = [r for r in self.plan if r["filename"] == single]
+        if not rows:
+            return False
+        s = rows[0]
+        for r in self.plan:
+            if (r["product"] == "pressure" and r["year"] == s["year"] and r["month"] == s["month"]
+                    and s["first_day"] <= r["first_day"] and r["last_day"] <= s["last_day"]):
+                if self.ledger.state(r["filename"]) not in ("converted", "consumed"):
+                    return False
+        return True
+
+    def candidates(self):
+        """
+        可删除的文件，按删除顺序 → [(路径列表, 说明), ...]
+        Evictable files in eviction order → [(paths, description), ...]
+        """
+        grib, single, arl = [], [], []
+        for row in self.ledger.in_state("converted", "consumed"):
+            path = os.path.join(self.folder, row["filename"])
+            if os.path.exists(path):
+                paths = [path, path + ".idx"]
+                if row["product"] == "pressure" and (row["state"] == "consumed" or os.path.exists(self._arl_path(row["chunk"]))):
+                    grib.append((row["converted_at"] or 0, paths, "converted GRIB"))
+                elif row["product"] == "single" and self._covered_converted(row["filename"]):
+                    single.append((row["converted_at"] or 0, paths, "converted surface GRIB"))
+            if row["state"] == "consumed" and row["product"] == "pressure" and os.path.exists(self._arl_path(row["chunk"])):
+                arl.append((row["consumed_at"] or 0, [self._arl_path(row["chunk"])], "consumed ARL"))
+        ordered = []
+        for group in (grib, single, arl):
+            ordered.extend((paths, what) for _, paths, what in sorted(group, key=lambda c: c[0]))
+        return ordered
+
+    def evict(self, nbytes):
+        """
+        按顺序删除文件直到释放 nbytes，返回释放的字节数
+        Evict files in order until nbytes are freed; returns the bytes freed
+        """
+        freed = 0
+        for paths, what in self.candidates():
+            if freed >= nbytes:
+                break
+            for path in paths:
+                if os.path.exists(path):
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    freed += size
+            print(f"🗑 已删除 {what}：{os.path.basename(paths[0])}")
+            print(f"🗑 Evicted {what}: {os.path.basename(paths[0])}")
+        self.evicted_bytes += freed
+        return freed
+
+
+def main(argv=None):
+    from request_planner import PLAN_NAME, read_plan
+
+    ap = argparse.ArgumentParser(description="数据目录磁盘预算 | Data folder disk budget")
+    ap.add_argument("--folder", required=True, help="数据目录 | data folder")
+    ap.add_argument("--budget-gb", type=float, help="数据目录最多占用的空间 | most space the data folder may use")
+    ap.add_argument("--min-free-gb", type=float, default=0, help="磁盘至少保留的剩余空间 | free space to keep on the disk")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="打印用量和可删除的文件 | print usage and evictable files")
+    p = sub.add_parser("evict", help="删除已用过的文件直到满足预算 | evict used files until within budget")
+    p.add_argument("--need-gb", type=float, default=0, help="额外需要的空间 | extra space needed")
+    args = ap.parse_args(argv)
+
+    ledger = TaskLedger(os.path.join(args.folder, LEDGER_NAME))
+    budget = DiskBudget(args.folder, ledger, args.budget_gb * 1e9 if args.budget_gb else None, args.min_free_gb * 1e9)
+    budget.plan = read_plan(os.path.join(args.folder, PLAN_NAME))
+    try:
+        if args.cmd == "status":
+            candidates = budget.candidates()
+            print(f"已用 | used: {budget.used() / 1e9:.1f} GB, 可用 | room: {budget.room() / 1e9:.1f} GB")
+            print(f"可删除 | evictable: {len(candidates)} files, "
+                  f"{sum(os.path.getsize(p) for paths, _ in candidates for p in paths if os.path.exists(p)) / 1e9:.1f} GB")
+        else:
+            short = args.need_gb * 1e9 - budget.room()
+            freed = budget.evict(short) if short > 0 else 0
+            print(f"释放 | freed: {freed / 1e9:.1f} GB, 可用 | room: {budget.room() / 1e9:.1f} GB")
+    finally:
+        ledger.close()
+
+
+if __name__ == "__main__":
+    main()
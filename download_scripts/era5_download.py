@@ -0,0 +1,665 @@
+"""
+era5_download.py – 由产品表驱动的 ERA5 下载引擎
+ERA5 download engine driven by a product table
+
+气压层和地面数据只在 PRODUCTS 表中的数据集、请求参数和文件名前缀上不同。
+两个产品的分块按时间顺序交错进入同一个调度队列，某个气压层分块与覆盖它的地面文件
+都下载完成后立即触发该分块的转换，不必等待整个气压层回填结束。
+stream_convert=True 时，地面文件已下载完成的气压层分块在下载过程中即转换（arl_stream.py），
+最后一个字节到达时 ARL 也已写好。
+Pressure-level and single-level data differ only in the dataset, request and
+filename prefix listed in PRODUCTS. Chunks of both products are interleaved in
+time order in one scheduler queue, and as soon as a pressure-level chunk and
+the surface file covering it are both downloaded, that chunk is handed to
+conversion without waiting for the whole pressure-level backfill.
+With stream_convert=True a pressure chunk whose surface file is already
+downloaded is converted while it downloads (arl_stream.py), so its ARL is
+ready when the last byte arrives.
+
+用法：修改文件末尾的配置后运行 python era5_download.py
+Usage: edit the settings at the end of this file, then run python era5_download.py
+"""
+
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from cds_scheduler import CDSScheduler
+from convert_chunks import convert_pair, era52arl_cfg, scratch_dir
+from disk_budget import DiskBudget, DiskBudgetError
+from grib_index import index_file
+from grib_inventory import check_inventory
+from grib_stream import GribFramingError, GribStreamVerifier, verify_file
+from http_downloader import download, url_alive
+from request_cache import RequestCache
+from request_planner import PLAN_NAME, matches_estimate, plan_month, plan_row, read_plan, surface_for, write_plan
+from task_ledger import LEDGER_NAME, TaskLedger
+from telemetry import EVENTS_NAME, Telemetry
+from traj_footprint import AREAS_NAME, read_areas
+from traj_levels import LEVELS_NAME, read_levels
+
+# 产品表：变量名称（如 temperature）可在ERA5网站上查到
+# Product table; variable names (e.g. temperature) can be found on the ERA5 website
+PRODUCTS = {
+    "pressure": {
+        "dataset": "reanalysis-era5-pressure-levels",
+        "prefix": "north_6h_pressure",
+        "legacy_tasks": "submitted_tasks.txt",
+        "request": {
+            "product_type": ["reanalysis"],
+            "variable": [
+                "geopotential", "relative_humidity", "specific_humidity",
+                "temperature", "u_component_of_wind", "v_component_of_wind",
+                "vertical_velocity"
+            ],
+            "time": ["00:00", "06:00", "12:00", "18:00"],
+            "pressure_level": [
+                "1", "3", "7", "20", "50", "100", "150", "200", "250",
+                "350", "450", "550", "650", "750", "800", "850", "900", "950", "1000"
+            ],
+            "data_format": "grib",
+            "download_format": "unarchived",
+            "area": [90, -25, 0, 180]
+        },
+    },
+    "single": {
+        "dataset": "reanalysis-era5-single-levels",
+        "prefix": "north_6h_single",
+        "legacy_tasks": "submitted_single_tasks.txt",
+        "request": {
+            "product_type": ["reanalysis"],
+            "variable": [
+                "10m_u_component_of_wind",
+                "10m_v_component_of_wind",
+                "2m_temperature",
+                "surface_pressure"
+            ],
+            "time": ["00:00", "06:00", "12:00", "18:00"],
+            "data_format": "grib",
+            "download_format": "unarchived",
+            "area": [90, -25, 0, 180]
+        },
+    },
+}
+
+# ARL 文件名前缀：north_6h_YYYY_MM_pN.arl
+# ARL filename prefix: north_6h_YYYY_MM_pN.arl
+ARL_PREFIX = "north_6h"
+
+
+def arl_name(year, month, part):
+    return f"{ARL_PREFIX}_{year}_{month:02d}_p{part}.arl"
+
+
+class DownloadEngine:
+    def __init__(self, output_folder, products=PRODUCTS, client=None, max_in_flight=8,
+                 download_segments=4, target_mb=3200, era52arl_dir=None, max_retries=3, retry_delay=300,
+                 events_path="", areas="", levels="", disk_budget_gb=None, min_free_gb=None,
+                 cache_dir=None, convert_workers=1, convert_backend="era52arl", stream_convert=False):
+        os.makedirs(output_folder, exist_ok=True)
+        self.output_folder = output_folder
+        # 下载的气压层（traj_levels.py），默认读取数据目录中的 pressure_levels.txt；None 表示使用产品表中的层次
+        # Pressure levels to download (traj_levels.py), read by default from
+        # pressure_levels.txt in the data folder; None keeps the product table's levels
+        if levels == "":
+            levels = os.path.join(output_folder, LEVELS_NAME)
+            levels = levels if os.path.exists(levels) else None
+        self.levels = read_levels(levels) if isinstance(levels, str) else (list(levels) if levels else None)
+        self.products = products
+        self.download_segments = download_segments
+        self.target_bytes = target_mb * 1e6
+        self.era52arl_dir = era52arl_dir
+        # 转换后端：era52arl 程序，或 arl_packer.py（"numpy"，仍读取 era52arl_dir 中的 era52arl.cfg）
+        # Converter: the era52arl binary, or arl_packer.py ("numpy", which still reads era52arl.cfg from era52arl_dir)
+        self.convert_backend = convert_backend
+        # 边下载边转换（arl_stream.py）：地面文件已就绪时，气压层分块在下载过程中逐个时次写出 ARL
+        # Streaming conversion (arl_stream.py): once the surface file is ready, a pressure chunk's
+        # ARL is written period by period while it downloads
+        self.stream_convert = stream_convert
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._attempts = {}
+        # 每个分块的计时事件（JSON Lines），默认写在数据目录中；None 表示不记录
+        # Per-chunk timing events (JSON Lines), by default in the data folder; None disables them
+        if events_path == "":
+            events_path = os.path.join(output_folder, EVENTS_NAME)
+        self.telemetry = Telemetry(events_path)
+        # 每月的下载区域 {月: [北, 西, 南, 东]}（traj_footprint.py），默认读取数据目录中的 footprint_areas.csv；
+        # None 表示始终使用产品表中的区域
+        # Per-month download areas {month: [north, west, south, east]} (traj_footprint.py), read by default
+        # from footprint_areas.csv in the data folder; None always uses the area in the product table
+        if areas == "":
+            areas = os.path.join(output_folder, AREAS_NAME)
+            areas = areas if os.path.exists(areas) else None
+        self.areas = read_areas(areas) if isinstance(areas, str) else (areas or {})
+
+        # 任务台账，并导入旧版 submitted_*tasks.txt 中的记录
+        # Task ledger, importing records from the old submitted_*tasks.txt files
+        self.ledger = TaskLedger(os.path.join(output_folder, LEDGER_NAME))
+        for spec in products.values():
+            if spec.get("legacy_tasks"):
+                self.ledger.import_legacy(os.path.join(output_folder, spec["legacy_tasks"]))
+
+        # 磁盘预算：设置 disk_budget_gb 或 min_free_gb 后，下载和转换只在预计大小能放下时开始
+        # Disk budget: with disk_budget_gb or min_free_gb set, downloads and conversions
+        # only start once their projected size fits
+        self.budget = None
+        if disk_budget_gb is not None or min_free_gb is not None:
+            self.budget = DiskBudget(output_folder, self.ledger,
+                                     disk_budget_gb * 1e9 if disk_budget_gb is not None else None,
+                                     (min_free_gb or 0) * 1e9, ARL_PREFIX)
+
+        # 按请求内容寻址的 GRIB 缓存（可供多个项目共用），命中时不再向 CDS 提交
+        # Content-addressed GRIB cache (may be shared between projects); a hit skips CDS
+        self.cache = RequestCache(cache_dir) if cache_dir else None
+
+        if client is None:
+            import cdsapi
+            client = cdsapi.Client()
+        self.client = client
+
+        # 下载队列与转换队列（每个 era52arl 进程在自己的临时目录中运行，可以同时转换多个分块）
+        # Download queue and conversion queue (every era52arl process runs in its own
+        # scratch directory, so several chunks can be converted at once)
+        self.scheduler = CDSScheduler(max_in_flight=max_in_flight)
+        self.converter = CDSScheduler(max_in_flight=convert_workers)
+        # numpy 后端在 Python 中计算：放到工作进程中，转换不与下载线程争用 GIL，多个转换也能用满多个核
+        # The numpy backend computes in Python: it runs in worker processes so conversions
+        # neither hold the GIL against the download threads nor share one core
+        self._convert_pool = (ProcessPoolExecutor(max_workers=convert_workers)
+                              if era52arl_dir and convert_backend == "numpy" else None)
+        self.plan = []
+        self._pair_lock = threading.Lock()
+        self._paired = set()
+
+    # ---------- 计划 | Planning ----------
+    def plan_tasks(self, start_year, end_year, product_names=None):
+        """
+        列出所有分块，按 (年, 月, 起始日, 产品) 排序，使两个产品交错排队
+        List every chunk ordered by (year, month, first day, product) so the two products interleave
+        """
+        tasks = []
+        for year in range(start_year - 1, end_year + 1):
+            # 起始年份前一年只下载12月（用于HYSPLIT后向轨迹计算）
+            # Only December of the year before start_year (for HYSPLIT back trajectories)
+            month_range = [12] if year == start_year - 1 else range(1, 13)
+            for month in month_range:
+                # 分块天数按产品表中的完整区域和层次确定，缩小后文件名仍为 p1/p2/p3（HYSPLIT 脚本按此列出文件）
+                # Days per chunk follow the full area and levels in the product table, so a
+                # smaller request keeps the p1/p2/p3 names the HYSPLIT scripts list
+                chunks = [(name, idx, days, f"{self.products[name]['prefix']}_{year}_{month:02d}_p{idx}.grib")
+                          for name in product_names or self.products
+                          for idx, days in plan_month(year, month, self.products[name]["request"], self.target_bytes)]
+                area = self.month_area(month, [filename for _, _, _, filename in chunks])
+                for name, idx, days, filename in chunks:
+                    spec = self.products[name]
+                    base = dict(spec["request"])
+                    if area:
+                        base["area"] = area
+                    if self.levels and "pressure_level" in base:
+                        base["pressure_level"] = self.levels
+                    req = dict(base, year=[str(year)], month=[f"{month:02d}"], day=days)
+                    tasks.append({
+                        "product": name, "dataset": spec["dataset"], "request": req,
+                        "filename": filename, "filepath": os.path.join(self.output_folder, filename),
+                        "year": year, "month": month, "part": idx, "days": days,
+                        "plan": plan_row(filename, name, year, month, idx, days, base),
+                    })
+        tasks.sort(key=lambda t: (t["year"], t["month"], int(t["days"][0]), t["product"]))
+        return tasks
+
+    def month_area(self, month, filenames):
+        """
+        本月的下载区域（None 表示产品表中的区域）。台账中已有记录的月份沿用记录的请求中的区域
+        （没有请求参数的旧记录是完整区域），使同一个月的气压层和地面文件网格一致，era52arl 才能转换
+        This month's download area (None means the product table's area). A month
+        already in the ledger keeps the area of its recorded request (old rows
+        without a request used the full area), so the pressure and surface files
+        of a month share one grid, as era52arl requires
+        """
+        for filename in filenames:
+            row = self.ledger.get(filename)
+            if row is not None:
+                return json.loads(row["request"]).get("area") if row["request"] else None
+        return self.areas.get(month)
+
+    def needs_download(self, task):
+        """
+        根据台账中的状态决定是否需要下载（每个分块一次查询）
+        Decide from the chunk's ledger state (one lookup per chunk)
+        """
+        filename, filepath = task["filename"], task["filepath"]
+        state = self.ledger.state(filename)
+        if state is None:
+            # 台账启用前已存在的文件：登记后跳过
+            # Files that predate the ledger: register them and skip
+            arl_filepath = os.path.join(self.output_folder, arl_name(task["year"], task["month"], task["part"]))
+            if os.path.exists(arl_filepath):
+                self.ledger.set_state(filename, "converted")
+                state = "converted"
+            elif matches_estimate(filepath, task["plan"]["est_bytes"]):
+                self.ledger.set_state(filename, "downloading", bytes=os.path.getsize(filepath))
+                state = "downloading"
+        if state in ("verified", "converted", "consumed"):
+            print(f"[跳过] {filename} 状态为 {state}。")
+            print(f"[Skip] {filename} is {state}.")
+            return False
+        if state == "downloading" and os.path.exists(filepath):
+            # 旧文件，或在改名与检查之间中断的下载：就地检查 | Legacy files, or a download cut off between rename and check: verify in place
+            return not self.verify_existing(task)
+        return True
+
+    def verify_existing(self, task):
+        """
+        检查已在磁盘上的分块（GRIB 消息结构 + 消息清单），标记为 verified 或 failed。
+        消息清单按台账中记录的请求比较（没有记录的旧文件按产品表中的请求）；只多出消息（例如层次裁剪前
+        下载的旧文件）时给出警告并记为 verified。文件从不在这里删除：failed 的分块重新下载，新文件下载完成后才替换它
+        Check a chunk already on disk (GRIB framing + inventory) and mark it
+        verified or failed. The inventory is compared with the request recorded in
+        the ledger (the product table's request for old files without one); a file
+        that only has extra messages (say an old file from before the levels were
+        pruned) is verified with a warning. Files are never removed here: a failed
+        chunk is downloaded again and the new file only replaces it once complete
+        """
+        filename, filepath = task["filename"], task["filepath"]
+        row = self.ledger.get(filename)
+        if row is not None and row["request"]:
+            request = json.loads(row["request"])
+        else:
+            request = dict(self.products[task["product"]]["request"], year=[str(task["year"])],
+                           month=[f"{task['month']:02d}"], day=task["days"])
+        try:
+            nbytes, messages = os.path.getsize(filepath), verify_file(filepath)
+            complete, problem = check_inventory(request, index_file(filepath), allow_extra=True)
+            error, kind = (None, None) if complete else (f"incomplete inventory: {problem}", "incomplete inventory")
+        except GribFramingError as e:
+            error, kind = f"corrupt GRIB: {e}", "corrupt GRIB"
+        except Exception as e:
+            error, kind = str(e), type(e).__name__
+        if error is not None:
+            print(f"✘ {filename} 未通过检查，将重新下载（旧文件保留到新文件下载完成）：{error}")
+            print(f"✘ {filename} failed its check and will be downloaded again (the old file stays until then): {error}")
+            self.ledger.set_state(filename, "failed", error=error)
+            self.telemetry.emit("failed", filename, error=kind)
+            return False
+        if problem:
+            print(f"⚠ {filename} 包含请求以外的消息，保留文件：{problem}")
+            print(f"⚠ {filename} holds messages beyond its request; the file is kept: {problem}")
+            self.telemetry.emit("unexpected_messages", filename, detail=problem)
+        self.ledger.set_state(filename, "verified", bytes=nbytes, messages=messages)
+        self.telemetry.emit("verified", filename, bytes=nbytes, messages=messages)
+        print(f"[跳过] {filename} 已下载，{messages} 条 GRIB 消息结构完整。")
+        print(f"[Skip] {filename} already downloaded, {messages} GRIB messages intact.")
+        return True
+
+    # ---------- 下载 | Download ----------
+    def download_task(self, task):
+        """
+        下载并检查一个分块；成功后立即检查配对，失败时延迟后重新排队（不占用下载槽位）
+        Download and check one chunk; on success look for ready pairs right away,
+        on failure requeue it after a delay (without holding a download slot)
+        """
+        if self.budget is not None:
+            filepath = task["filepath"]
+            # 按计划顺序放行，并为一次转换留出空间
+            # Admitted in plan order, keeping room for one conversion
+            chunk_bytes = max((r["est_bytes"] for r in self.plan if r["product"] == "pressure"), default=0)
+            reserve = self.budget.projected("arl", self.budget.projected("pressure", chunk_bytes)) if self.era52arl_dir else 0
+            priority = (1, task["year"], task["month"], int(task["days"][0]), task["product"])
+            try:
+                admitted = self.budget.try_admit(task["filename"],
+                                                 self.budget.projected(task["product"], task["plan"]["est_bytes"]),
+                                                 [filepath, filepath + ".part"], priority, reserve)
+            except DiskBudgetError as e:
+                print(f"✘ {e}")
+                self._retry(task)
+                return False
+            if not admitted:
+                # 空间不足：稍后重新排队，等待期间不占用下载槽位
+                # Not enough room: requeue later without holding a download slot while waiting
+                self.scheduler.submit_later(self.budget.poll_interval, task["filename"], self.download_task, task)
+                return False
+        stream = self._stream_job(task)
+        try:
+            ok = self._download(task, stream)
+        finally:
+            if self.budget is not None:
+                self.budget.release(task["filename"])
+        if not ok:
+            if stream is not None:
+                self._finish_stream(task, stream, False)
+            self._retry(task)
+            return False
+        if self.budget is not None:
+            self.budget.observe(task["product"], task["plan"]["est_bytes"], os.path.getsize(task["filepath"]))
+        if stream is not None:
+            self._finish_stream(task, stream, True)
+        self.check_pairs()
+        return True
+
+    def _retry(self, task):
+        filename = task["filename"]
+        attempts = self._attempts[filename] = self._attempts.get(filename, 0) + 1
+        if attempts > self.max_retries:
+            print(f"✘ {filename} 已重试 {self.max_retries} 次，放弃。")
+            print(f"✘ {filename} failed after {self.max_retries} retries, giving up.")
+            return
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        print(f"↻ {filename} 将在 {delay:.0f} 秒后第 {attempts} 次重试。")
+        print(f"↻ {filename} will be retried in {delay:.0f} s (retry {attempts}).")
+        self.telemetry.emit("retry", filename, attempt=attempts, delay=delay)
+        self.scheduler.submit_later(delay, filename, self.download_task, task)
+
+    def _download(self, task, stream=None):
+        filename, filepath = task["filename"], task["filepath"]
+        try:
+            # 台账中已有下载链接时直接续传，否则重新提交请求
+            # Resume with the stored URL if the ledger has one, otherwise submit the request
+            row = self.ledger.get(filename)
+            download_url = row["url"] if row and row["state"] in ("ready", "downloading") else None
+            # 链接已过期（服务器返回 403/404/410）时重新提交
+            # Resubmit when the link has expired (server answers 403/404/410)
+            if download_url and url_alive(download_url) is False:
+                download_url = None
+            emit = self.telemetry.for_file(filename)
+            if stream is not None:
+                # 收到第一个字节后才开始读取 .part | The .part is read only once its first byte has arrived
+                emit = stream.watch(emit)
+            cached = None
+            if not download_url and self.cache is not None:
+                cached = self.cache.fetch(task["dataset"], task["request"], filepath)
+            if cached:
+                print(f"\n>> {filename} 取自本地请求缓存（{cached[0]}）")
+                print(f"\n>> {filename} served from the local request cache ({cached[0]})")
+                self.ledger.set_state(filename, "ready", dataset=task["dataset"], request=task["request"])
+                emit("url_ready", cached=cached[0])
+                self.ledger.set_state(filename, "downloading")
+                nbytes, messages = os.path.getsize(filepath), verify_file(filepath)
+            else:
+                if not download_url:
+                    print(f"\n>> 提交 {filename} 任务……")
+                    print(f"\n>> Submitting {filename} task...")
+                    self.ledger.set_state(filename, "submitted", dataset=task["dataset"], request=task["request"])
+                    emit("submitted", product=task["product"])
+                    result = self.client.retrieve(task["dataset"], task["request"])
+                    download_url = result.location
+                    if not download_url:
+                        raise RuntimeError("未能获取下载链接。Failed to get download URL.")
+                    self.ledger.set_state(filename, "ready", url=download_url)
+                    emit("url_ready")
+                    print(f"✔ 任务完成，开始下载 {filename} ……")
+                    print(f"✔ Task completed, starting download {filename}...")
+                else:
+                    print(f"\n>> 使用已记录的链接续传 {filename} ……")
+                    print(f"\n>> Resuming {filename} with the recorded URL...")
+                    emit("url_ready", resumed=True)
+                self.ledger.set_state(filename, "downloading")
+                # 分段并行下载，同时检查 GRIB 消息结构；完成后才会出现最终文件
+                # Segmented parallel download with GRIB framing checked on the fly; the final file only appears once complete
+                verifier = GribStreamVerifier()
+                nbytes = download(download_url, filepath, segments=self.download_segments, verifier=verifier,
+                                  on_event=emit)
+                messages = verifier.messages
+            # 与请求应有的 变量 × 层次 × 时次 比较（只读取消息头，并写出 .idx 索引）
+            # Compare with the variable × level × time inventory of the request (reads headers only, writes the .idx)
+            complete, problem = check_inventory(task["request"], index_file(filepath))
+            if not complete:
+                os.remove(filepath)
+                if cached:
+                    # 缓存条目本身有问题，删除后下次重新提交 | The cache entry itself is bad: drop it so the retry submits
+                    self.cache.discard(cached[1])
+                print(f"✘ {filename} 缺少请求的消息，将重新请求：{problem}")
+                print(f"✘ {filename} lacks requested messages and will be requested again: {problem}")
+                self.ledger.set_state(filename, "failed", bytes=nbytes, messages=messages,
+                                      error=f"incomplete inventory: {problem}")
+                emit("failed", error="incomplete inventory")
+                return False
+            self.ledger.set_state(filename, "verified", bytes=nbytes, messages=messages)
+            emit("verified", bytes=nbytes, messages=messages)
+            if self.cache is not None and not cached:
+                self.cache.store(task["dataset"], task["request"], filepath)
+            print(f"✔ {filename} 下载完成，{messages} 条 GRIB 消息结构完整。")
+            print(f"✔ {filename} download completed, {messages} GRIB messages intact.")
+        except GribFramingError as e:
+            print(f"✘ {filename} 已损坏，将重新下载：{e}")
+            print(f"✘ {filename} is corrupt and will be downloaded again: {e}")
+            self.ledger.set_state(filename, "failed", error=f"corrupt GRIB: {e}")
+            self.telemetry.emit("failed", filename, error="corrupt GRIB")
+            return False
+        except Exception as e:
+            print(f"下载 {filename} 时发生错误：{e}")
+            print(f"Error occurred while downloading {filename}: {e}")
+            self.ledger.set_state(filename, "failed", error=str(e))
+            self.telemetry.emit("failed", filename, error=type(e).__name__)
+            return False
+        return True
+
+    # ---------- 边下载边转换 | Streaming conversion ----------
+    def _stream_job(self, task):
+        """
+        stream_convert 时为气压层分块启动边下载边转换（覆盖它的地面文件须已下载完成），否则返回 None
+        With stream_convert, start converting a pressure chunk while it downloads
+        (the surface file covering it must already be downloaded); None otherwise
+        """
+        if not (self.stream_convert and self.era52arl_dir and task["product"] == "pressure"):
+            return None
+        single = surface_for(self.plan, task["filename"])
+        arl = arl_name(task["year"], task["month"], task["part"])
+        if (os.path.exists(os.path.join(self.output_folder, arl))
+                or not self._downloaded(single, ("verified", "converted"))):
+            return None
+        # 转换期间不参与配对，否则下载通过检查时会被再次转换 | Kept out of pairing meanwhile, or passing the check would convert it again
+        with self._pair_lock:
+            if task["filename"] in self._paired:
+                return None
+            self._paired.add(task["filename"])
+        # 延迟导入：只有边下载边转换时才需要 NumPy | Imported lazily: NumPy is only needed for streaming conversion
+        from arl_stream import StreamJob
+        scratch = scratch_dir(self.output_folder, arl)
+        shutil.rmtree(scratch, ignore_errors=True)
+        os.makedirs(scratch)
+        return StreamJob(task["filepath"], os.path.join(self.output_folder, single), os.path.join(scratch, arl + ".tmp"),
+                         era52arl_cfg(self.era52arl_dir, self.output_folder)).start()
+
+    def _finish_stream(self, task, stream, downloaded):
+        """
+        下载结束后等待转换读完；下载和转换都成功时把 ARL 移入数据目录并标记为 converted，
+        否则丢弃（下载成功时仍按配对流程在下载后转换）
+        Wait for the conversion to catch up once the download has ended. If both
+        succeeded the ARL is moved into the data folder and marked converted;
+        otherwise it is discarded (and a successful download is still converted
+        through the usual pairing)
+        """
+        pressure = task["filename"]
+        single = surface_for(self.plan, pressure)
+        arl = arl_name(task["year"], task["month"], task["part"])
+        arl_path = os.path.join(self.output_folder, arl)
+        converted = stream.finish() and downloaded
+        try:
+            if converted:
+                os.replace(stream.arl_path, arl_path)
+        finally:
+            shutil.rmtree(scratch_dir(self.output_folder, arl), ignore_errors=True)
+            if not converted:
+                with self._pair_lock:
+                    self._paired.discard(pressure)
+        if not converted:
+            if downloaded:
+                print(f"⚠ 边下载边转换失败，将在下载后转换 {arl}：{stream.error}")
+                print(f"⚠ Streaming conversion failed, {arl} will be converted after the download: {stream.error}")
+            return False
+        if self.budget is not None:
+            self.budget.observe("arl", os.path.getsize(task["filepath"]), os.path.getsize(arl_path))
+        self.ledger.set_state(pressure, "converted")
+        self.ledger.set_state(single, "converted")
+        self.telemetry.emit("converted", pressure, arl=arl, streamed=True, periods=stream.periods)
+        self.telemetry.emit("converted", single, arl=arl)
+        print(f"[√] 已边下载边生成 {arl}（{stream.periods} 个时次）")
+        print(f"[√] Generated {arl} while downloading ({stream.periods} periods)")
+        return True
+
+    # ---------- 配对与转换 | Pairing and conversion ----------
+    def _downloaded(self, filename, states=("verified",)):
+        row = self.ledger.get(filename)
+        return (row is not None and row["state"] in states
+                and os.path.exists(os.path.join(self.output_folder, filename)))
+
+    def check_pairs(self):
+        """
+        找出气压层文件与覆盖它的地面文件都已通过检查的分块，并交给转换
+        Find chunks whose pressure-level file and covering surface file are both verified and hand them to conversion
+        """
+        ready = []
+        with self._pair_lock:
+            for row in self.plan:
+                if row["product"] != "pressure" or row["filename"] in self._paired:
+                    continue
+                single = surface_for(self.plan, row["filename"])
+                # 只转换已通过检查的文件；一个地面文件可能覆盖多个气压层分块，第一次转换后它已是 converted
+                # Only verified files are converted; one surface file may cover several
+                # pressure chunks and is already converted after the first
+                if self._downloaded(row["filename"]) and self._downloaded(single, ("verified", "converted")):
+                    self._paired.add(row["filename"])
+                    ready.append((row, single))
+        for row, single in ready:
+            self.on_pair_ready(row, single)
+
+    def on_pair_ready(self, row, single):
+        arl = arl_name(row["year"], row["month"], row["part"])
+        if os.path.exists(os.path.join(self.output_folder, arl)):
+            return
+        print(f"🔗 分块配对完成：{row['filename']} + {single} → {arl}")
+        print(f"🔗 Chunk pair ready: {row['filename']} + {single} → {arl}")
+        if self.era52arl_dir:
+            self.converter.submit(arl, self.convert_task, row["filename"], single, arl)
+
+    def convert_task(self, pressure, single, arl):
+        grib_bytes = os.path.getsize(os.path.join(self.output_folder, pressure))
+        arl_path = os.path.join(self.output_folder, arl)
+        if self.budget is not None:
+            try:
+                # 转换优先于下载：转换后 GRIB 即可删除 | Conversions go before downloads: their GRIB becomes evictable
+                admitted = self.budget.try_admit(arl, self.budget.projected("arl", grib_bytes),
+                                                 [arl_path, os.path.join(scratch_dir(self.output_folder, arl), arl + ".tmp")],
+                                                 (0,))
+            except DiskBudgetError as e:
+                print(f"[×] 转换失败 {arl}：{e}")
+                print(f"[×] Conversion failed {arl}: {e}")
+                self._convert_failed(pressure, arl, e)
+                return False
+            if not admitted:
+                # 与下载相同：稍后重新排队，不占用转换槽位 | As for downloads: requeue later without holding a conversion slot
+                self.converter.submit_later(self.budget.poll_interval, arl, self.convert_task, pressure, single, arl)
+                return False
+        try:
+            if self._convert_pool is not None:
+                self._convert_pool.submit(convert_pair, self.era52arl_dir, self.output_folder, pressure, single, arl,
+                                          backend=self.convert_backend).result()
+            else:
+                convert_pair(self.era52arl_dir, self.output_folder, pressure, single, arl,
+                             backend=self.convert_backend)
+        except Exception as e:
+            print(f"[×] 转换失败 {arl}：{e}")
+            print(f"[×] Conversion failed {arl}: {e}")
+            self._convert_failed(pressure, arl, e)
+            return False
+        finally:
+            if self.budget is not None:
+                self.budget.release(arl)
+                self.budget.observe("arl", grib_bytes, os.path.getsize(arl_path) if os.path.exists(arl_path) else 0)
+        self.ledger.set_state(pressure, "converted")
+        self.ledger.set_state(single, "converted")
+        self.telemetry.emit("converted", pressure, arl=arl)
+        self.telemetry.emit("converted", single, arl=arl)
+        print(f"[√] 已生成 {arl}")
+        print(f"[√] Generated {arl}")
+        return True
+
+    def _convert_failed(self, pressure, arl, error):
+        """
+        在台账中记录转换失败并让分块退出配对；延迟后重试，超过 max_retries 次后保持 failed（下次运行重新下载）
+        Record a failed conversion in the ledger and release the chunk from pairing;
+        it is retried after a delay, and after max_retries it stays failed (the next
+        run downloads it again)
+        """
+        self.ledger.set_state(pressure, "failed", error=f"conversion failed: {error}")
+        self.telemetry.emit("failed", pressure, arl=arl, error=type(error).__name__)
+        with self._pair_lock:
+            self._paired.discard(pressure)
+        # 与下载重试分开计数 | Counted apart from the download retries
+        attempts = self._attempts[arl] = self._attempts.get(arl, 0) + 1
+        if attempts > self.max_retries:
+            print(f"✘ {arl} 已重试 {self.max_retries} 次，放弃。")
+            print(f"✘ {arl} failed after {self.max_retries} retries, giving up.")
+            return
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        print(f"↻ {arl} 将在 {delay:.0f} 秒后第 {attempts} 次重新转换。")
+        print(f"↻ {arl} will be converted again in {delay:.0f} s (retry {attempts}).")
+        self.telemetry.emit("retry", pressure, attempt=attempts, delay=delay, arl=arl)
+        self.converter.submit_later(delay, arl, self._retry_convert, pressure)
+
+    def _retry_convert(self, pressure):
+        # 文件本身已通过检查，只是转换失败：恢复为 verified 后重新配对
+        # The file itself passed its checks, only the conversion failed: back to verified, then pair again
+        if self.ledger.state(pressure) == "failed" and os.path.exists(os.path.join(self.output_folder, pressure)):
+            self.ledger.set_state(pressure, "verified")
+        self.check_pairs()
+
+    # ---------- 运行 | Run ----------
+    def run(self, start_year, end_year, product_names=None):
+        tasks = self.plan_tasks(start_year, end_year, product_names)
+        self.plan = [t["plan"] for t in tasks]
+        # 写出分块计划（文件名 → 覆盖的日期），供转换脚本配对气压层与地面文件
+        # Write the chunk plan (filename → days covered) so conversion can pair pressure and surface files
+        write_plan(os.path.join(self.output_folder, PLAN_NAME), self.plan)
+        self.plan = read_plan(os.path.join(self.output_folder, PLAN_NAME))
+        if self.budget is not None:
+            self.budget.load_history(self.plan)
+
+        for task in tasks:
+            if not self.needs_download(task):
+                continue
+            days = task["days"]
+            est_mb = task["plan"]["est_bytes"] / 1e6
+            print(f"[调试] 请求参数 - {task['product']} 年份: {task['year']}, 月份: {task['month']:02d}, "
+                  f"部分: p{task['part']}, 天数: {len(days)}, 估算大小: {est_mb:.0f} MB，日期范围: {days[0]} 至 {days[-1]}")
+            print(f"[Debug] Request params - {task['product']} Year: {task['year']}, Month: {task['month']:02d}, "
+                  f"Part: p{task['part']}, Days: {len(days)}, Estimated size: {est_mb:.0f} MB, Date range: {days[0]} to {days[-1]}")
+            # 加入调度队列，空出槽位后立即开始
+            # Queue the task; it starts as soon as a slot is free
+            self.scheduler.submit(task["filename"], self.download_task, task)
+
+        # 之前运行中已下载完成的分块也可以直接转换
+        # Chunks downloaded by earlier runs can be converted right away
+        self.check_pairs()
+
+        print("\n所有任务已提交，等待队列完成……")
+        print("\nAll tasks submitted, waiting for the queue to drain...")
+        self.scheduler.join()
+        if self.era52arl_dir:
+            self.converter.join()
+        if self._convert_pool is not None:
+            self._convert_pool.shutdown()
+        print("\n所有任务已完成。")
+        print("\nAll tasks finished.")
+
+
+if __name__ == "__main__":
+    # 设置下载文件夹路径
+    # Set download folder path
+    output_folder = r"F:\ERA5_pressure_level"
+
+    # 设置下载时间范围
+    # Set download time range
+    start_year = 1950
+    end_year = 1953
+
+    # era52arl 所在目录（需要在能运行 era52arl 的 Linux/WSL 环境中）；设为 None 则只下载不转换
+    # Directory holding era52arl (needs a Linux/WSL environment that can run it); None downloads without converting
+    era52arl_dir = None
+
+    engine = DownloadEngine(output_folder, max_in_flight=8, download_segments=4,
+                            target_mb=3200, era52arl_dir=era52arl_dir)
+    engine.run(start_year, end_year)
@@ -0,0 +1,142 @@
+"""
+grib_crop.py – 不解码数据地裁剪 GRIB1 经纬度网格消息
+Crop GRIB1 lat/lon grid messages without decoding the data
+
+ERA5 的 GRIB1 消息使用简单打包：每个格点是 nbits 位的整数，参考值和比例因子对整个场相同。
+裁剪只需按行取出所需列的位段，参考值、比例和位数保持不变，数值与原文件完全一致；
+只改写网格描述段（GDS）中的点数和角点坐标以及数据段（BDS）的长度。
+ERA5 GRIB1 messages use simple packing: every grid point is an nbits integer
+and the reference value and scale factors apply to the whole field. Cropping
+only takes the bit ranges of the wanted columns row by row; reference, scale
+and bit width stay the same, so the values are identical to the original.
+Only the point counts and corners in the grid description section (GDS) and
+the length of the binary data section (BDS) are rewritten.
+
+支持：经纬度网格（GDS 类型 0）、扫描方式 0（自西向东、自北向南）、没有位图、简单打包。
+其他消息抛出 CropError，由调用方改为重新请求。
+Supported: lat/lon grids (GDS type 0), scanning mode 0 (west to east, north
+to south), no bitmap, simple packing. Anything else raises CropError so the
+caller falls back to a fresh request.
+"""
+
+
+class CropError(ValueError):
+    pass
+
+
+def _u(buf, offset, n):
+    return int.from_bytes(buf[offset:offset + n], "big")
+
+
+def _signed3(buf, offset):
+    # GRIB1 的有符号数：最高位为符号位 | GRIB1 signed numbers: the top bit is the sign
+    value = _u(buf, offset, 3)
+    return -(value & 0x7FFFFF) if value & 0x800000 else value
+
+
+def _pack_signed3(value):
+    return ((0x800000 | -value) if value < 0 else value).to_bytes(3, "big")
+
+
+def _millidegrees(value):
+    return int(round(float(value) * 1000))
+
+
+def grid_of(msg):
+    """
+    消息的网格 → (ni, nj, la1, lo1, la2, lo2, di, dj)，坐标单位为千分之一度
+    The message's grid → (ni, nj, la1, lo1, la2, lo2, di, dj) in millidegrees
+    """
+    if msg[7] != 1:
+        raise CropError("not a GRIB1 message")
+    pds_len = _u(msg, 8, 3)
+    flags = msg[8 + 7]
+    if not flags & 0x80:
+        raise CropError("no grid description section")
+    if flags & 0x40:
+        raise CropError("bitmap present")
+    gds = 8 + pds_len
+    if msg[gds + 5] != 0:
+        raise CropError(f"grid type {msg[gds + 5]} is not a regular lat/lon grid")
+    if msg[gds + 27] != 0:
+        raise CropError(f"scanning mode {msg[gds + 27]:#04x} not supported")
+    return (_u(msg, gds + 6, 2), _u(msg, gds + 8, 2), _signed3(msg, gds + 10), _signed3(msg, gds + 13),
+            _signed3(msg, gds + 17), _signed3(msg, gds + 20), _u(msg, gds + 23, 2), _u(msg, gds + 25, 2))
+
+
+def window(msg, area):
+    """
+    area = [北, 西, 南, 东] 在消息网格中的行列范围 → (j0, j1, i0, i1)（含两端）；不在网格上时抛出 CropError
+    Row/column range (inclusive) of area = [north, west, south, east] in the
+    message grid → (j0, j1, i0, i1); raises CropError when it is off the grid
+    """
+    ni, nj, la1, lo1, _, _, di, dj = grid_of(msg)
+    north, west, south, east = (_millidegrees(v) for v in area)
+    if not di or not dj or north < south or east < west:
+        raise CropError(f"bad area {area}")
+    dn, dw = la1 - north, (west - lo1) % 360000
+    if dn % dj or dw % di or (north - south) % dj or (east - west) % di:
+        raise CropError(f"area {area} is not on the grid")
+    j0, i0 = dn // dj, dw // di
+    j1, i1 = j0 + (north - south) // dj, i0 + (east - west) // di
+    if j0 < 0 or j1 >= nj or i1 >= ni:
+        raise CropError(f"area {area} is outside the grid")
+    return j0, j1, i0, i1
+
+
+def _bits(data, start, count):
+    first, last = start // 8, (start + count + 7) // 8
+    return (int.from_bytes(data[first:last], "big") >> (last * 8 - start - count)) & ((1 << count) - 1)
+
+
+def crop_message(msg, area):
+    """
+    返回裁剪到 area = [北, 西, 南, 东] 的新消息（bytes）
+    Return a new message (bytes) cropped to area = [north, west, south, east]
+    """
+    ni = grid_of(msg)[0]
+    j0, j1, i0, i1 = window(msg, area)
+    pds_len = _u(msg, 8, 3)
+    gds = 8 + pds_len
+    gds_len = _u(msg, gds, 3)
+    bds = gds + gds_len
+    bds_len = _u(msg, bds, 3)
+    if msg[bds + 3] & 0xF0:
+        raise CropError("only simple grid-point packing is supported")
+    nbits = msg[bds + 10]
+    data = msg[bds + 11:bds + bds_len]
+
+    ncols, nrows = i1 - i0 + 1, j1 - j0 + 1
+    if nbits == 0:
+        packed = b""   # 常数场没有数据 | constant fields carry no data
+    elif nbits % 8 == 0:
+        width = nbits // 8
+        packed = b"".join(data[(j * ni + i0) * width:(j * ni + i1 + 1) * width] for j in range(j0, j1 + 1))
+    else:
+        acc, count = 0, ncols * nbits
+        for j in range(j0, j1 + 1):
+            acc = (acc << count) | _bits(data, (j * ni + i0) * nbits, count)
+        total = nrows * count
+        pad = -total % 8
+        packed = (acc << pad).to_bytes((total + pad) // 8, "big")
+    # 数据段长度须为偶数 | The data section length must be even
+    body_len = 11 + len(packed)
+    fill = body_len % 2
+    unused = (len(packed) * 8 - nrows * ncols * nbits) + 8 * fill
+    new_bds = (bytearray((body_len + fill).to_bytes(3, "big")) + bytes([(msg[bds + 3] & 0xF0) | unused])
+               + msg[bds + 4:bds + 11] + packed + b"\0" * fill)
+
+    _, _, la1, lo1, _, _, di, dj = grid_of(msg)
+    new_gds = bytearray(msg[gds:gds + gds_len])
+    new_gds[6:8] = ncols.to_bytes(2, "big")
+    new_gds[8:10] = nrows.to_bytes(2, "big")
+    new_gds[10:13] = _pack_signed3(la1 - j0 * dj)
+    new_gds[13:16] = _pack_signed3(_millidegrees(area[1]))
+    new_gds[17:20] = _pack_signed3(la1 - j1 * dj)
+    new_gds[20:23] = _pack_signed3(_millidegrees(area[1]) + (ncols - 1) * di)
+
+    total = 8 + pds_len + len(new_gds) + len(new_bds) + 4
+    if total >= 0x800000:
+        raise CropError("cropped message too large for a GRIB1 length")
+    return (b"GRIB" + total.to_bytes(3, "big") + b"\x01" + bytes(msg[8:gds]) + bytes(new_gds)
+            + bytes(new_bds) + b"7777")
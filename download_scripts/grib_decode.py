@@ -0,0 +1,92 @@
+"""
+grib_decode.py – 用 NumPy 解码 ERA5 的 GRIB1 简单打包消息（不需要 ecCodes）
+Decode ERA5 GRIB1 simple-packing messages with NumPy (no ecCodes needed)
+
+era52arl 通过 ecCodes 的 Fortran 接口读取数值，只能在编译了这些接口的环境中运行。
+CDS 提供的 ERA5 GRIB1 消息都是经纬度网格、没有位图的简单打包：
+    值 = (参考值 + X × 2^E) × 10^−D
+这里按 ecCodes 的运算顺序用双精度计算后转为 float32（与 grib_get 取到 REAL 数组时相同），
+因此得到的数值与 era52arl 读到的逐位一致。
+era52arl reads values through the ecCodes Fortran bindings and only runs
+where those are compiled. The ERA5 GRIB1 messages the CDS delivers are all
+lat/lon grids with simple packing and no bitmap:
+    value = (reference + X × 2^E) × 10^−D
+This computes that in double precision in ecCodes' order of operations and
+converts to float32 (as grib_get into a REAL array does), so the values are
+bit-for-bit the ones era52arl reads.
+"""
+
+import numpy as np
+
+from grib_crop import CropError, grid_of
+
+
+class GribDecodeError(ValueError):
+    pass
+
+
+def _u(buf, offset, n):
+    return int.from_bytes(buf[offset:offset + n], "big")
+
+
+def _signed2(buf, offset):
+    # GRIB1 的有符号数：最高位为符号位 | GRIB1 signed numbers: the top bit is the sign
+    value = _u(buf, offset, 2)
+    return -(value & 0x7FFF) if value & 0x8000 else value
+
+
+def _ibm_float(b):
+    # IBM 单精度浮点：符号、16 进制指数（偏移 64）、24 位尾数 | IBM single: sign, base-16 exponent (bias 64), 24-bit mantissa
+    mantissa = int.from_bytes(b[1:4], "big")
+    value = mantissa * 16.0 ** ((b[0] & 0x7F) - 64) / 2.0 ** 24
+    return -value if b[0] & 0x80 else value
+
+
+def _power(s, n):
+    # 与 ecCodes 的 codes_power 相同：逐次乘除 | As ecCodes' codes_power: repeated multiplication or division
+    result = 1.0
+    while s < 0:
+        result /= n
+        s += 1
+    while s > 0:
+        result *= n
+        s -= 1
+    return result
+
+
+def decode(msg):
+    """
+    GRIB1 消息 → (NJ, NI) float32 数组，按文件中的顺序（ERA5 为自北向南、自西向东）
+    GRIB1 message → (NJ, NI) float32 array in file order (north to south, west to east for ERA5)
+    """
+    try:
+        ni, nj = grid_of(msg)[:2]
+    except CropError as e:
+        raise GribDecodeError(str(e)) from None
+    if not ni or not nj:
+        raise GribDecodeError("message has no lat/lon grid")
+    pds_len = _u(msg, 8, 3)
+    decimal = _signed2(msg, 8 + 26)
+    gds = 8 + pds_len
+    bds = gds + _u(msg, gds, 3)
+    if msg[bds + 3] & 0xF0:
+        raise GribDecodeError("only simple grid-point packing is supported")
+    binary = _signed2(msg, bds + 4)
+    reference = _ibm_float(msg[bds + 6:bds + 10])
+    nbits = msg[bds + 10]
+    count = ni * nj
+    if nbits == 0:
+        return np.full((nj, ni), reference, dtype=np.float32)
+    data = np.frombuffer(msg, dtype=np.uint8, count=(count * nbits + 7) // 8, offset=bds + 11)
+    if nbits % 8 == 0:
+        # 整字节：按大端整数读取 | Whole bytes: read as big-endian integers
+        width = nbits // 8
+        x = np.zeros(count, dtype=np.uint64)
+        octets = data[:count * width].reshape(count, width)
+        for k in range(width):
+            x = (x << np.uint64(8)) | octets[:, k]
+    else:
+        bits = np.unpackbits(data)[:count * nbits].reshape(count, nbits)
+        x = bits.dot(1 << np.arange(nbits - 1, -1, -1, dtype=np.uint64))
+    values = (x.astype(np.float64) * _power(binary, 2) + reference) * _power(-decimal, 10)
+    return values.astype(np.float32).reshape(nj, ni)
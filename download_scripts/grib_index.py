@@ -0,0 +1,333 @@
+"""
+grib_index.py – 基于 mmap 的 GRIB 消息索引与并行目录检查
+mmap-based GRIB message index and parallel directory verifier
+
+把 GRIB 文件映射到内存，按第 0 段的总长度逐条走过消息（不解码任何数据），
+为每条消息记录 偏移、长度、变量短名、层次和有效时间，写入 <文件名>.idx。
+后续步骤可以直接用索引定位到某条消息。不需要 ecCodes。
+Memory-maps a GRIB file and walks the messages from the section 0 total
+length (no data is decoded), recording offset, length, short name, level and
+valid time of each message in <filename>.idx. Later stages can use the index
+to seek straight to a message. ecCodes is not needed.
+
+verify 命令用进程池并行检查整个目录，替代 2.check_grib.sh / 4.check_incomplete_grib.sh
+中逐个文件运行 grib_count 的循环，并更新任务台账和 incomplete_grib_files.txt。
+台账中记录了请求参数的文件还会与应有的消息清单比较（见 grib_inventory.py）。
+The verify command checks a whole directory with a process pool, replacing
+the per-file grib_count loops in 2.check_grib.sh / 4.check_incomplete_grib.sh,
+and updates the task ledger and incomplete_grib_files.txt. Files whose
+request is recorded in the ledger are also compared with the expected message
+inventory (see grib_inventory.py).
+
+命令行 | Command line:
+    python grib_index.py index north_6h_pressure_1950_01_p1.grib
+    python grib_index.py verify /mnt/f/ERA5_pressure_level --pattern "north_6h_pressure_*.grib" \\
+        --ledger download_ledger.sqlite --incomplete incomplete_grib_files.txt --skip-done
+"""
+
+import argparse
+import datetime
+import fnmatch
+import json
+import mmap
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from grib_inventory import check_inventory
+from grib_stream import GribFramingError, GribStreamVerifier
+from task_ledger import LedgerError, TaskLedger
+
+INDEX_SUFFIX = ".idx"
+INDEX_FIELDS = ("offset", "length", "short_name", "level", "valid_time")
+TIME_FORMAT = "%Y%m%d%H%M"
+
+Message = namedtuple("Message", INDEX_FIELDS)
+
+# ECMWF 参数表 128（GRIB1）| ECMWF parameter table 128 (GRIB1)
+GRIB1_PARAMS = {
+    129: "z", 130: "t", 131: "u", 132: "v", 133: "q", 134: "sp", 135: "w",
+    157: "r", 165: "10u", 166: "10v", 167: "2t",
+}
+
+# GRIB2 (学科, 类别, 编号) → 短名；部分地面变量需结合层次类型区分
+# GRIB2 (discipline, category, number) → short name; some surface fields also depend on the level type
+GRIB2_PARAMS = {
+    (0, 0, 0): "t", (0, 1, 0): "q", (0, 1, 1): "r", (0, 2, 2): "u", (0, 2, 3): "v",
+    (0, 2, 8): "w", (0, 3, 4): "z", (0, 3, 0): "sp",
+}
+GRIB2_HEIGHT_PARAMS = {("u", 10): "10u", ("v", 10): "10v", ("t", 2): "2t"}
+
+# GRIB1 时间单位 → 小时 | GRIB1 time units → hours
+GRIB1_UNIT_HOURS = {0: 1 / 60, 1: 1, 2: 24, 10: 3, 11: 6, 12: 12}
+
+
+def index_path(grib_path):
+    return grib_path + INDEX_SUFFIX
+
+
+# ---------- 消息头解析 | Header parsing ----------
+def _grib1_header(buf, offset):
+    pds = offset + 8
+    table_param = buf[pds + 8]
+    level_type = buf[pds + 9]
+    level = int.from_bytes(buf[pds + 10:pds + 12], "big") if level_type in (100, 105, 109) else 0
+    century = buf[pds + 24]
+    year = (century - 1) * 100 + buf[pds + 12]
+    ref = datetime.datetime(year, buf[pds + 13], buf[pds + 14], buf[pds + 15], buf[pds + 16])
+    unit, p1, time_range = buf[pds + 17], buf[pds + 18], buf[pds + 20]
+    hours = p1 * GRIB1_UNIT_HOURS.get(unit, 1) if time_range in (0, 1, 10) else 0
+    name = GRIB1_PARAMS.get(table_param, f"param{table_param}")
+    return name, level, ref + datetime.timedelta(hours=hours)
+
+
+def _grib2_header(buf, offset, length):
+    discipline = buf[offset + 6]
+    pos = offset + 16
+    ref = None
+    name, level = None, 0
+    while pos < offset + length - 4:
+        sec_len = int.from_bytes(buf[pos:pos + 4], "big")
+        number = buf[pos + 4]
+        if number == 1:
+            year = int.from_bytes(buf[pos + 12:pos + 14], "big")
+            ref = datetime.datetime(year, buf[pos + 14], buf[pos + 15], buf[pos + 16], buf[pos + 17])
+        elif number == 4:
+            category, param = buf[pos + 9], buf[pos + 10]
+            unit = buf[pos + 17]
+            forecast = int.from_bytes(buf[pos + 18:pos + 22], "big")
+            surface = buf[pos + 22]
+            scale = buf[pos + 23]
+            value = int.from_bytes(buf[pos + 24:pos + 28], "big")
+            value = value / 10 ** scale if scale not in (0, 255) else value
+            name = GRIB2_PARAMS.get((discipline, category, param), f"{discipline}.{category}.{param}")
+            if surface == 100:
+                level = int(round(value / 100))   # Pa → hPa
+            elif surface == 103:
+                name = GRIB2_HEIGHT_PARAMS.get((name, int(value)), name)
+            ref = ref + datetime.timedelta(hours=forecast * GRIB1_UNIT_HOURS.get(unit, 1))
+            break
+        pos += sec_len
+    return name, level, ref
+
+
+def scan(buf, size=None):
+    """
+    检查消息结构并返回 [Message, ...]；结构错误时抛出 GribFramingError
+    Check framing and return [Message, ...]; raises GribFramingError on bad framing
+    """
+    size = len(buf) if size is None else size
+    bounds = []
+    verifier = GribStreamVerifier(on_message=lambda offset, length: bounds.append((offset, length)))
+    verifier.catch_up(lambda offset, n: buf[offset:offset + n], lambda offset, n: offset + n <= size)
+    verifier.finish(size)
+    messages = []
+    for offset, length in bounds:
+        if buf[offset + 7] == 1:
+            name, level, valid = _grib1_header(buf, offset)
+        else:
+            name, level, valid = _grib2_header(buf, offset, length)
+        messages.append(Message(offset, length, name, level, valid))
+    return messages
+
+
+def index_file(grib_path, write=True):
+    """
+    建立一个文件的索引（可选写入 .idx），返回 [Message, ...]
+    Index one file (optionally writing the .idx) and return [Message, ...]
+    """
+    size = os.path.getsize(grib_path)
+    if size == 0:
+        raise GribFramingError("empty file")
+    with open(grib_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        messages = scan(buf, size)
+    if write:
+        write_index(index_path(grib_path), messages, size)
+    return messages
+
+
+def write_index(path, messages, size):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(f"# size={size}\n")
+        f.write("\t".join(INDEX_FIELDS) + "\n")
+        for m in messages:
+            f.write(f"{m.offset}\t{m.length}\t{m.short_name}\t{m.level}\t{m.valid_time.strftime(TIME_FORMAT)}\n")
+    os.replace(tmp, path)
+
+
+def read_index(grib_path):
+    """
+    读取 .idx；索引不存在或与文件大小不符时返回 None
+    Read the .idx; returns None if it is missing or does not match the file size
+    """
+    path = index_path(grib_path)
+    if not os.path.exists(path) or not os.path.exists(grib_path):
+        return None
+    with open(path, "r") as f:
+        header = f.readline().strip()
+        if header != f"# size={os.path.getsize(grib_path)}":
+            return None
+        f.readline()
+        messages = []
+        for line in f:
+            offset, length, name, level, valid = line.rstrip("\n").split("\t")
+            messages.append(Message(int(offset), int(length), name, int(level),
+                                    datetime.datetime.strptime(valid, TIME_FORMAT)))
+    return messages
+
+
+def load_index(grib_path):
+    """
+    优先使用已有的 .idx，否则重新建立
+    Use the existing .idx when valid, otherwise build it
+    """
+    messages = read_index(grib_path)
+    return messages if messages is not None else index_file(grib_path)
+
+
+# ---------- 并行检查 | Parallel verification ----------
+def _verify_one(path, request=None):
+    """
+    进程池中运行：检查结构，有请求参数时再与应有的消息清单比较。返回 (路径, 字节数, 消息数, 错误)
+    Runs in the process pool: checks framing and, given the request, the
+    expected message inventory. Returns (path, bytes, messages, error)
+    """
+    if not os.path.isfile(path):
+        return path, None, None, "file does not exist"
+    try:
+        messages = index_file(path)
+    except (GribFramingError, OSError, ValueError, IndexError) as e:
+        return path, os.path.getsize(path), None, f"{type(e).__name__}: {e}"
+    if request is not None:
+        complete, problem = check_inventory(request, messages)
+        if not complete:
+            return path, os.path.getsize(path), len(messages), f"inventory: {problem}"
+    return path, os.path.getsize(path), len(messages), None
+
+
+def verify_paths(paths, workers=None, requests=None):
+    """
+    并行检查多个文件，按输入顺序逐个返回 (路径, 字节数, 消息数, 错误)；
+    requests 为 {路径: 请求参数}，用于检查消息清单
+    Check many files in parallel, yielding (path, bytes, messages, error) in
+    input order; requests maps path → request for the inventory check
+    """
+    requests = requests or {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_verify_one, paths, [requests.get(p) for p in paths], chunksize=1)
+
+
+def _arl_for(grib_path):
+    name = os.path.basename(grib_path)
+    for product in ("_pressure_", "_single_"):
+        if product in name:
+            return os.path.join(os.path.dirname(grib_path), name.replace(product, "_")[:-len(".grib")] + ".arl")
+    return None
+
+
+def _record(ledger, filename, state, **fields):
+    try:
+        ledger.set_state(filename, state, **fields)
+    except LedgerError as e:
+        print(f"⚠️ 台账未更新：{e}")
+        print(f"⚠️ Ledger not updated: {e}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="GRIB 消息索引与检查 | GRIB message index and verification")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("index", help="建立并打印索引 | build and print the index")
+    p.add_argument("files", nargs="+")
+
+    p = sub.add_parser("verify", help="并行检查文件或目录 | verify files or directories in parallel")
+    p.add_argument("paths", nargs="*")
+    p.add_argument("--files-from", help="从列表文件读取路径 | read paths from a list file")
+    p.add_argument("--pattern", default="*.grib", help="目录中的文件名模式 | filename pattern inside directories")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--ledger", help="任务台账路径 | task ledger path")
+    p.add_argument("--incomplete", help="写出不完整文件列表 | write the list of incomplete files")
+    p.add_argument("--skip-done", action="store_true",
+                   help="跳过已有 ARL 或台账中已检查/转换的文件 | skip files with an ARL or already verified/converted in the ledger")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "index":
+        for path in args.files:
+            try:
+                messages = index_file(path)
+            except GribFramingError as e:
+                sys.exit(f"❌ {path}: {e}")
+            for m in messages:
+                print(f"{m.offset:>12d} {m.length:>10d} {m.short_name:6s} {m.level:5d} {m.valid_time:%Y-%m-%d %H:%M}")
+            print(f"{path}: {len(messages)} messages")
+        return
+
+    paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths += sorted(os.path.join(path, n) for n in os.listdir(path) if fnmatch.fnmatch(n, args.pattern))
+        else:
+            paths.append(path)
+    if args.files_from and os.path.exists(args.files_from):
+        with open(args.files_from, "r") as f:
+            paths += [line.strip() for line in f if line.strip()]
+
+    ledger = None
+    if args.ledger:
+        ledger = TaskLedger(args.ledger)
+
+    if args.skip_done:
+        todo = []
+        for path in paths:
+            arl = _arl_for(path)
+            if arl and os.path.exists(arl):
+                print(f"🔁 已存在 ARL 文件，跳过: {path}")
+                print(f"🔁 ARL file exists, skipping: {path}")
+                continue
+            state = ledger.state(os.path.basename(path)) if ledger else None
+            if state in ("verified", "converted", "consumed"):
+                print(f"🔁 台账状态为 {state}，跳过: {path}")
+                print(f"🔁 Ledger state is {state}, skipping: {path}")
+                continue
+            todo.append(path)
+        paths = todo
+
+    # 台账中记录了请求参数的文件同时检查消息清单
+    # Files whose request is in the ledger also get the inventory check
+    requests = {}
+    if ledger:
+        for path in paths:
+            row = ledger.get(os.path.basename(path))
+            if row and row["request"]:
+                requests[path] = json.loads(row["request"])
+
+    incomplete = []
+    for path, nbytes, count, error in verify_paths(paths, args.workers, requests):
+        filename = os.path.basename(path)
+        if error is None:
+            if ledger:
+                _record(ledger, filename, "verified", bytes=nbytes, messages=count)
+            print(f"✅ 文件完整（{count} 条消息）: {path}")
+            print(f"✅ File is complete ({count} messages): {path}")
+        else:
+            incomplete.append(path)
+            if ledger and nbytes is not None:
+                _record(ledger, filename, "failed", error=f"grib_index: {error}")
+            print(f"❌ 不完整或损坏的文件: {path}（{error}）")
+            print(f"❌ Incomplete or corrupted file: {path} ({error})")
+
+    if args.incomplete:
+        tmp = args.incomplete + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(p + "\n" for p in incomplete)
+        os.replace(tmp, args.incomplete)
+    if ledger:
+        ledger.close()
+    print(f"检查完成：{len(paths)} 个文件，{len(incomplete)} 个不完整。")
+    print(f"Check completed: {len(paths)} files, {len(incomplete)} incomplete.")
+
+
+if __name__ == "__main__":
+    main()
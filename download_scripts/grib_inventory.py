@@ -0,0 +1,95 @@
+"""
+grib_inventory.py – 根据请求参数检查 GRIB 文件是否包含全部消息
+Check that a GRIB file holds every message its request asked for
+
+grib_count / 结构检查只能说明文件可以解析，不能说明其中包含了请求的全部 变量 × 层次 × 时次 × 天数。
+这里根据台账中记录的请求参数列出应有的消息，与 grib_index.py 的索引逐条比较，
+按 变量/层次/时间 报告缺失、多余和重复的消息，只需重新请求出错的分块。
+grib_count or a framing check only shows a file can be parsed, not that it
+holds every variable × level × time × day that was requested. This lists the
+expected messages from the request stored in the ledger, compares them with
+the grib_index.py index and reports missing, unexpected and duplicate messages
+by variable/level/time, so only the faulty chunk has to be requested again.
+"""
+
+import datetime
+from collections import Counter
+
+# CDS 请求中的变量名 → GRIB 短名 | CDS request variable name → GRIB short name
+SHORT_NAMES = {
+    "geopotential": "z",
+    "relative_humidity": "r",
+    "specific_humidity": "q",
+    "temperature": "t",
+    "u_component_of_wind": "u",
+    "v_component_of_wind": "v",
+    "vertical_velocity": "w",
+    "10m_u_component_of_wind": "10u",
+    "10m_v_component_of_wind": "10v",
+    "2m_temperature": "2t",
+    "surface_pressure": "sp",
+}
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def expected_messages(request):
+    """
+    返回请求应当产生的 {(短名, 层次, 有效时间)}；地面变量的层次为 0
+    Return the {(short name, level, valid time)} a request should produce; surface fields have level 0
+    """
+    names = [SHORT_NAMES.get(v, v) for v in _as_list(request["variable"])]
+    levels = [int(lev) for lev in _as_list(request.get("pressure_level", []))] or [0]
+    times = []
+    for year in _as_list(request["year"]):
+        for month in _as_list(request["month"]):
+            for day in _as_list(request["day"]):
+                for hhmm in _as_list(request["time"]):
+                    hour, minute = (int(x) for x in hhmm.split(":"))
+                    times.append(datetime.datetime(int(year), int(month), int(day), hour, minute))
+    return {(name, level, t) for name in names for level in levels for t in times}
+
+
+def diff_inventory(expected, messages):
+    """
+    比较应有的消息与索引（grib_index.Message 列表），返回 {"missing", "unexpected", "duplicate"}
+    Compare the expected messages with an index (list of grib_index.Message);
+    returns {"missing", "unexpected", "duplicate"}
+    """
+    counts = Counter((m.short_name, m.level, m.valid_time) for m in messages)
+    return {
+        "missing": sorted(expected - set(counts)),
+        "unexpected": sorted(set(counts) - expected),
+        "duplicate": sorted(key for key, n in counts.items() if n > 1),
+    }
+
+
+def describe(diff, limit=5):
+    """
+    一行文字说明差异；没有差异时返回空字符串
+    One-line description of the differences; empty string if there are none
+    """
+    parts = []
+    for kind in ("missing", "unexpected", "duplicate"):
+        keys = diff[kind]
+        if keys:
+            shown = ", ".join(f"{name}/{level}/{t:%Y-%m-%d %H:%M}" for name, level, t in keys[:limit])
+            more = f" (+{len(keys) - limit} more)" if len(keys) > limit else ""
+            parts.append(f"{len(keys)} {kind}: {shown}{more}")
+    return "; ".join(parts)
+
+
+def check_inventory(request, messages, allow_extra=False):
+    """
+    返回 (是否完整, 说明)；allow_extra 时只多出消息（没有缺失或重复）仍算完整，说明中仍会列出
+    Return (complete, description); with allow_extra a file that only has extra
+    messages (none missing or duplicated) still counts as complete, though the
+    description lists them
+    """
+    diff = diff_inventory(expected_messages(request), messages)
+    text = describe(diff)
+    if allow_extra:
+        return not (diff["missing"] or diff["duplicate"]), text
+    return not text, text
@@ -0,0 +1,189 @@
+"""
+grib_stream.py – 下载过程中逐步检查 GRIB 消息结构
+Incremental GRIB framing verification while a file is being downloaded
+
+检查每条消息的 "GRIB" 标识、版本号、总长度、各段长度之和以及结尾的 "7777"，
+支持 GRIB1（含 ECMWF 大消息长度约定）和 GRIB2。
+Checks every message's "GRIB" indicator, edition, total length, the sum of its
+section lengths and the closing "7777"; handles GRIB1 (including the ECMWF
+large-message length convention) and GRIB2.
+
+校验器只需要每条消息的头部和结尾的少量字节：下载器写入的数据块如果正好包含这些字节就直接使用，
+消息主体被跳过；对于多段并行下载中已经先写好的区域，只从 .part 文件中读取这些字节，
+因此不会重新读取整个文件。
+The verifier only needs a few header bytes and the end marker of each message:
+chunks written by the downloader are used directly when they contain those
+bytes and message bodies are skipped. For regions another segment has already
+written, just those bytes are read back from the .part file, so the file is
+never read again in full.
+
+用法 | Usage:
+    verifier = GribStreamVerifier()
+    download(url, filepath, verifier=verifier)   # 损坏时抛出 GribFramingError | raises GribFramingError if corrupt
+    print(verifier.messages)
+"""
+
+import os
+import threading
+
+# GRIB1 第 0 段长度；读取第 0 段和第 1 段开头（含第 8 个字节的 GDS/BMS 标志）所需的字节数
+# GRIB1 section 0 length; bytes needed for section 0 plus the start of section 1 (up to its flag octet 8)
+GRIB1_IS_LEN = 8
+HEADER_LEN = 16
+END_MARKER = b"7777"
+
+
+class GribFramingError(ValueError):
+    pass
+
+
+class GribStreamVerifier:
+    """
+    按文件顺序检查消息结构。每一步需要 (偏移, 字节数) 处的数据，由 feed() 或 catch_up() 提供
+    Checks message framing in file order. Each step needs the bytes at (offset,
+    length), supplied by feed() or catch_up()
+    """
+
+    def __init__(self, on_message=None):
+        # on_message(offset, length) 在每条完整的消息之后调用
+        # on_message(offset, length) is called after every complete message
+        self.on_message = on_message
+        self.messages = 0
+        self.error = None
+        self._lock = threading.Lock()
+        self._buf = bytearray()
+        self._expect(0, HEADER_LEN, self._indicator)
+
+    def _expect(self, offset, length, handler):
+        self._need = (offset, length, handler)
+
+    # 下一个需要的字节位置 | Offset of the next byte needed
+    @property
+    def position(self):
+        return self._need[0] + len(self._buf)
+
+    # ---------- 输入 | Input ----------
+    def feed(self, offset, data):
+        """
+        提供从 offset 开始的数据；与当前需要的位置无关的数据被忽略
+        Supply data starting at offset; data not covering the needed position is ignored
+        """
+        with self._lock:
+            self._consume(offset, data)
+
+    def catch_up(self, read_at, written):
+        """
+        需要的字节已经写入文件（written(offset, n) 为真）时用 read_at(offset, n) 读取
+        Read the needed bytes with read_at(offset, n) once written(offset, n) says they are on disk
+        """
+        with self._lock:
+            while self.error is None:
+                offset, length, _ = self._need
+                start = offset + len(self._buf)
+                n = length - len(self._buf)
+                if not written(start, n):
+                    return
+                self._consume(start, read_at(start, n))
+
+    def finish(self, size):
+        """
+        文件结束：检查最后一条消息完整且没有多余字节，返回消息数
+        End of file: check the last message is complete with nothing trailing; return the message count
+        """
+        with self._lock:
+            if self.error is not None:
+                raise self.error
+            offset = self._need[0]
+            if self._buf or offset != size or self._need[2] != self._indicator:
+                raise GribFramingError(f"truncated GRIB message at byte {offset} of {size}")
+            if self.messages == 0:
+                raise GribFramingError("no GRIB messages")
+            return self.messages
+
+    def _consume(self, offset, data):
+        while self.error is None:
+            need_offset, length, handler = self._need
+            start = need_offset + len(self._buf)
+            if start < offset or start >= offset + len(data):
+                return
+            take = data[start - offset:start - offset + length - len(self._buf)]
+            self._buf += take
+            if len(self._buf) < length:
+                return
+            header = bytes(self._buf)
+            self._buf.clear()
+            try:
+                handler(need_offset, header)
+            except GribFramingError as e:
+                self.error = e
+
+    # ---------- 消息结构 | Message structure ----------
+    def _indicator(self, offset, b):
+        if b[:4] != b"GRIB":
+            raise GribFramingError(f"missing GRIB indicator at byte {offset}")
+        edition = b[7]
+        if edition == 1:
+            total = int.from_bytes(b[4:7], "big")
+            pds_len = int.from_bytes(b[8:11], "big")
+            flag = b[15]
+            self._msg = {"start": offset, "total": total, "large": bool(total & 0x800000),
+                         "sections": (["gds"] if flag & 0x80 else []) + (["bms"] if flag & 0x40 else []) + ["bds"]}
+            if self._msg["large"]:
+                # ECMWF 约定：超过 8 MB 的消息长度以 120 字节为单位，需要结合第 4 段修正
+                # ECMWF convention: messages over 8 MB store the length in 120-byte units, corrected from section 4
+                self._msg["total"] = (total & 0x7FFFFF) * 120
+            self._expect(offset + GRIB1_IS_LEN + pds_len, 3, self._grib1_section)
+        elif edition == 2:
+            total = int.from_bytes(b[8:16], "big")
+            self._msg = {"start": offset, "total": total}
+            self._expect(offset + HEADER_LEN, 4, self._grib2_section)
+        else:
+            raise GribFramingError(f"unknown GRIB edition {edition} at byte {offset}")
+
+    def _grib1_section(self, offset, b):
+        msg = self._msg
+        length = int.from_bytes(b, "big")
+        if length == 0:
+            raise GribFramingError(f"zero-length section at byte {offset}")
+        name = msg["sections"].pop(0)
+        if name != "bds":
+            self._expect(offset + length, 3, self._grib1_section)
+            return
+        if msg["large"] and length < 120:
+            msg["total"] = msg["total"] - length + 4
+        elif offset + length + 4 != msg["start"] + msg["total"]:
+            raise GribFramingError(
+                f"section lengths end at byte {offset + length + 4}, "
+                f"message length says {msg['start'] + msg['total']}")
+        self._expect(msg["start"] + msg["total"] - 4, 4, self._end)
+
+    def _grib2_section(self, offset, b):
+        end = self._msg["start"] + self._msg["total"]
+        if b == END_MARKER and offset + 4 == end:
+            self._end(offset, b)
+            return
+        length = int.from_bytes(b, "big")
+        if length < 5 or offset + length > end - 4:
+            raise GribFramingError(f"bad section length {length} at byte {offset}")
+        self._expect(offset + length, 4, self._grib2_section)
+
+    def _end(self, offset, b):
+        if b != END_MARKER:
+            raise GribFramingError(f"missing 7777 end marker at byte {offset}")
+        self.messages += 1
+        if self.on_message is not None:
+            self.on_message(self._msg["start"], offset + 4 - self._msg["start"])
+        self._expect(offset + 4, HEADER_LEN, self._indicator)
+
+
+# 检查一个已有文件（只读取每条消息的头部和结尾）
+# Verify an existing file (reads only the header and end of every message)
+def verify_file(path):
+    size = os.path.getsize(path)
+    verifier = GribStreamVerifier()
+    with open(path, "rb") as f:
+        def read_at(offset, n):
+            f.seek(offset)
+            return f.read(n)
+        verifier.catch_up(read_at, lambda offset, n: offset + n <= size)
+    return verifier.finish(size)
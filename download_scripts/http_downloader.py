@@ -0,0 +1,334 @@
+"""
+http_downloader.py – 可断点续传的多段并行 HTTP 下载器
+Resumable multi-range HTTP downloader
+
+将 result.location 按字节区间拆成多段并行下载到 <文件名>.part，
+每段的进度记录在 <文件名>.part.state 中，中断后再次运行会从断点继续；
+全部完成并校验大小后原子地重命名为最终文件名，因此最终文件一旦出现就是完整的。
+Downloads result.location in parallel byte-range segments into <name>.part,
+keeping per-segment progress in <name>.part.state so an interrupted download
+resumes where it stopped. Once every segment is complete and the size checks
+out, the .part file is atomically renamed, so the final filename only ever
+appears for a complete file.
+
+只依赖标准库，可以对任何 URL（包括本地测试服务器）使用。
+Standard library only; works against any URL, including a local test server.
+
+传入 verifier（grib_stream.GribStreamVerifier）时，写入的数据块同时用于检查 GRIB 消息结构，
+下载结束时文件即被确认为完整或损坏，不需要再读一遍。
+With a verifier (grib_stream.GribStreamVerifier), written chunks are also fed
+to the GRIB framing check, so the file is known to be complete or corrupt the
+moment the download ends, without reading it again.
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+CHUNK_SIZE = 1024 * 1024
+USER_AGENT = "HYSPLITwithERA5-downloader"
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+# 超过 deadline 时抛出；.part 和 .part.state 保留，之后可以继续下载
+# Raised once the deadline has passed; .part and .part.state are kept so the download can resume later
+class DeadlineExceeded(DownloadError):
+    pass
+
+
+def _check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded("download deadline exceeded")
+
+
+# 查询文件大小以及服务器是否支持 Range 请求
+# Query file size and whether the server supports Range requests
+def probe(url, timeout=60):
+    req = urllib.request.Request(url, headers={"Range": "bytes=0-0", "User-Agent": USER_AGENT})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        if resp.status == 206:
+            content_range = resp.headers.get("Content-Range", "")
+            total = content_range.rsplit("/", 1)[-1]
+            if total.isdigit():
+                return int(total), True
+        length = resp.headers.get("Content-Length")
+        return (int(length) if length and length.isdigit() else None), False
+
+
+# 下载链接是否仍然有效（CDS 的结果链接会过期）；无法判断（网络错误）时返回 None
+# Whether a download URL is still valid (CDS result links expire); None if it cannot be told (network error)
+def url_alive(url, timeout=30):
+    try:
+        probe(url, timeout=timeout)
+        return True
+    except urllib.error.HTTPError as e:
+        return False if e.code in (403, 404, 410) else None
+    except OSError:
+        return None
+
+
+def _split(size, segments):
+    segments = max(1, min(segments, size // CHUNK_SIZE or 1))
+    step = size // segments
+    bounds = []
+    for i in range(segments):
+        start = i * step
+        end = size - 1 if i == segments - 1 else start + step - 1
+        bounds.append({"start": start, "end": end, "done": 0})
+    return bounds
+
+
+class _State:
+    """
+    .part.state 文件：记录 URL、总大小和每段已写入的字节数
+    .part.state file: URL, total size and bytes written per segment
+    """
+
+    def __init__(self, path, url, size, segments):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = None
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if data.get("size") == size:
+                    self.data = data
+            except (OSError, ValueError):
+                self.data = None
+        if self.data is None:
+            self.data = {"url": url, "size": size, "segments": _split(size, segments)}
+        # URL 可能因重新提交而变化，但只要大小一致就可以续传
+        # The URL may change after a resubmission; resuming is fine as long as the size matches
+        self.data["url"] = url
+
+    @property
+    def segments(self):
+        return self.data["segments"]
+
+    def reset(self, segments):
+        self.data["segments"] = _split(self.data["size"], segments)
+
+    def advance(self, index, nbytes):
+        with self.lock:
+            self.segments[index]["done"] += nbytes
+
+    # [offset, offset + n) 是否已全部写入 | Whether [offset, offset + n) has been written
+    def written(self, offset, n):
+        end = offset + n
+        with self.lock:
+            for seg in self.segments:
+                if seg["start"] <= offset < seg["start"] + seg["done"]:
+                    offset = seg["start"] + seg["done"]
+                    if offset >= end:
+                        return True
+        return offset >= end
+
+    def save(self):
+        with self.lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def written_prefix(part_path):
+    """
+    正在下载的 .part 文件从头开始连续写入的字节数（分段下载按 .part.state 计算，否则为文件大小）
+    Bytes of a .part file written contiguously from the start (from .part.state
+    for segmented downloads, otherwise the file size)
+    """
+    try:
+        with open(part_path + ".state", "r") as f:
+            segments = json.load(f)["segments"]
+    except FileNotFoundError:
+        return os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    except (OSError, ValueError, KeyError):
+        return 0
+    end = 0
+    for seg in sorted(segments, key=lambda s: s["start"]):
+        if seg["start"] > end:
+            break
+        end = max(end, seg["start"] + seg["done"])
+        if seg["start"] + seg["done"] <= seg["end"]:
+            break
+    return end
+
+
+def _fetch_segment(url, part_path, state, index, retries, timeout, save_interval, check, deadline=None):
+    seg = state.segments[index]
+    attempt = 0
+    while seg["start"] + seg["done"] <= seg["end"]:
+        _check_deadline(deadline)
+        offset = seg["start"] + seg["done"]
+        progress_before = seg["done"]
+        req = urllib.request.Request(url, headers={
+            "Range": f"bytes={offset}-{seg['end']}", "User-Agent": USER_AGENT})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp, open(part_path, "r+b") as f:
+                if resp.status != 206:
+                    raise DownloadError(f"server ignored Range request (HTTP {resp.status})")
+                f.seek(offset)
+                last_save = time.monotonic()
+                while True:
+                    remaining = seg["end"] + 1 - (seg["start"] + seg["done"])
+                    if remaining <= 0:
+                        break
+                    chunk = resp.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    # 先把数据块交给操作系统再记录进度：其他线程随时可能 save()，.part.state 中的 done
+                    # 不能包含仍在缓冲区中的字节；写入后也能立即从另一个文件句柄读到（供 catch_up 使用）
+                    # Hand the chunk to the OS before recording progress: another thread may save() at any
+                    # moment, and done in .part.state must not count bytes still in a buffer. The bytes are
+                    # then also visible to other file handles right away (for catch_up)
+                    f.write(chunk)
+                    f.flush()
+                    state.advance(index, len(chunk))
+                    check(seg["start"] + seg["done"] - len(chunk), chunk)
+                    if time.monotonic() - last_save > save_interval:
+                        state.save()
+                        last_save = time.monotonic()
+                    _check_deadline(deadline)
+            if seg["done"] > progress_before:
+                attempt = 0
+                continue
+            error = DownloadError("connection closed without data")
+        except DeadlineExceeded:
+            raise
+        except (OSError, urllib.error.URLError, DownloadError) as e:
+            error = e
+        attempt += 1
+        if attempt > retries:
+            raise DownloadError(f"segment {index} failed after {retries} retries: {error}") from error
+        wait = min(2 ** attempt, 60)
+        if deadline is not None:
+            wait = max(0, min(wait, deadline - time.monotonic()))
+        time.sleep(wait)
+
+
+def _fetch_single(url, part_path, timeout, check, deadline=None):
+    req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    offset = 0
+    with urllib.request.urlopen(req, timeout=timeout) as resp, open(part_path, "wb") as f:
+        while True:
+            chunk = resp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            check(offset, chunk)
+            offset += len(chunk)
+            _check_deadline(deadline)
+
+
+# 下载 url 到 filepath，返回文件大小；verifier 报告结构错误时删除 .part 并抛出 GribFramingError。
+# on_event(name, **fields) 收到 first_byte 和 last_byte（含 bytes、seconds）事件；
+# deadline（time.monotonic() 时刻）过后各段在下一个数据块处停止并抛出 DeadlineExceeded
+# Download url to filepath and return the file size; if the verifier reports a
+# framing error the .part file is removed and GribFramingError is raised.
+# on_event(name, **fields) receives first_byte and last_byte (with bytes, seconds) events;
+# once deadline (a time.monotonic() value) passes, every segment stops at its next chunk
+# and DeadlineExceeded is raised
+def download(url, filepath, segments=4, retries=5, timeout=120, save_interval=5.0, verifier=None, on_event=None,
+             deadline=None):
+    part_path = filepath + ".part"
+    state_path = part_path + ".state"
+    _check_deadline(deadline)
+    size, ranged = probe(url, timeout=timeout)
+    first_byte = []
+    first_lock = threading.Lock()
+
+    def started():
+        if on_event is not None and not first_byte:
+            with first_lock:
+                if not first_byte:
+                    first_byte.append(time.monotonic())
+                    on_event("first_byte")
+
+    if not ranged or not size:
+        # 服务器不支持 Range：整体重新下载，无法续传
+        # No Range support: download in one piece, resuming is not possible
+        def check(offset, chunk):
+            started()
+            if verifier is not None:
+                verifier.feed(offset, chunk)
+
+        _fetch_single(url, part_path, timeout, check, deadline)
+    else:
+        state = _State(state_path, url, size, segments)
+        if not os.path.exists(part_path) or os.path.getsize(part_path) != size:
+            # 新文件或大小不符：预分配并从头开始
+            # New or mismatched file: preallocate and start over
+            state.reset(segments)
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+        state.save()
+
+        errors = []
+        # 不使用缓冲：缓冲读取会在缓冲区内 seek 时返回其他段写入之前的旧内容（预分配的零）
+        # Unbuffered: a buffered reader seeking within its buffer would return what was there
+        # before another segment wrote it (the preallocated zeros)
+        reader = open(part_path, "rb", buffering=0) if verifier is not None else None
+
+        def read_at(offset, n):
+            reader.seek(offset)
+            return reader.read(n)
+
+        # 数据块交给校验器；需要的头部如果已由其他段写入，则从文件中读取这几个字节
+        # Hand each chunk to the verifier; header bytes already written by another segment are read back from the file
+        def check(offset, chunk):
+            started()
+            if verifier is not None:
+                verifier.feed(offset, chunk)
+                verifier.catch_up(read_at, state.written)
+
+        def run(index):
+            try:
+                _fetch_segment(url, part_path, state, index, retries, timeout, save_interval, check, deadline)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,), daemon=True)
+                   for i in range(len(state.segments))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        state.save()
+        if reader is not None:
+            # 续传时之前写入的区域没有经过 feed，在这里补查
+            # Regions written by an earlier run were never fed; check them here
+            verifier.catch_up(read_at, state.written)
+            reader.close()
+        if errors:
+            error = next((e for e in errors if isinstance(e, DeadlineExceeded)), errors[0])
+            cls = DeadlineExceeded if isinstance(error, DeadlineExceeded) else DownloadError
+            raise cls(f"{os.path.basename(filepath)}: {error}")
+        state.remove()
+
+    actual = os.path.getsize(part_path)
+    if size and actual != size:
+        raise DownloadError(f"{os.path.basename(filepath)}: expected {size} bytes, got {actual}")
+    if on_event is not None:
+        seconds = time.monotonic() - first_byte[0] if first_byte else None
+        on_event("last_byte", bytes=actual, seconds=seconds)
+    if verifier is not None:
+        try:
+            verifier.finish(actual)
+        except Exception:
+            # 内容损坏，续传没有意义：删除后重新下载
+            # The content is corrupt and resuming would not help: remove it for a fresh download
+            os.remove(part_path)
+            raise
+    os.replace(part_path, filepath)
+    return actual
@@ -0,0 +1,149 @@
+"""
+met_config.py – 读写 era52arl 的 era52arl.cfg（GRIB 变量与气压层）和 arldata.cfg（ARL 网格与层次定义）
+Read and write era52arl's era52arl.cfg (GRIB variables and pressure levels)
+and arldata.cfg (ARL grid and level definition)
+
+era52arl 每次转换都会按 GRIB 文件的网格重新生成 arldata.cfg（MAKNDX），这里按同样的格式
+写出与下载区域和层次一致的版本，便于在下载前核对 HYSPLIT 将读到的网格。
+era52arl rewrites arldata.cfg from the GRIB grid on every conversion (MAKNDX);
+this writes the same format for a given download area and level set so the
+grid HYSPLIT will read can be checked before anything is downloaded.
+"""
+
+import re
+
+GRID_LABELS = ["Pole Lat:", "Pole Lon:", "Ref Lat:", "Ref Lon:", "Grid Size:", "Orientation:", "Cone Angle:",
+               "Sync X Pt:", "Sync Y Pt:", "Sync Lat:", "Sync Lon:", "Reserved:"]
+
+
+def read_arldata(path):
+    """
+    返回 (表头 {标签: 值字符串}, [(层次值, [变量...]), ...])
+    Return (header {label: value string}, [(level value, [variables...]), ...])
+    """
+    header, levels = {}, []
+    with open(path, "r") as f:
+        for line in f:
+            label, value = line[:20].strip(), line[20:].strip()
+            if not label:
+                continue
+            if label.startswith("Level"):
+                parts = value.split()
+                levels.append((float(parts[0]), parts[2:]))
+            else:
+                header[label] = value
+    return header, levels
+
+
+def grid_header(area, grid=0.25):
+    """
+    area = [北, 西, 南, 东] → MAKNDX 写出的规则经纬度网格参数（经度取 0–360）
+    area = [north, west, south, east] → the regular lat-lon grid values MAKNDX writes (longitudes on 0–360)
+    """
+    north, west, south, east = (float(v) for v in area)
+    return {
+        "Pole Lat:": north, "Pole Lon:": east % 360.0,
+        "Ref Lat:": grid, "Ref Lon:": grid,
+        "Grid Size:": 0.0, "Orientation:": 0.0, "Cone Angle:": 0.0,
+        "Sync X Pt:": 1.0, "Sync Y Pt:": 1.0,
+        "Sync Lat:": south, "Sync Lon:": west % 360.0,
+        "Reserved:": 0.0,
+        "Numb X pt:": int(round((east - west) / grid)) + 1,
+        "Numb Y pt:": int(round((north - south) / grid)) + 1,
+    }
+
+
+def _level_value(sig):
+    # 与 MAKNDX 相同：按数量级选择小数位数，总宽 6 列
+    # As MAKNDX does: the number of decimals depends on the magnitude, 6 columns wide
+    if sig < 1:
+        return f"{sig:.5f}"[1:]   # Fortran F6.5 drops the leading zero
+    if sig < 10:
+        return f"{sig:6.4f}"
+    if sig < 100:
+        return f"{sig:6.3f}"
+    if sig < 1000:
+        return f"{sig:6.2f}"
+    return f"{sig:6.1f}"
+
+
+def format_arldata(header, levels):
+    lines = [f"{'Model Type:':20s}{header.get('Model Type:', 'ERA5'):>4s}",
+             f"{'Grid Numb:':20s}{header.get('Grid Numb:', '99'):>4s}",
+             f"{'Vert Coord:':20s}{header.get('Vert Coord:', '2'):>4s}"]
+    for label in GRID_LABELS:
+        lines.append(f"{label:20s}{float(header[label]):10.2f}")
+    for label in ("Numb X pt:", "Numb Y pt:"):
+        lines.append(f"{label:20s}{int(header[label]):4d}")
+    lines.append(f"{'Numb Levels:':20s}{len(levels):4d}")
+    for n, (sig, variables) in enumerate(levels, 1):
+        lines.append(f"{f'Level {n:4d}:':20s}{_level_value(sig)}{len(variables):3d}"
+                     + "".join(f" {v:4s}" for v in variables))
+    return "\n".join(lines) + "\n"
+
+
+def write_arldata(path, template, area=None, grid=0.25, pressure_levels=None):
+    """
+    以 template 为模板写出 arldata.cfg；给出 area 时替换网格定义，给出 pressure_levels 时只保留这些气压层
+    Write arldata.cfg from template, replacing the grid definition when area is
+    given and keeping only pressure_levels when those are given
+    """
+    header, levels = read_arldata(template)
+    if area is not None:
+        header.update(grid_header(area, grid))
+    if pressure_levels is not None:
+        keep = {float(p) for p in pressure_levels}
+        levels = [(sig, variables) for n, (sig, variables) in enumerate(levels) if n == 0 or sig in keep]
+    with open(path, "w") as f:
+        f.write(format_arldata(header, levels))
+
+
+def read_era52arl_levels(path):
+    """
+    era52arl.cfg 中 plev 列出的气压层（hPa，按文件中的顺序）
+    The pressure levels (hPa, in file order) listed by plev in era52arl.cfg
+    """
+    with open(path, "r") as f:
+        m = re.search(r"^\s*plev\s*=\s*([\d.,\s]+)", f.read(), re.MULTILINE)
+    return [float(v) for v in m.group(1).replace(",", " ").split()] if m else []
+
+
+def read_era52arl(path):
+    """
+    era52arl.cfg 的 &SETUP 名单 → {名称: [值, ...]}（字符串去掉引号，数字转为 int 或 float）
+    The &SETUP namelist of era52arl.cfg → {name: [values, ...]} (strings
+    unquoted, numbers as int or float)
+    """
+    with open(path, "r") as f:
+        text = f.read()
+    body = text[text.index("&SETUP") + len("&SETUP"):].rsplit("/", 1)[0]
+    setup = {}
+    for name, value in re.findall(r"(\w+)\s*=\s*(.*?)(?=\w+\s*=|\Z)", body, re.DOTALL):
+        items = [v.strip() for v in value.replace("\n", " ").split(",") if v.strip()]
+        values = []
+        for item in items:
+            if item[0] in "'\"":
+                values.append(item.strip("'\""))
+            else:
+                values.append(float(item) if "." in item or "e" in item.lower() else int(item))
+        setup[name.lower()] = values
+    return setup
+
+
+def write_era52arl(path, template, pressure_levels):
+    """
+    以 template 为模板写出 era52arl.cfg，numlev / plev 换成 pressure_levels（从地面向上排列）
+    Write era52arl.cfg from template with numlev / plev set to pressure_levels (surface upwards)
+    """
+    levels = sorted((float(p) for p in pressure_levels), reverse=True)
+    plev = ",".join(f"{p:g}" for p in levels)
+    lines = []
+    with open(template, "r") as f:
+        for line in f:
+            if re.match(r"^\s*numlev\s*=", line):
+                line = re.sub(r"=\s*\d+", f"= {len(levels)}", line)
+            elif re.match(r"^\s*plev\s*=", line):
+                line = re.sub(r"=.*", f"= {plev},", line)
+            lines.append(line)
+    with open(path, "w") as f:
+        f.writelines(lines)
@@ -0,0 +1,243 @@
+"""
+mock_cds.py – 本地 CDS 替身，用于离线测试和基准测试
+Local CDS stand-in for offline testing and benchmarking
+
+模拟 cdsapi.Client().retrieve 的行为：
+Mimics cdsapi.Client().retrieve:
+    - 排队延迟：同时运行的任务数有限，其余任务排队等待 | queueing latency: only a few jobs run at once, the rest wait
+    - 150 个任务上限：超过时 retrieve 抛出异常 | the 150-job limit: retrieve raises beyond it
+    - 下载链接在 url_ttl 秒后过期（返回 404）| download URLs expire after url_ttl seconds (404)
+    - 按比例传输中断（连接在中途关闭）或结果缺少消息 | a share of transfers cut off mid-body, or results missing messages
+
+结果是按请求参数生成的真实 GRIB1 消息（数据部分为填充字节，大小由 field_bytes 决定），
+由内置的 HTTP 服务器提供，支持 Range 请求。
+Results are real GRIB1 messages generated from the request (the data section
+is filler of field_bytes bytes), served by a built-in HTTP server that
+supports Range requests.
+
+用法 | Usage:
+    cds = MockCDS(latency=0.5, url_ttl=60, truncate_rate=0.1)
+    engine = DownloadEngine(folder, client=cds.client())
+    python pipeline.py ... --client mock_cds:Client      # 参数取自环境变量 MOCK_CDS_* | settings from MOCK_CDS_* env vars
+"""
+
+import datetime
+import http.server
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import types
+import uuid
+
+from cds_scheduler import CDS_TASK_LIMIT
+from grib_index import GRIB1_PARAMS
+from grib_inventory import SHORT_NAMES
+
+# 短名 → ECMWF 表 128 参数号 | Short name → ECMWF table 128 parameter number
+PARAM_IDS = {name: param for param, name in GRIB1_PARAMS.items()}
+
+
+def grib1_message(param, level, valid_time, field_bytes):
+    """
+    生成一条 GRIB1 消息（含 GDS，数据部分为填充字节）；level 为 0 表示地面
+    Build one GRIB1 message (with a GDS and a filler data section); level 0 means surface
+    """
+    pds = bytearray(28)
+    pds[0:3] = len(pds).to_bytes(3, "big")
+    pds[3] = 128
+    pds[4] = 98
+    pds[7] = 0x80
+    pds[8] = param
+    pds[9] = 100 if level else 1
+    pds[10:12] = level.to_bytes(2, "big")
+    pds[12] = (valid_time.year - 1) % 100 + 1
+    pds[13:17] = bytes([valid_time.month, valid_time.day, valid_time.hour, valid_time.minute])
+    pds[17] = 1
+    pds[24] = (valid_time.year - 1) // 100 + 1
+    gds = (32).to_bytes(3, "big") + bytes(29)
+    bds = (field_bytes + 11).to_bytes(3, "big") + bytes(8) + b"\x5a" * field_bytes
+    body = bytes(pds) + gds + bds
+    total = 8 + len(body) + 4
+    return b"GRIB" + total.to_bytes(3, "big") + b"\x01" + body + b"7777"
+
+
+def request_messages(request, field_bytes):
+    """
+    按 CDS 的顺序（日期 → 时次 → 变量 → 层次）生成请求对应的全部消息
+    Generate every message of a request in CDS order (day → time → variable → level)
+    """
+    levels = [int(lev) for lev in request.get("pressure_level", [])] or [0]
+    for year in request["year"]:
+        for month in request["month"]:
+            for day in request["day"]:
+                for hhmm in request["time"]:
+                    hour, minute = (int(x) for x in hhmm.split(":"))
+                    valid = datetime.datetime(int(year), int(month), int(day), hour, minute)
+                    for variable in request["variable"]:
+                        param = PARAM_IDS[SHORT_NAMES[variable]]
+                        for level in levels:
+                            yield grib1_message(param, level, valid, field_bytes)
+
+
+class MockCDS:
+    def __init__(self, latency=1.0, running_jobs=4, max_jobs=CDS_TASK_LIMIT, url_ttl=3600,
+                 truncate_rate=0.0, corrupt_rate=0.0, field_bytes=2048, seed=None):
+        self.latency = latency
+        self.max_jobs = max_jobs
+        self.url_ttl = url_ttl
+        self.truncate_rate = truncate_rate
+        self.corrupt_rate = corrupt_rate
+        self.field_bytes = field_bytes
+        self.random = random.Random(seed)
+        self.folder = tempfile.mkdtemp(prefix="mock_cds_")
+        self._running = threading.Semaphore(running_jobs)
+        self._lock = threading.Lock()
+        self._files = {}   # 令牌 → (文件路径, 签发时间) | token → (file path, issue time)
+        self.jobs = 0
+        self.peak_jobs = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.truncated = 0
+        self.corrupted = 0
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def client(self):
+        return _Client(self)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    # ---------- CDS 任务 | CDS jobs ----------
+    def retrieve(self, dataset, request):
+        with self._lock:
+            if self.jobs >= self.max_jobs:
+                self.rejected += 1
+                raise RuntimeError(f"Number of API queued requests for this user has exceeded the limit ({self.max_jobs})")
+            self.jobs += 1
+            self.submitted += 1
+            self.peak_jobs = max(self.peak_jobs, self.jobs)
+            corrupt = self.random.random() < self.corrupt_rate
+            delay = self.latency * self.random.uniform(0.5, 1.5)
+        try:
+            # 排队等待运行槽位，然后“处理”请求
+            # Wait in the queue for a running slot, then "process" the request
+            with self._running:
+                time.sleep(delay)
+                token = uuid.uuid4().hex
+                path = os.path.join(self.folder, token + ".grib")
+                messages = list(request_messages(request, self.field_bytes))
+                if corrupt and len(messages) > 1:
+                    messages.pop(self.random.randrange(len(messages)))
+                    with self._lock:
+                        self.corrupted += 1
+                with open(path, "wb") as f:
+                    f.writelines(messages)
+            with self._lock:
+                self._files[token] = (path, time.time())
+            return types.SimpleNamespace(location=f"{self.base_url}/download/{token}/{dataset}.grib")
+        finally:
+            with self._lock:
+                self.jobs -= 1
+
+    # ---------- HTTP 下载 | HTTP download ----------
+    def _lookup(self, token):
+        with self._lock:
+            entry = self._files.get(token)
+        if entry is None or time.time() - entry[1] > self.url_ttl:
+            return None
+        return entry[0]
+
+    def _truncate(self):
+        with self._lock:
+            if self.random.random() < self.truncate_rate:
+                self.truncated += 1
+                return True
+        return False
+
+    def _handler(self):
+        cds = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                m = re.match(r"^/download/([0-9a-f]+)/", self.path)
+                path = cds._lookup(m.group(1)) if m else None
+                if path is None:
+                    self.send_error(404, "result expired")
+                    return
+                size = os.path.getsize(path)
+                start, end = 0, size - 1
+                rng = self.headers.get("Range")
+                if rng:
+                    a, b = re.match(r"bytes=(\d+)-(\d*)", rng).groups()
+                    start, end = int(a), min(int(b), size - 1) if b else size - 1
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                length = end - start + 1
+                self.send_header("Content-Length", str(length))
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+                # 按比例在中途断开连接（只对较大的传输）
+                # Cut a share of transfers off mid-body (larger transfers only)
+                if length > 1024 and cds._truncate():
+                    length //= 2
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    try:
+                        while length > 0:
+                            chunk = f.read(min(1024 * 1024, length))
+                            if not chunk:
+                                break
+                            self.wfile.write(chunk)
+                            length -= len(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                self.close_connection = True
+
+        return Handler
+
+
+class _Client:
+    def __init__(self, cds):
+        self.cds = cds
+
+    def retrieve(self, dataset, request, target=None):
+        return self.cds.retrieve(dataset, request)
+
+
+_default = None
+
+
+def Client():
+    """
+    与 cdsapi.Client 同名的工厂函数，供 pipeline.py --client mock_cds:Client 使用；
+    参数取自环境变量 MOCK_CDS_LATENCY / MOCK_CDS_URL_TTL / MOCK_CDS_TRUNCATE_RATE / MOCK_CDS_CORRUPT_RATE / MOCK_CDS_FIELD_BYTES
+    Factory named like cdsapi.Client for pipeline.py --client mock_cds:Client;
+    settings come from MOCK_CDS_LATENCY / MOCK_CDS_URL_TTL / MOCK_CDS_TRUNCATE_RATE
+    / MOCK_CDS_CORRUPT_RATE / MOCK_CDS_FIELD_BYTES
+    """
+    global _default
+    if _default is None:
+        env = os.environ.get
+        _default = MockCDS(latency=float(env("MOCK_CDS_LATENCY", "1.0")),
+                           url_ttl=float(env("MOCK_CDS_URL_TTL", "3600")),
+                           truncate_rate=float(env("MOCK_CDS_TRUNCATE_RATE", "0")),
+                           corrupt_rate=float(env("MOCK_CDS_CORRUPT_RATE", "0")),
+                           field_bytes=int(env("MOCK_CDS_FIELD_BYTES", "2048")))
+    return _default.client()
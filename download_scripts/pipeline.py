@@ -0,0 +1,89 @@
+"""
+pipeline.py – 事件驱动的下载/检查/转换流水线（替代 auto_download_check.bat 的轮询循环）
+Event-driven download/verify/convert pipeline (replaces the auto_download_check.bat polling loop)
+
+每个分块独立地经过 下载 → 检查 → （失败重试）→ 配对 → 转换，
+每一步都由上一步完成的事件触发，不再反复轮询整个不完整文件列表：
+Each chunk moves on its own through download → verify → (retry) → pair →
+convert, each step triggered by the previous one finishing instead of
+re-polling the whole incomplete list:
+
+    下载完成 download done    → 流式结构检查 + 消息清单检查 | streaming framing + inventory check
+    检查失败 check failed     → 延迟后单独重新排队 | requeued on its own after a back-off
+    检查通过 check passed     → 查找可配对的气压层/地面文件 | look for a pressure/surface pair
+    配对完成 pair ready       → 加入 era52arl 转换队列 | queued for era52arl
+
+一个分块失败只影响它自己，其他分块继续下载和转换。所有状态都在任务台账中，
+中断后重新运行会从台账中的状态继续。
+A failing chunk only affects itself; the others keep downloading and
+converting. All state lives in the task ledger, so a rerun after an
+interruption carries on from there.
+
+用法 | Usage:
+    python pipeline.py --output /data/era5 --start 1950 --end 1953 --era52arl-dir ../convert_era52arl
+    python pipeline.py --output /tmp/era5 --start 1950 --end 1950 --client mock_cds:Client   # 本地替身 | local stand-in
+"""
+
+import argparse
+import importlib
+import sys
+
+from era5_download import PRODUCTS, DownloadEngine
+
+
+def load_client(spec):
+    """
+    "模块:可调用对象" → 客户端实例，例如 "mock_cds:Client"
+    "module:callable" → client instance, e.g. "mock_cds:Client"
+    """
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "Client")()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ERA5 下载/检查/转换流水线 | ERA5 download/verify/convert pipeline")
+    ap.add_argument("--output", required=True, help="数据目录 | data folder")
+    ap.add_argument("--start", type=int, required=True, help="起始年份 | first year")
+    ap.add_argument("--end", type=int, required=True, help="结束年份 | last year")
+    ap.add_argument("--products", nargs="+", choices=sorted(PRODUCTS), default=sorted(PRODUCTS))
+    ap.add_argument("--era52arl-dir", help="era52arl 所在目录；不设置则只下载 | era52arl folder; download only if unset")
+    ap.add_argument("--max-in-flight", type=int, default=8)
+    ap.add_argument("--convert-workers", type=int, default=1, help="同时运行的 era52arl 进程数 | concurrent era52arl processes")
+    ap.add_argument("--convert-backend", choices=("era52arl", "numpy"), default="era52arl",
+                    help="转换后端：era52arl 程序或 arl_packer.py（需要 NumPy）| converter: the era52arl binary or arl_packer.py (needs NumPy)")
+    ap.add_argument("--stream-convert", action="store_true",
+                    help="地面文件就绪后边下载边转换气压层分块（需要 NumPy）| convert pressure chunks while they download once the surface file is ready (needs NumPy)")
+    ap.add_argument("--segments", type=int, default=4, help="每个文件的并行分段数 | parallel segments per file")
+    ap.add_argument("--target-mb", type=float, default=3200)
+    ap.add_argument("--retries", type=int, default=3, help="每个分块的重试次数 | retries per chunk")
+    ap.add_argument("--retry-delay", type=float, default=300, help="首次重试前等待的秒数 | seconds before the first retry")
+    ap.add_argument("--events", default="", help="计时事件日志路径，默认在数据目录中 | timing event log, in the data folder by default")
+    ap.add_argument("--areas", default="", help="每月下载区域 footprint_areas.csv，默认在数据目录中 | per-month areas file, in the data folder by default")
+    ap.add_argument("--levels", default="", help="下载的气压层 pressure_levels.txt，默认在数据目录中 | pressure levels file, in the data folder by default")
+    ap.add_argument("--disk-budget-gb", type=float, help="数据目录最多占用的空间（GB）| most space the data folder may use (GB)")
+    ap.add_argument("--min-free-gb", type=float, help="磁盘至少保留的剩余空间（GB）| free space to keep on the disk (GB)")
+    ap.add_argument("--cache", help="请求缓存目录（可供多个项目共用）| request cache folder (may be shared between projects)")
+    ap.add_argument("--client", help="CDS 客户端替身，格式 模块:类 | CDS client stand-in as module:class")
+    args = ap.parse_args(argv)
+
+    client = load_client(args.client) if args.client else None
+    engine = DownloadEngine(args.output, {name: PRODUCTS[name] for name in args.products}, client=client,
+                            max_in_flight=args.max_in_flight, download_segments=args.segments,
+                            target_mb=args.target_mb, era52arl_dir=args.era52arl_dir,
+                            max_retries=args.retries, retry_delay=args.retry_delay,
+                            events_path=args.events, areas=args.areas,
+                            levels=args.levels, disk_budget_gb=args.disk_budget_gb, min_free_gb=args.min_free_gb,
+                            cache_dir=args.cache, convert_workers=args.convert_workers,
+                            convert_backend=args.convert_backend, stream_convert=args.stream_convert)
+    engine.run(args.start, args.end)
+
+    failed = 0
+    for row in engine.ledger.summary():
+        print(f"{row['product'] or '-':10s} {row['state']:12s} {row['n']:6d}")
+        if row["state"] == "failed":
+            failed += row["n"]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+request_cache.py – 按请求内容寻址的本地 GRIB 缓存，跨项目和重跑避免重复提交 CDS 请求
+Content-addressed local GRIB cache so reruns and other projects skip the CDS queue
+
+原来只按输出文件名去重（submitted_tasks / 台账），不同研究区或重新运行时，完全相同的
+(数据集, 变量, 层次, 区域, 日期) 请求会再次排队。这里把请求参数规范化后取 SHA-256 作为键，
+下载完成的 GRIB 文件以 <缓存目录>/<键前两位>/<键>.grib 保存（同一磁盘上用硬链接，不占额外空间）。
+Deduplication used to go by output filename only (submitted_tasks / the
+ledger), so a different study area or a rerun queued the very same
+(dataset, variables, levels, area, dates) request again. Requests are
+canonicalised and hashed (SHA-256) into a key, and finished GRIB files are kept
+as <cache>/<key[:2]>/<key>.grib (hard links on the same drive, so no extra space).
+
+查找顺序 | Lookup order:
+    exact   键相同：直接链接或复制 | same key: link or copy the file
+    subset  同一数据集、其余参数相同，缓存的变量/层次/时次/日期包含所请求的，缓存区域包含所请求区域：
+            按 .idx 取出所需的消息，区域不同时用 grib_crop 在本地裁剪（数值不变）
+            | same dataset and other parameters, the cached variables/levels/times/dates
+            | include the requested ones and the cached area contains the requested
+            | area: the wanted messages are taken via the .idx and cropped locally
+            | with grib_crop when the area differs (values unchanged)
+
+无法裁剪的消息（非 GRIB1 简单打包、网格不对齐）时返回未命中，由调用方正常提交请求。
+When messages cannot be cropped (not GRIB1 simple packing, area off the grid)
+the lookup is a miss and the caller submits the request as usual.
+
+命令行 | Command line:
+    python request_cache.py --cache H:\\era5_cache stats
+    python request_cache.py --cache H:\\era5_cache prune --max-gb 500
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from grib_crop import CropError, crop_message
+from grib_index import load_index
+from grib_inventory import expected_messages
+
+CACHE_NAME = "request_cache.sqlite"
+
+# 取值为集合的请求参数：缓存的取值包含所请求的即可复用
+# Request keys whose values are sets: a cached entry is reusable when it includes the requested values
+SET_KEYS = ("variable", "pressure_level", "time", "year", "month", "day")
+INT_KEYS = ("pressure_level", "year", "month", "day")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key        TEXT PRIMARY KEY,
+    dataset    TEXT NOT NULL,
+    request    TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    bytes      INTEGER,
+    created_at REAL NOT NULL,
+    used_at    REAL,
+    hits       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_entries_dataset ON entries(dataset);
+"""
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def canonical(request):
+    """
+    规范化请求：集合参数去重排序（层次和日期按整数），区域取浮点数，其余取原值
+    Canonical request: set keys deduplicated and sorted (levels and dates as
+    integers), area as floats, everything else as is
+    """
+    result = {}
+    for key, value in request.items():
+        if key in SET_KEYS:
+            values = _as_list(value)
+            result[key] = sorted({int(v) for v in values} if key in INT_KEYS else {str(v) for v in values})
+        elif key == "area":
+            result[key] = [float(v) for v in value]
+        else:
+            result[key] = value
+    return result
+
+
+def request_key(dataset, request):
+    text = json.dumps([dataset, canonical(request)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def area_contains(outer, inner):
+    north, west, south, east = outer
+    return north >= inner[0] and west <= inner[1] and south <= inner[2] and east >= inner[3]
+
+
+def covers(cached, wanted):
+    """
+    缓存的请求能否得到所请求的数据（二者都已规范化）
+    Whether the cached request can serve the wanted one (both canonical)
+    """
+    if set(cached) != set(wanted):
+        return False
+    for key, value in wanted.items():
+        if key in SET_KEYS:
+            if not set(value) <= set(cached[key]):
+                return False
+        elif key == "area":
+            if not area_contains(cached[key], value):
+                return False
+        elif cached[key] != value:
+            return False
+    return True
+
+
+def _link_or_copy(src, dst):
+    # 同一磁盘上用硬链接，否则复制；先写临时文件再改名 | Hard link on the same drive, else copy; via a temporary name
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class RequestCache:
+    def __init__(self, folder, timeout=60.0):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.path = os.path.join(folder, CACHE_NAME)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    # 每个线程一个连接 | One connection per thread
+    def _connect(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con = con
+        return con
+
+    def close(self):
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    def entry_path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.grib")
+
+    # ---------- 查找 | Lookup ----------
+    def lookup(self, dataset, request):
+        """
+        可以得到该请求的缓存条目 → (方式, 条目)，方式为 "exact" 或 "subset"；没有时返回 None
+        A cache entry that can serve the request → (match, entry) with match
+        "exact" or "subset"; None when there is none
+        """
+        con = self._connect()
+        key = request_key(dataset, request)
+        row = con.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None and os.path.exists(row["path"]):
+            return "exact", dict(row)
+        wanted = canonical(request)
+        # 优先使用最小的文件，读取和裁剪最少 | Prefer the smallest file: least to read and crop
+        for row in con.execute("SELECT * FROM entries WHERE dataset = ? ORDER BY bytes", (dataset,)):
+            if covers(json.loads(row["request"]), wanted) and os.path.exists(row["path"]):
+                return "subset", dict(row)
+        return None
+
+    def fetch(self, dataset, request, filepath):
+        """
+        从缓存写出 filepath → (方式, 键)；未命中或无法取出时返回 None
+        Write filepath from the cache → (match, key); None on a miss or when the entry cannot serve it
+        """
+        found = self.lookup(dataset, request)
+        if found is None:
+            return None
+        match, entry = found
+        try:
+            if match == "exact":
+                _link_or_copy(entry["path"], filepath)
+            else:
+                self._extract(entry, request, filepath)
+        except (CropError, OSError, ValueError) as e:
+            print(f"⚠ 缓存条目 {entry['key'][:12]} 无法使用：{e}")
+            print(f"⚠ Cache entry {entry['key'][:12]} cannot be used: {e}")
+            return None
+        self._connect().execute("UPDATE entries SET hits = hits + 1, used_at = ? WHERE key = ?",
+                                (time.time(), entry["key"]))
+        return match, entry["key"]
+
+    def _extract(self, entry, request, filepath):
+        # 按索引取出请求的消息，区域不同时裁剪 | Take the requested messages via the index, cropping when the area differs
+        wanted = expected_messages(request)
+        messages = [m for m in load_index(entry["path"]) if (m.short_name, m.level, m.valid_time) in wanted]
+        if len(messages) < len(wanted):
+            raise ValueError(f"{len(wanted) - len(messages)} requested messages not in the cached file")
+        area = request.get("area")
+        crop = area is not None and [float(v) for v in area] != json.loads(entry["request"]).get("area")
+        tmp = filepath + ".tmp"
+        try:
+            with open(entry["path"], "rb") as src, open(tmp, "wb") as dst:
+                for m in messages:
+                    src.seek(m.offset)
+                    data = src.read(m.length)
+                    dst.write(crop_message(data, area) if crop else data)
+            os.replace(tmp, filepath)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    # ---------- 保存与清理 | Store and prune ----------
+    def store(self, dataset, request, filepath):
+        """
+        把已检查的下载文件加入缓存，返回键
+        Add a verified download to the cache; returns its key
+        """
+        key = request_key(dataset, request)
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _link_or_copy(filepath, path)
+        self._connect().execute(
+            "INSERT OR REPLACE INTO entries (key, dataset, request, path, bytes, created_at, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (key, dataset, json.dumps(canonical(request), sort_keys=True), path, os.path.getsize(path), time.time()))
+        return key
+
+    def discard(self, key):
+        con = self._connect()
+        row = con.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            for path in (row["path"], row["path"] + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+            con.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def prune(self, max_bytes):
+        """
+        按最近使用时间删除最旧的条目，直到总大小不超过 max_bytes；返回删除的条目数
+        Remove the least recently used entries until the total is within max_bytes; returns how many were removed
+        """
+        rows = self._connect().execute(
+            "SELECT key, bytes FROM entries ORDER BY COALESCE(used_at, created_at)").fetchall()
+        total = sum(r["bytes"] or 0 for r in rows)
+        removed = 0
+        for row in rows:
+            if total <= max_bytes:
+                break
+            self.discard(row["key"])
+            total -= row["bytes"] or 0
+            removed += 1
+        return removed
+
+    def stats(self):
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS n, SUM(bytes) AS nbytes, SUM(hits) AS hits FROM entries").fetchone()
+        return dict(row)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ERA5 请求缓存 | ERA5 request cache")
+    ap.add_argument("--cache", required=True, help="缓存目录 | cache folder")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="条目数、大小和命中次数 | entries, size and hits")
+    p = sub.add_parser("prune", help="删除最久未用的条目 | remove least recently used entries")
+    p.add_argument("--max-gb", type=float, required=True, help="缓存最多占用的空间 | most space the cache may use")
+    args = ap.parse_args(argv)
+
+    cache = RequestCache(args.cache)
+    try:
+        if args.cmd == "stats":
+            s = cache.stats()
+            print(f"条目 | entries: {s['n']}, 大小 | size: {(s['nbytes'] or 0) / 1e9:.1f} GB, "
+                  f"命中 | hits: {s['hits'] or 0}")
+        else:
+            removed = cache.prune(args.max_gb * 1e9)
+            print(f"已删除 | removed: {removed} entries")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+request_planner.py – 按请求大小自适应划分下载分块
+Cost-aware chunking of ERA5 download requests
+
+根据 base_request 估算每天的数据量（变量数 × 层数 × 时次 × 格点数 × 每个值的字节数），
+再选择每个分块包含的天数，使单个请求接近目标大小：
+气压层数据仍按约 10 天一块（与原来的 p1/p2/p3 一致），地面数据较小，整月合并为一个请求。
+Estimates the daily volume of base_request (fields × levels × times × grid
+points × bytes per value) and picks the number of days per chunk so each
+request is close to a target size: pressure levels still come out at about
+10 days per chunk (matching the old p1/p2/p3), while the much smaller
+single-level pull is packed into one request per month.
+
+分块仍命名为 north_6h_<product>_YYYY_MM_pN.grib。由于两个产品的分块数可能不同，
+每个分块覆盖的日期写入 chunk_plan.csv，转换脚本据此为气压层分块找到对应的地面文件。
+Chunks keep the north_6h_<product>_YYYY_MM_pN.grib names. Because the two
+products may be split differently, the days of every chunk are written to
+chunk_plan.csv, which the conversion script uses to find the surface file
+covering a pressure-level chunk.
+
+命令行 | Command line:
+    python request_planner.py --plan chunk_plan.csv surface-for north_6h_pressure_1950_01_p2.grib
+"""
+
+import argparse
+import calendar
+import csv
+import os
+import sys
+
+PLAN_NAME = "chunk_plan.csv"
+PLAN_FIELDS = ["filename", "product", "year", "month", "part", "first_day", "last_day", "est_bytes"]
+
+# ERA5 GRIB 默认 16 位简单打包，另加每条消息的头部开销
+# ERA5 GRIB uses 16-bit simple packing by default, plus per-message header overhead
+BITS_PER_VALUE = 16
+MESSAGE_OVERHEAD = 200
+DEFAULT_GRID = (0.25, 0.25)
+
+
+def grid_points(area, grid=DEFAULT_GRID):
+    """
+    area = [北, 西, 南, 东]，返回格点数
+    area = [north, west, south, east]; returns the number of grid points
+    """
+    north, west, south, east = (float(v) for v in area)
+    dlat, dlon = (float(v) for v in grid)
+    nlat = int(round((north - south) / dlat)) + 1
+    nlon = int(round((east - west) / dlon)) + 1
+    return nlat * nlon
+
+
+def fields_per_day(request):
+    nvar = len(request.get("variable", []))
+    nlev = len(request.get("pressure_level", [])) or 1
+    ntime = len(request.get("time", []))
+    return nvar * nlev * ntime
+
+
+def estimate_bytes(request, days=1):
+    """
+    估算 days 天的 GRIB 文件大小（字节）
+    Estimate the GRIB size in bytes for the given number of days
+    """
+    area = request.get("area", [90, -180, -90, 179.75])
+    grid = request.get("grid", DEFAULT_GRID)
+    per_field = grid_points(area, grid) * BITS_PER_VALUE // 8 + MESSAGE_OVERHEAD
+    return fields_per_day(request) * days * per_field
+
+
+def days_per_chunk(request, target_bytes, max_days=31):
+    per_day = estimate_bytes(request, 1)
+    if per_day <= 0:
+        return max_days
+    return max(1, min(max_days, int(target_bytes // per_day)))
+
+
+def plan_month(year, month, request, target_bytes):
+    """
+    返回 [(part, [日...]), ...]。每块 D 天，块数取 round(月天数 / D)，最后一块包含剩余天数，
+    因此 D=10 时得到与原来相同的 1–10 / 11–20 / 21–月底。
+    Return [(part, [days...]), ...]. Chunks hold D days, the number of chunks
+    is round(days_in_month / D) and the last chunk takes the remaining days,
+    so D=10 reproduces the old 1–10 / 11–20 / 21–end split.
+    """
+    days_in_month = calendar.monthrange(year, month)[1]
+    day_list = [f"{d:02d}" for d in range(1, days_in_month + 1)]
+    size = days_per_chunk(request, target_bytes, days_in_month)
+    nparts = max(1, int(days_in_month / size + 0.5))
+    parts = []
+    for i in range(nparts):
+        days = day_list[i * size:] if i == nparts - 1 else day_list[i * size:(i + 1) * size]
+        parts.append((i + 1, days))
+    return parts
+
+
+def matches_estimate(filepath, est_bytes, tolerance=0.25):
+    """
+    已有文件的大小是否与估算一致（用于识别按旧的分块方式下载的文件）
+    Whether an existing file's size matches the estimate (spots files
+    downloaded under a different chunking)
+    """
+    if not os.path.exists(filepath):
+        return False
+    return abs(os.path.getsize(filepath) - est_bytes) <= tolerance * est_bytes
+
+
+def plan_row(filename, product, year, month, part, days, request):
+    return {
+        "filename": filename, "product": product, "year": year, "month": month, "part": part,
+        "first_day": int(days[0]), "last_day": int(days[-1]),
+        "est_bytes": estimate_bytes(request, len(days)),
+    }
+
+
+def read_plan(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for key in ("year", "month", "part", "first_day", "last_day", "est_bytes"):
+            row[key] = int(row[key])
+    return rows
+
+
+def write_plan(path, rows):
+    """
+    合并写入：同名文件的旧记录被替换，其他记录保留
+    Merge-write: rows for the same filename are replaced, other rows are kept
+    """
+    merged = {row["filename"]: row for row in read_plan(path)}
+    merged.update({row["filename"]: row for row in rows})
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PLAN_FIELDS)
+        writer.writeheader()
+        for row in sorted(merged.values(), key=lambda r: (r["product"], r["year"], r["month"], r["part"])):
+            writer.writerow({k: row[k] for k in PLAN_FIELDS})
+    os.replace(tmp, path)
+
+
+def covering_file(rows, product, year, month, first_day, last_day):
+    for row in rows:
+        if (row["product"] == product and row["year"] == year and row["month"] == month
+                and row["first_day"] <= first_day and row["last_day"] >= last_day):
+            return row["filename"]
+    return None
+
+
+def surface_for(rows, pressure_filename):
+    """
+    返回覆盖该气压层分块全部日期的地面文件名；计划中没有记录时按同名规则推断
+    Return the single-level file covering every day of the pressure-level
+    chunk; falls back to the same-name rule when the plan has no entry
+    """
+    name = os.path.basename(pressure_filename)
+    for row in rows:
+        if row["filename"] == name:
+            found = covering_file(rows, "single", row["year"], row["month"],
+                                  row["first_day"], row["last_day"])
+            if found:
+                return found
+    return name.replace("_pressure_", "_single_")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="下载分块计划 | Download chunk plan")
+    ap.add_argument("--plan", required=True, help=f"{PLAN_NAME} 路径 | path to {PLAN_NAME}")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("surface-for", help="气压层分块对应的地面文件 | surface file for a pressure-level chunk")
+    p.add_argument("pressure_file")
+    sub.add_parser("show", help="打印分块计划 | print the plan")
+    args = ap.parse_args(argv)
+
+    rows = read_plan(args.plan)
+    if args.cmd == "surface-for":
+        print(surface_for(rows, args.pressure_file))
+    elif args.cmd == "show":
+        if not rows:
+            sys.exit(f"❌ 没有分块计划：{args.plan}")
+        for row in rows:
+            print(f"{row['filename']:40s} {row['first_day']:02d}-{row['last_day']:02d} "
+                  f"{row['est_bytes'] / 1e6:10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
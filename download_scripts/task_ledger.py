@@ -0,0 +1,314 @@
+"""
+task_ledger.py – 下载/转换任务台账（SQLite）
+Download/convert task ledger (SQLite)
+
+每个 .grib 分块一行，记录状态、各状态的时间戳、字节数、下载链接和请求参数，
+替代 submitted_tasks.txt / submitted_single_tasks.txt。
+One row per .grib chunk with its state, per-state timestamps, byte count,
+download URL and request parameters; replaces submitted_tasks.txt and
+submitted_single_tasks.txt.
+
+状态机 | State machine:
+    submitted → ready → downloading → verified → converted → consumed
+    任何状态都可以转为 failed，failed 可以重新 submitted/ready/downloading
+    any state may go to failed; failed may go back to submitted/ready/downloading
+
+数据库使用 WAL 模式，每次更新都在 BEGIN IMMEDIATE 事务中完成，
+因此多个线程/进程可以同时读写。
+The database runs in WAL mode and every update is one BEGIN IMMEDIATE
+transaction, so several threads or processes can write at once.
+
+命令行（供 shell 脚本使用）| Command line (for the shell scripts):
+    python task_ledger.py --db LEDGER set-state north_6h_pressure_1950_01_p1.grib verified
+    python task_ledger.py --db LEDGER set-chunk-state 1950_01_p1 converted
+    python task_ledger.py --db LEDGER import-legacy submitted_tasks.txt
+    python task_ledger.py --db LEDGER list --state failed
+    python task_ledger.py --db LEDGER summary
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+LEDGER_NAME = "download_ledger.sqlite"
+
+STATES = ("submitted", "ready", "downloading", "verified", "converted", "consumed", "failed")
+
+# 允许的状态转换 | Allowed state transitions
+TRANSITIONS = {
+    None: {"submitted", "ready", "downloading", "verified", "converted", "failed"},
+    "submitted": {"submitted", "ready", "failed"},
+    "ready": {"submitted", "ready", "downloading", "failed"},
+    "downloading": {"submitted", "ready", "downloading", "verified", "converted", "failed"},
+    "verified": {"downloading", "verified", "converted", "failed"},
+    "converted": {"converted", "consumed", "failed"},
+    "consumed": {"consumed"},
+    "failed": {"submitted", "ready", "downloading", "verified", "failed"},
+}
+
+# north_6h_pressure_1950_01_p1.grib → product=pressure, chunk=1950_01_p1
+CHUNK_RE = re.compile(r"^(?P<prefix>.+?)_(?P<product>pressure|single)_(?P<chunk>\d{4}_\d{2}_p\d+)\.grib$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    filename       TEXT PRIMARY KEY,
+    chunk          TEXT,
+    product        TEXT,
+    dataset        TEXT,
+    state          TEXT NOT NULL,
+    url            TEXT,
+    url_at         REAL,
+    request        TEXT,
+    bytes          INTEGER,
+    messages       INTEGER,
+    error          TEXT,
+    submitted_at   REAL,
+    ready_at       REAL,
+    downloading_at REAL,
+    verified_at    REAL,
+    converted_at   REAL,
+    consumed_at    REAL,
+    failed_at      REAL,
+    updated_at     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_state ON chunks(state);
+CREATE INDEX IF NOT EXISTS idx_chunks_chunk ON chunks(chunk);
+"""
+
+# 旧数据库中缺少的列 | Columns missing from older databases
+MIGRATIONS = {
+    "url_at": "ALTER TABLE chunks ADD COLUMN url_at REAL",
+    "messages": "ALTER TABLE chunks ADD COLUMN messages INTEGER",
+}
+
+FIELDS = {"url", "request", "bytes", "messages", "error", "dataset"}
+
+
+class LedgerError(RuntimeError):
+    pass
+
+
+def parse_filename(filename):
+    """
+    返回 (product, chunk)，无法解析时返回 (None, None)
+    Return (product, chunk), or (None, None) if the name does not match
+    """
+    m = CHUNK_RE.match(os.path.basename(filename))
+    if not m:
+        return None, None
+    return m.group("product"), m.group("chunk")
+
+
+class TaskLedger:
+    def __init__(self, path, timeout=60.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        con = self._connect()
+        con.executescript(SCHEMA)
+        columns = {row["name"] for row in con.execute("PRAGMA table_info(chunks)")}
+        for column, sql in MIGRATIONS.items():
+            if column not in columns:
+                con.execute(sql)
+
+    # 每个线程一个连接（sqlite3 连接不能跨线程共享）
+    # One connection per thread (sqlite3 connections cannot be shared across threads)
+    def _connect(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    class _Tx:
+        def __init__(self, con):
+            self.con = con
+
+        def __enter__(self):
+            self.con.execute("BEGIN IMMEDIATE")
+            return self.con
+
+        def __exit__(self, exc_type, exc, tb):
+            self.con.execute("ROLLBACK" if exc_type else "COMMIT")
+            return False
+
+    def _transaction(self):
+        return self._Tx(self._connect())
+
+    def close(self):
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    # ---------- 查询 | Queries ----------
+    def get(self, filename):
+        row = self._connect().execute(
+            "SELECT * FROM chunks WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def state(self, filename):
+        row = self.get(filename)
+        return row["state"] if row else None
+
+    def in_state(self, *states):
+        marks = ",".join("?" * len(states))
+        rows = self._connect().execute(
+            f"SELECT * FROM chunks WHERE state IN ({marks}) ORDER BY filename", states).fetchall()
+        return [dict(r) for r in rows]
+
+    def chunk_rows(self, chunk):
+        rows = self._connect().execute(
+            "SELECT * FROM chunks WHERE chunk = ? ORDER BY product", (chunk,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def summary(self):
+        rows = self._connect().execute(
+            "SELECT product, state, COUNT(*) AS n, SUM(bytes) AS nbytes "
+            "FROM chunks GROUP BY product, state ORDER BY product, state").fetchall()
+        return [dict(r) for r in rows]
+
+    # ---------- 更新 | Updates ----------
+    def set_state(self, filename, state, **fields):
+        """
+        在一个事务中检查转换是否合法并更新状态及附加字段（url, request, bytes, messages, error, dataset）
+        Check the transition and update state plus extra fields (url, request,
+        bytes, messages, error, dataset) in one transaction
+        """
+        if state not in STATES:
+            raise LedgerError(f"unknown state {state!r}")
+        unknown = set(fields) - FIELDS
+        if unknown:
+            raise LedgerError(f"unknown fields {sorted(unknown)}")
+        if isinstance(fields.get("request"), dict):
+            fields["request"] = json.dumps(fields["request"], sort_keys=True)
+        with self._transaction() as con:
+            return self._update(con, filename, state, fields, time.time())
+
+    def set_chunk_state(self, chunk, state):
+        """
+        在一个事务中把同一分块的所有文件（pressure + single）一起改为 state
+        Move every file of a chunk (pressure + single) to state in one transaction
+        """
+        if state not in STATES:
+            raise LedgerError(f"unknown state {state!r}")
+        now = time.time()
+        with self._transaction() as con:
+            rows = con.execute("SELECT filename FROM chunks WHERE chunk = ?", (chunk,)).fetchall()
+            if not rows:
+                raise LedgerError(f"no ledger rows for chunk {chunk}")
+            for row in rows:
+                self._update(con, row["filename"], state, {}, now)
+        return len(rows)
+
+    @staticmethod
+    def _update(con, filename, state, fields, now):
+        row = con.execute("SELECT state, url FROM chunks WHERE filename = ?", (filename,)).fetchone()
+        current = row["state"] if row else None
+        if state not in TRANSITIONS[current]:
+            raise LedgerError(f"{filename}: illegal transition {current} -> {state}")
+        if state != "failed":
+            fields.setdefault("error", None)
+        if row is None:
+            product, chunk = parse_filename(filename)
+            con.execute(
+                "INSERT INTO chunks (filename, chunk, product, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (filename, chunk, product, state, now))
+        # 记录下载链接的签发时间，用于判断链接是否过期
+        # Record when the download URL was issued, to judge whether it has expired
+        if fields.get("url") and fields["url"] != (row["url"] if row else None):
+            fields["url_at"] = now
+        cols = {"state": state, f"{state}_at": now, "updated_at": now, **fields}
+        assignments = ", ".join(f"{c} = ?" for c in cols)
+        con.execute(f"UPDATE chunks SET {assignments} WHERE filename = ?", (*cols.values(), filename))
+        return current
+
+    def import_legacy(self, txt_path, folder=None):
+        """
+        导入旧的 "文件名 | 链接" 记录；已在台账中的文件不变
+        Import an old "filename | url" record; files already in the ledger are left untouched
+        """
+        if not os.path.exists(txt_path):
+            return 0
+        folder = folder or os.path.dirname(txt_path)
+        count = 0
+        with open(txt_path, "r") as f:
+            for line in f:
+                parts = [p.strip() for p in line.strip().split(" | ")]
+                if not parts[0] or self.get(parts[0]) is not None:
+                    continue
+                url = parts[1] if len(parts) > 1 else None
+                filepath = os.path.join(folder, parts[0])
+                # 旧脚本在文件下载完成后才写入记录
+                # The old scripts wrote a line only after the download had finished
+                if os.path.exists(filepath):
+                    self.set_state(parts[0], "downloading", url=url, bytes=os.path.getsize(filepath))
+                else:
+                    self.set_state(parts[0], "ready" if url else "submitted", url=url)
+                count += 1
+        return count
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="下载/转换任务台账 | Download/convert task ledger")
+    ap.add_argument("--db", required=True, help="台账数据库路径 | ledger database path")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("set-state", help="设置文件状态 | set the state of one file")
+    p.add_argument("filename")
+    p.add_argument("state", choices=STATES)
+    p.add_argument("--bytes", type=int)
+    p.add_argument("--messages", type=int)
+    p.add_argument("--error")
+
+    p = sub.add_parser("set-chunk-state", help="设置分块所有文件的状态 | set the state of every file in a chunk")
+    p.add_argument("chunk")
+    p.add_argument("state", choices=STATES)
+
+    p = sub.add_parser("get", help="打印文件状态 | print the state of one file")
+    p.add_argument("filename")
+
+    p = sub.add_parser("list", help="列出文件 | list files")
+    p.add_argument("--state", choices=STATES, action="append")
+
+    p = sub.add_parser("import-legacy", help="导入 submitted_tasks.txt | import submitted_tasks.txt")
+    p.add_argument("txt")
+
+    sub.add_parser("summary", help="按状态统计 | counts per state")
+
+    args = ap.parse_args(argv)
+    ledger = TaskLedger(args.db)
+    try:
+        if args.cmd == "set-state":
+            fields = {k: v for k, v in (("bytes", args.bytes), ("messages", args.messages),
+                                        ("error", args.error)) if v is not None}
+            ledger.set_state(os.path.basename(args.filename), args.state, **fields)
+        elif args.cmd == "set-chunk-state":
+            ledger.set_chunk_state(args.chunk, args.state)
+        elif args.cmd == "get":
+            print(ledger.state(os.path.basename(args.filename)) or "unknown")
+        elif args.cmd == "list":
+            rows = ledger.in_state(*args.state) if args.state else ledger.in_state(*STATES)
+            for row in rows:
+                print(f"{row['filename']}\t{row['state']}\t{row['url'] or ''}")
+        elif args.cmd == "import-legacy":
+            print(ledger.import_legacy(args.txt))
+        elif args.cmd == "summary":
+            for row in ledger.summary():
+                print(f"{row['product'] or '-':10s} {row['state']:12s} {row['n']:6d} {row['nbytes'] or 0:>16d}")
+    except LedgerError as e:
+        sys.exit(f"❌ {e}")
+    finally:
+        ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+telemetry.py – 下载流水线的结构化计时事件与统计
+Structured timing events for the download pipeline, and their summary
+
+下载引擎为每个分块写出 JSON Lines 事件（每行一个）：
+The download engine writes JSON Lines events (one per line) for every chunk:
+    submitted → url_ready → first_byte → last_byte → verified → converted
+    以及 failed / retry | plus failed / retry
+
+summary 命令把事件日志整理为各阶段耗时的百分位数、按小时的吞吐量和按年月的重试次数，
+用于根据实际数据调整并发数：
+The summary command turns the log into per-phase latency percentiles,
+throughput per hour and retry counts per year/month, for tuning concurrency
+from real data:
+    queue     submitted  → url_ready    CDS 排队和处理 | CDS queueing and processing
+    wait      url_ready  → first_byte   开始下载前的等待 | wait before the transfer starts
+    transfer  first_byte → last_byte    传输 | transfer
+    verify    last_byte  → verified     下载后的检查 | post-download checks
+    convert   verified   → converted    等待配对和转换 | waiting for the pair and conversion
+
+命令行 | Command line:
+    python telemetry.py summary F:\\ERA5_pressure_level\\download_events.jsonl
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+EVENTS_NAME = "download_events.jsonl"
+
+# 阶段名 → (起始事件, 结束事件) | Phase → (start event, end event)
+PHASES = {
+    "queue": ("submitted", "url_ready"),
+    "wait": ("url_ready", "first_byte"),
+    "transfer": ("first_byte", "last_byte"),
+    "verify": ("last_byte", "verified"),
+    "convert": ("verified", "converted"),
+}
+
+
+class Telemetry:
+    """
+    线程安全地追加事件；path 为 None 时不记录
+    Appends events thread-safely; records nothing when path is None
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, event, filename, **fields):
+        if self.path is None:
+            return
+        line = json.dumps({"t": round(time.time(), 3), "event": event, "file": filename, **fields})
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    # 绑定到一个文件的回调，交给 http_downloader.download(on_event=...)
+    # Callback bound to one file, for http_downloader.download(on_event=...)
+    def for_file(self, filename):
+        return lambda event, **fields: self.emit(event, filename, **fields)
+
+
+def read_events(path):
+    events = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue   # 写入中断留下的半行 | half line left by an interrupted write
+    events.sort(key=lambda e: e["t"])
+    return events
+
+
+def percentile(values, q):
+    """
+    最近秩百分位数 | Nearest-rank percentile
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = max(1, min(len(values), math.ceil(q * len(values) / 100)))
+    return values[rank - 1]
+
+
+def phase_durations(events):
+    """
+    返回 {阶段: [秒, ...]}；每个结束事件与同一文件最近一次的起始事件配对
+    Return {phase: [seconds, ...]}; each end event is paired with the latest start event of the same file
+    """
+    last = defaultdict(dict)
+    durations = defaultdict(list)
+    for e in events:
+        name, seen = e["event"], last[e["file"]]
+        for phase, (start, end) in PHASES.items():
+            # 续传的链接没有对应的排队时间 | Resumed links have no queueing time of their own
+            if name == end and start in seen and not (phase == "queue" and e.get("resumed")):
+                durations[phase].append(e["t"] - seen[start])
+        seen[name] = e["t"]
+    return durations
+
+
+def throughput_by_hour(events):
+    """
+    按小时统计传输的字节数 → {小时: MB/s}；每次传输的字节按 first_byte → last_byte 的时间均匀分摊到各小时
+    Bytes transferred per hour → {hour: MB/s}; each transfer's bytes are spread
+    evenly over its first_byte → last_byte interval before bucketing by hour
+    """
+    first = {}
+    hours = Counter()
+    for e in events:
+        if e["event"] == "first_byte":
+            first[e["file"]] = e["t"]
+        elif e["event"] == "last_byte" and e.get("bytes"):
+            end = e["t"]
+            # 优先使用下载器测得的传输时间 | Prefer the transfer time measured by the downloader
+            start = end - e["seconds"] if e.get("seconds") else first.get(e["file"], end)
+            start = min(start, end)
+            t = start
+            while True:
+                hour = datetime.datetime.fromtimestamp(t).replace(minute=0, second=0, microsecond=0)
+                stop = min(end, (hour + datetime.timedelta(hours=1)).timestamp())
+                share = (stop - t) / (end - start) if end > start else 1.0
+                hours[hour.strftime("%Y-%m-%d %H:00")] += e["bytes"] * share
+                t = stop
+                if t >= end:
+                    break
+            first.pop(e["file"], None)
+    return {hour: nbytes / 3600 / 1e6 for hour, nbytes in sorted(hours.items())}
+
+
+def _year_month(filename):
+    parts = os.path.basename(filename).split("_")
+    return f"{parts[-3]}-{parts[-2]}" if len(parts) >= 3 else "?"
+
+
+def retries_by_month(events):
+    """
+    按数据的年月统计 failed / retry 事件 → {年-月: (失败次数, 重试次数)}
+    failed / retry events per data year-month → {year-month: (failures, retries)}
+    """
+    failed, retried = Counter(), Counter()
+    for e in events:
+        if e["event"] == "failed":
+            failed[_year_month(e["file"])] += 1
+        elif e["event"] == "retry":
+            retried[_year_month(e["file"])] += 1
+    return {ym: (failed[ym], retried[ym]) for ym in sorted(set(failed) | set(retried))}
+
+
+def print_summary(events):
+    print(f"事件数 | events: {len(events)}")
+    print(f"\n{'phase':10s} {'n':>6s} {'p50_s':>10s} {'p90_s':>10s} {'p99_s':>10s} {'max_s':>10s}")
+    durations = phase_durations(events)
+    for phase in PHASES:
+        values = durations.get(phase, [])
+        if values:
+            print(f"{phase:10s} {len(values):6d} " + " ".join(
+                f"{percentile(values, q):10.1f}" for q in (50, 90, 99, 100)))
+
+    rates = [e["bytes"] / (e["seconds"] or 1e-9) / 1e6 for e in events
+             if e["event"] == "last_byte" and e.get("bytes") and e.get("seconds")]
+    if rates:
+        print(f"\n单文件传输速率 | per-file transfer rate (MB/s): "
+              f"p10 {percentile(rates, 10):.2f}  p50 {percentile(rates, 50):.2f}  p90 {percentile(rates, 90):.2f}")
+
+    hourly = throughput_by_hour(events)
+    if hourly:
+        print(f"\n{'hour':16s} {'MB/s':>10s}")
+        for hour, rate in hourly.items():
+            print(f"{hour:16s} {rate:10.2f}")
+
+    retries = retries_by_month(events)
+    if retries:
+        print(f"\n{'month':8s} {'failed':>8s} {'retry':>8s}")
+        for ym, (nfailed, nretry) in retries.items():
+            print(f"{ym:8s} {nfailed:8d} {nretry:8d}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="下载流水线计时统计 | Download pipeline timing summary")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("summary", help="统计事件日志 | summarise an event log")
+    p.add_argument("events", help=f"{EVENTS_NAME} 路径 | path to {EVENTS_NAME}")
+    args = ap.parse_args(argv)
+
+    if not os.path.exists(args.events):
+        sys.exit(f"❌ 没有事件日志：{args.events}")
+    print_summary(read_events(args.events))
+
+
+if __name__ == "__main__":
+    main()
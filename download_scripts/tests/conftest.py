@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 脚本之间按顶层模块互相导入（与在 download_scripts 中运行时相同）
+# The scripts import each other as top-level modules (as when run from download_scripts)
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+sys.path.insert(0, SCRIPTS)
@@ -0,0 +1,118 @@
+"""
+arl_index.py 为 CONTROL 挑选 ARL 文件 | Choosing ARL files for a CONTROL with arl_index.py
+
+用 arl_packer.ArlWriter 写出的小网格分块（1971 年 4 月 p3 和 5 月 p1–p3，每 6 小时一个时次），
+以及 arl_merge.py 合并的 5 月文件。
+Small-grid chunks written with arl_packer.ArlWriter (April 1971 p3 and May
+p1–p3, one period every 6 hours), plus the May file merged by arl_merge.py.
+"""
+
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from arl_index import ArlIndex, PlanError, control_lines, plan
+from arl_merge import find_groups, merge_files
+from arl_packer import ArlWriter, grid_params
+
+# 每条记录至少 108 字节，INDX 的头部才能放在第一条记录中
+# Records of at least 108 bytes, so the INDX header fits in the first one
+NX, NY = 12, 10
+LEVELS = [(0.0, ["PRSS"]), (1000.0, ["TEMP"])]
+CHUNKS = {"1971_04_p3": (4, 21, 30), "1971_05_p1": (5, 1, 10), "1971_05_p2": (5, 11, 20), "1971_05_p3": (5, 21, 31)}
+
+
+def write_arl(path, first, last, south=25.0):
+    times = []
+    t = first
+    while t <= last:
+        times.append(t)
+        t += datetime.timedelta(hours=6)
+    rng = np.random.default_rng(len(times))
+    fields = {(0, "PRSS"): 1000 + rng.standard_normal((len(times), NY, NX)),
+              (1, "TEMP"): 290 + rng.standard_normal((len(times), NY, NX))}
+    with ArlWriter(path, grid_params(south, 100, 0.5, 0.5, NX, NY), NX, NY, LEVELS) as writer:
+        writer.write(times, fields)
+
+
+def time(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d %H")
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for chunk, (month, first, last) in CHUNKS.items():
+        write_arl(str(tmp_path / f"north_6h_{chunk}.arl"), datetime.datetime(1971, month, first),
+                  datetime.datetime(1971, month, last, 18))
+    return tmp_path
+
+
+def test_index_reads_each_file_once(folder):
+    index = ArlIndex(str(folder))
+    assert index.update() == (4, 0)
+    entry = index.entries["north_6h_1971_05_p3.arl"]
+    assert (entry["first"], entry["last"], entry["periods"], entry["interval"]) == (
+        "1971-05-21T00:00", "1971-05-31T18:00", 44, 360)
+    # 重新打开时从 arl_index.json 读取，未变化的文件不再读取 | Reopened from arl_index.json; unchanged files are not read again
+    assert ArlIndex(str(folder)).update() == (0, 0)
+    os.remove(folder / "north_6h_1971_04_p3.arl")
+    index = ArlIndex(str(folder))
+    assert index.update() == (0, 1)
+    assert sorted(index.entries) == [f"north_6h_{c}.arl" for c in sorted(CHUNKS) if c.startswith("1971_05")]
+
+
+@pytest.mark.parametrize("start, hours, files", [
+    # batch_hysplit_rest.ps1 的“上个月 p3 + 本月 p1” | batch_hysplit_rest.ps1's "previous month p3 plus this month p1"
+    ("1971-05-01 00", -240, ["1971_04_p3", "1971_05_p1"]),
+    ("1971-05-10 18", -24, ["1971_05_p1"]),
+    ("1971-05-11 00", -6, ["1971_05_p1", "1971_05_p2"]),
+    ("1971-05-15 00", -240, ["1971_05_p1", "1971_05_p2"]),
+    ("1971-04-25 00", 720, ["1971_04_p3", "1971_05_p1", "1971_05_p2", "1971_05_p3"]),
+])
+def test_plan_chunks(folder, start, hours, files):
+    index = ArlIndex(str(folder))
+    index.update()
+    assert index.plan(time(start), hours) == [f"north_6h_{name}.arl" for name in files]
+
+
+def test_plan_prefers_merged_files(folder):
+    (name, span, chunks), = find_groups(str(folder), [1971], 1)[1:]
+    merge_files(chunks, str(folder / name), span)
+    index = ArlIndex(str(folder))
+    assert index.update() == (5, 0)
+    # 合并的文件有 .json 索引，不必读取 .arl | The merged file has a .json sidecar, so its .arl is not read
+    assert index.entries[name]["periods"] == 124
+    assert index.plan(time("1971-05-05 00"), 480) == [name]
+    assert index.plan(time("1971-05-01 00"), -240) == ["north_6h_1971_04_p3.arl", name]
+
+
+def test_plan_errors(folder):
+    index = ArlIndex(str(folder))
+    index.update()
+    with pytest.raises(PlanError, match="no ARL file covers 1971-04-20 00:00"):
+        index.plan(time("1971-04-30 00"), -240)
+    # 网格不同的文件不会接在后面 | A file on another grid is not chained on
+    write_arl(str(folder / "north_6h_1971_06_p1.arl"), time("1971-06-01 00"), time("1971-06-10 18"), south=20.0)
+    index.update()
+    assert index.plan(time("1971-06-05 00"), -24) == ["north_6h_1971_06_p1.arl"]
+    with pytest.raises(PlanError, match="no ARL file covers 1971-06-01 00:00"):
+        index.plan(time("1971-06-05 00"), -240)
+
+
+def test_plan_allows_one_interval_between_files():
+    def entry(first, last):
+        return {"first": first, "last": last, "periods": 2, "interval": 360,
+                "nx": NX, "ny": NY, "grid": {}, "levels": []}
+    entries = {"a.arl": entry("1971-05-01T00:00", "1971-05-01T18:00"),
+               "b.arl": entry("1971-05-02T00:00", "1971-05-02T18:00"),
+               "c.arl": entry("1971-05-03T06:00", "1971-05-03T18:00")}
+    assert plan(entries, time("1971-05-01 00"), 42) == ["a.arl", "b.arl"]
+    with pytest.raises(PlanError, match="1971-05-03 00:00"):
+        plan(entries, time("1971-05-01 00"), 60)
+
+
+def test_control_lines():
+    assert control_lines("G:\\ARL", ["a.arl", "b.arl"]) == ["2", "G:\\ARL\\", "a.arl", "G:\\ARL\\", "b.arl"]
+    assert control_lines("/mnt/f/ARL/", ["a.arl"]) == ["1", "/mnt/f/ARL/", "a.arl"]
@@ -0,0 +1,172 @@
+"""
+NumPy 后端（arl_packer.py）和流式后端（arl_stream.py）与 era52arl 的输出逐记录比较，
+以及 arl_packer 写出、arl_reader 读回的往返检查
+The NumPy (arl_packer.py) and streaming (arl_stream.py) backends compared
+record by record with era52arl's output, plus round trips written by
+arl_packer and read back by arl_reader
+
+data/era52arl_sample 中的样本 | The sample in data/era52arl_sample:
+    pressure.grib, single.grib, era52arl.cfg
+        bench_convert.write_inputs(folder, "../convert_era52arl/era52arl.cfg", [30, 100, 25, 106], 0.25,
+                                   [1000, 850, 500], 2000-01-01 00/06/12 UTC, seed=0)
+        25×21 网格、3 层、3 个时次 | 25×21 grid, 3 levels, 3 periods
+    era52arl.arl
+        convert_chunks.convert_pair(..., backend="era52arl")，即 convert_era52arl/era52arl
+        -dera52arl.cfg -ipressure.grib -asingle.grib -fsingle.grib，ecCodes 2.49 | ecCodes 2.49
+        （era52arl 读取第 10 条地面消息的网格，因此至少需要 3 个时次 | era52arl reads the grid of
+        the 10th surface message, so at least 3 periods are needed）
+"""
+
+import datetime
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from arl_packer import ArlWriter, grid_params, pack
+from arl_reader import LABEL_LEN, ArlFile, checksum, describe, parse_label, unpack
+from bench_convert import field_range
+from conftest import DATA, SCRIPTS
+
+SAMPLE = os.path.join(DATA, "era52arl_sample")
+PRESSURE = os.path.join(SAMPLE, "pressure.grib")
+SINGLE = os.path.join(SAMPLE, "single.grib")
+CFG = os.path.join(SAMPLE, "era52arl.cfg")
+EXPECTED = os.path.join(SAMPLE, "era52arl.arl")
+
+
+def assert_same_records(path, expected=EXPECTED):
+    with ArlFile(expected) as arl:
+        size = arl.record_length
+    with open(path, "rb") as f:
+        got = f.read()
+    with open(expected, "rb") as f:
+        want = f.read()
+    assert len(got) == len(want), f"{len(got) // size} records, era52arl wrote {len(want) // size}"
+    for start in range(0, len(want), size):
+        label = parse_label(want[start:start + LABEL_LEN])
+        where = f"record {start // size} ({label.variable} level {label.level} {label.time:%Y-%m-%d %H:%M})"
+        assert got[start:start + LABEL_LEN] == want[start:start + LABEL_LEN], f"label differs at {where}"
+        assert got[start + LABEL_LEN:start + size] == want[start + LABEL_LEN:start + size], f"data differs at {where}"
+
+
+def test_sample_is_complete():
+    with ArlFile(EXPECTED) as arl:
+        assert len(arl.times) == 3
+        assert (arl.nx, arl.ny) == (25, 21)
+        # DIFW 残差场在每个气压层上 | The DIFW residual field on every pressure level
+        assert [len(level.variables) for level in arl.levels] == [4, 8, 8, 8]
+        assert all(level.variables[-1] == "DIFW" for level in arl.levels[1:])
+
+
+@pytest.mark.parametrize("batch", [1, 2, 4])
+def test_numpy_backend_matches_era52arl(tmp_path, batch):
+    from arl_packer import convert
+    out = str(tmp_path / "numpy.arl")
+    assert convert(PRESSURE, SINGLE, out, CFG, batch=batch) == 3
+    assert_same_records(out)
+
+
+def test_stream_backend_matches_era52arl(tmp_path):
+    from arl_stream import StreamConverter, read_messages
+    out = str(tmp_path / "stream.arl")
+    with open(SINGLE, "rb") as f:
+        single = f.read()
+    with StreamConverter(out, CFG) as converter, open(PRESSURE, "rb") as p:
+        converter.add_file("single", single)
+        for msg in read_messages(p):
+            converter.add("pressure", msg)
+    assert_same_records(out)
+
+
+def test_era52arl_still_writes_the_sample(tmp_path):
+    # 只在能运行 era52arl（编译好并能找到 ecCodes 的 Fortran 接口）时检查样本本身
+    # Checks the sample itself, only where era52arl runs (built, with the ecCodes Fortran bindings found)
+    from convert_chunks import convert_pair
+    era52arl_dir = os.path.join(SCRIPTS, os.pardir, "convert_era52arl")
+    if not os.access(os.path.join(era52arl_dir, "era52arl"), os.X_OK):
+        pytest.skip("era52arl is not executable here")
+    for name in ("pressure.grib", "single.grib"):
+        shutil.copy(os.path.join(SAMPLE, name), tmp_path)
+    shutil.copy(CFG, tmp_path / "era52arl.cfg")
+    try:
+        convert_pair(era52arl_dir, str(tmp_path), "pressure.grib", "single.grib", "out.arl")
+    except RuntimeError as e:
+        if "exit 127" in str(e):
+            pytest.skip(f"era52arl cannot start: {e}")
+        raise
+    assert_same_records(str(tmp_path / "out.arl"))
+
+
+# ---------- 往返 | Round trips ----------
+# ARL 变量 → 用来取典型数值范围的 GRIB 短名和换算系数 | ARL variable → GRIB short name and factor for a typical value range
+RANGES = {"T02M": ("2t", 1), "U10M": ("10u", 1), "V10M": ("10v", 1), "PRSS": ("sp", 0.01),
+          "HGTS": ("z", 1 / 9.80665), "TEMP": ("t", 1), "UWND": ("u", 1), "VWND": ("v", 1),
+          "WWND": ("w", 0.01), "RELH": ("r", 1), "SPFH": ("q", 1)}
+
+
+def synthetic(variable, level, shape, rng):
+    # 平滑的场加少量噪声 | A smooth field plus a little noise
+    name, factor = RANGES[variable]
+    mean, spread = field_range(name, level)
+    *lead, ny, nx = shape
+    y, x = np.meshgrid(np.linspace(0, 3, ny), np.linspace(0, 2, nx), indexing="ij")
+    smooth = np.sin(x + y + rng.uniform(0, 6, size=tuple(lead) + (1, 1)))
+    return ((mean + spread * (smooth + 0.1 * rng.standard_normal(shape))) * factor).astype(np.float32)
+
+
+@pytest.mark.parametrize("ny, nx", [(1, 1), (1, 9), (7, 1), (21, 25)])
+def test_pack_unpack_round_trip(ny, nx):
+    rng = np.random.default_rng(0)
+    fields = np.stack([synthetic(v, 500, (ny, nx), rng) for v in ("HGTS", "TEMP", "WWND", "SPFH", "PRSS")])
+    packed, exponent, precision, value, sums = pack(fields)
+    for k, field in enumerate(fields):
+        raw = packed[k].tobytes()
+        assert np.abs(unpack(raw, nx, ny, exponent[k], value[k]) - field).max() <= precision[k]
+        assert sums[k] == checksum(raw)
+        assert value[k] == field[0, 0]
+
+
+def test_writer_reader_round_trip(tmp_path):
+    rng = np.random.default_rng(1)
+    nx, ny = 25, 21
+    with ArlFile(EXPECTED) as sample:
+        levels = [(level.height, level.variables) for level in sample.levels]
+        # grid_params 与 era52arl 写出的网格一致 | grid_params agrees with the grid era52arl wrote
+        grid = grid_params(25, 100, 0.25, 0.25, nx, ny)
+        assert grid == sample.grid
+    times = [datetime.datetime(2000, 1, 31, 12) + datetime.timedelta(hours=6 * t) for t in range(4)]
+    # DIFW 不提供，由 WWND 按 era52arl 的方式计算 | DIFW is not given; it is derived from WWND as era52arl does
+    fields = {(n, v): synthetic(v, height, (len(times), ny, nx), rng)
+              for n, (height, variables) in enumerate(levels) for v in variables if v != "DIFW"}
+    path = str(tmp_path / "round_trip.arl")
+    with ArlWriter(path, grid, nx, ny, levels) as writer:
+        writer.write(times[:1], {k: v[:1] for k, v in fields.items()})
+        writer.write(times[1:], {k: v[1:] for k, v in fields.items()})
+    assert writer.periods == len(times)
+
+    with ArlFile(path) as arl:
+        assert arl.times == times
+        assert (arl.nx, arl.ny, arl.grid) == (nx, ny, grid)
+        assert [(level.height, level.variables) for level in arl.levels] == levels
+        assert describe(arl)["interval"] == 360
+        # 与 era52arl 相同，相对重建值的相邻差值略超过 2^NEXP 时字节饱和，多出最多一个量化步长（约 2 个精度单位）
+        # As in era52arl, a neighbour difference from the reconstructed value just past 2^NEXP
+        # saturates its byte, adding up to one quantisation step (about 2 precision units)
+        packed = {key: pack(values)[0] for key, values in fields.items()}
+        for t in range(len(times)):
+            sums = arl.checksums(t)
+            for (n, v), expected in fields.items():
+                label, raw = arl.raw(t, n, v)
+                assert label.time == times[t]
+                assert raw == packed[(n, v)][t].tobytes()
+                assert np.abs(arl.field(t, n, v) - expected[t]).max() <= 3 * label.precision
+                assert sums[(n, v)] == checksum(raw)
+            for n in range(1, len(levels)):
+                # DIFW = WWND − 读回的 WWND（小于精度的值记为 0）| DIFW = WWND − the WWND read back (values below the precision as 0)
+                label = arl.raw(t, n, "WWND")[0]
+                wwnd = arl.field(t, n, "WWND")
+                wwnd[:, 1:][np.abs(wwnd[:, 1:]) < label.precision] = 0
+                difw = arl.raw(t, n, "DIFW")[0]
+                assert np.abs(arl.field(t, n, "DIFW") - (fields[(n, "WWND")][t] - wwnd)).max() <= 3 * difw.precision
@@ -0,0 +1,82 @@
+"""
+grib_inventory.check_inventory 对 mock_cds.py 生成的 GRIB 的检查
+grib_inventory.check_inventory on GRIB generated by mock_cds.py
+"""
+
+import datetime
+
+import pytest
+
+from grib_index import index_file
+from grib_inventory import check_inventory, expected_messages
+from mock_cds import grib1_message, request_messages
+
+REQUEST = {
+    "variable": ["geopotential", "temperature", "u_component_of_wind"],
+    "pressure_level": ["500", "850", "1000"],
+    "year": ["1950"], "month": ["01"], "day": ["01", "02"],
+    "time": ["00:00", "12:00"],
+}
+SURFACE = {
+    "variable": ["2m_temperature", "surface_pressure"],
+    "year": ["1950"], "month": ["01"], "day": ["01", "02", "03"],
+    "time": ["00:00", "06:00", "12:00", "18:00"],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    # 写出消息并用 grib_index 建立索引 | Write the messages and index them with grib_index
+    def build(messages):
+        path = tmp_path / "chunk.grib"
+        path.write_bytes(b"".join(messages))
+        return index_file(str(path), write=False)
+    return build
+
+
+def test_expected_messages():
+    expected = expected_messages(REQUEST)
+    assert len(expected) == 3 * 3 * 2 * 2
+    assert ("z", 500, datetime.datetime(1950, 1, 2, 12)) in expected
+    # 地面变量的层次为 0，单个值不必写成列表 | Surface fields have level 0, and single values need no list
+    surface = expected_messages(dict(SURFACE, year="1950", month="01", variable="surface_pressure"))
+    assert surface == {("sp", 0, datetime.datetime(1950, 1, day, hour)) for day in (1, 2, 3) for hour in (0, 6, 12, 18)}
+
+
+@pytest.mark.parametrize("request_", [REQUEST, SURFACE])
+def test_complete_file(index, request_):
+    assert check_inventory(request_, index(request_messages(request_, 64))) == (True, "")
+
+
+def test_missing_message(index):
+    messages = list(request_messages(REQUEST, 64))
+    del messages[5]
+    complete, text = check_inventory(REQUEST, index(messages))
+    # CDS 顺序：日期 → 时次 → 变量 → 层次，第 6 条是 t/1000 | CDS order: day → time → variable → level, the 6th is t/1000
+    assert not complete
+    assert text == "1 missing: t/1000/1950-01-01 00:00"
+
+
+def test_duplicate_message(index):
+    messages = list(request_messages(REQUEST, 64))
+    complete, text = check_inventory(REQUEST, index(messages + messages[:1]), allow_extra=True)
+    assert not complete
+    assert text == "1 duplicate: z/500/1950-01-01 00:00"
+
+
+def test_unexpected_messages(index):
+    extra = grib1_message(135, 500, datetime.datetime(1950, 1, 1), 64)
+    messages = list(request_messages(REQUEST, 64)) + [extra]
+    complete, text = check_inventory(REQUEST, index(messages))
+    assert not complete
+    assert text == "1 unexpected: w/500/1950-01-01 00:00"
+    # allow_extra：多出的消息仍列出，但文件算完整 | allow_extra: the extra message is still listed but the file counts as complete
+    assert check_inventory(REQUEST, index(messages), allow_extra=True) == (True, text)
+
+
+def test_other_days_are_missing_and_unexpected(index):
+    other = dict(REQUEST, day=["02", "03"])
+    complete, text = check_inventory(REQUEST, index(request_messages(other, 64)), allow_extra=True)
+    assert not complete
+    assert text.startswith("18 missing: t/500/1950-01-01 00:00, ")
+    assert "(+13 more); 18 unexpected: " in text
@@ -0,0 +1,119 @@
+"""
+http_downloader.py 对本地 HTTP 服务器的分段下载和断点续传
+Segmented downloads and resuming in http_downloader.py, against a local HTTP server
+
+数据是 data/era52arl_sample/pressure.grib，下载时同时检查 GRIB 消息结构。
+The payload is data/era52arl_sample/pressure.grib, with GRIB framing checked during the download.
+"""
+
+import http.server
+import json
+import os
+import threading
+
+import pytest
+
+import http_downloader
+from conftest import DATA
+from grib_stream import GribStreamVerifier, verify_file
+from http_downloader import DownloadError, download
+
+SAMPLE = os.path.join(DATA, "era52arl_sample", "pressure.grib")
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        data = server.data
+        first, _, last = self.headers["Range"].split("=", 1)[1].partition("-")
+        start, end = int(first), int(last) if last else len(data) - 1
+        server.ranges.append((start, end))
+        if any(lo <= start <= hi for lo, hi in server.fail):
+            self.send_error(503)
+            return
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        # 在 cuts 中的请求只发送一部分就断开（每个只断一次）| Requests in cuts are cut off partway (once each)
+        cut = server.cuts.pop(start, None)
+        self.wfile.write(data[start:end + 1] if cut is None else data[start:start + cut])
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # 较小的数据块，使样本分成 4 段，每段多个数据块 | Small chunks, so the sample splits into 4 segments of several chunks
+    monkeypatch.setattr(http_downloader, "CHUNK_SIZE", 4096)
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    with open(SAMPLE, "rb") as f:
+        srv.data = f.read()
+    srv.ranges, srv.cuts, srv.fail = [], {}, []
+    srv.url = f"http://127.0.0.1:{srv.server_port}/pressure.grib"
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def segment_starts(size, segments=4):
+    return [seg["start"] for seg in http_downloader._split(size, segments)]
+
+
+def test_multi_range_download(server, tmp_path):
+    path = str(tmp_path / "pressure.grib")
+    verifier = GribStreamVerifier()
+    assert download(server.url, path, verifier=verifier) == len(server.data)
+    with open(path, "rb") as f:
+        assert f.read() == server.data
+    assert verifier.messages == verify_file(SAMPLE)
+    assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.state")
+    # 探测请求之后每段一个请求 | One request per segment after the probe
+    assert sorted(start for start, _ in server.ranges[1:]) == segment_starts(len(server.data))
+
+
+def test_interrupted_segment_resumes_from_its_offset(server, tmp_path):
+    path = str(tmp_path / "pressure.grib")
+    start = segment_starts(len(server.data))[1]
+    server.cuts[start] = 10000
+    verifier = GribStreamVerifier()
+    download(server.url, path, verifier=verifier)
+    with open(path, "rb") as f:
+        assert f.read() == server.data
+    assert verifier.messages == verify_file(SAMPLE)
+    # 断开后从已写入的位置继续，而不是从段首重新开始 | Resumed where the writes stopped, not from the segment start
+    assert [s for s, _ in server.ranges if start < s < start + 12288] == [start + 10000]
+
+
+def test_resume_from_state_file(server, tmp_path):
+    path = str(tmp_path / "pressure.grib")
+    size = len(server.data)
+    starts = segment_starts(size)
+    server.cuts[starts[2]] = 10000
+    server.fail.append((starts[2] + 1, starts[3] - 1))
+    with pytest.raises(DownloadError):
+        download(server.url, path, retries=0, verifier=GribStreamVerifier())
+    assert not os.path.exists(path)
+
+    # .part.state 记录的每段进度都已经在 .part 中 | Every segment's progress in .part.state is already in .part
+    with open(path + ".part.state") as f:
+        segments = json.load(f)["segments"]
+    with open(path + ".part", "rb") as f:
+        part = f.read()
+    for seg in segments:
+        assert part[seg["start"]:seg["start"] + seg["done"]] == server.data[seg["start"]:seg["start"] + seg["done"]]
+    assert [seg["done"] == seg["end"] - seg["start"] + 1 for seg in segments] == [True, True, False, True]
+    assert segments[2]["done"] == 10000
+
+    # 第二次只请求缺少的部分 | The second run requests only what is missing
+    server.fail.clear()
+    server.ranges.clear()
+    verifier = GribStreamVerifier()
+    assert download(server.url, path, verifier=verifier) == size
+    assert server.ranges[1:] == [(starts[2] + 10000, starts[3] - 1)]
+    with open(path, "rb") as f:
+        assert f.read() == server.data
+    assert verifier.messages == verify_file(SAMPLE)
@@ -0,0 +1,71 @@
+"""
+request_planner.py 的分块划分 | Chunking in request_planner.py
+"""
+
+import calendar
+
+import pytest
+
+from era5_download import PRODUCTS
+from request_planner import (covering_file, estimate_bytes, grid_points, plan_month, plan_row, read_plan,
+                             surface_for, write_plan)
+
+PRESSURE = PRODUCTS["pressure"]["request"]
+SINGLE = PRODUCTS["single"]["request"]
+TARGET = 3200e6
+
+
+def day_numbers(parts):
+    return [(part, int(days[0]), int(days[-1])) for part, days in parts]
+
+
+def test_estimate():
+    assert grid_points([90, -25, 0, 180]) == 361 * 821
+    assert grid_points([30, 100, 25, 106], (1.0, 1.0)) == 6 * 7
+    # 7 个变量 × 19 层 × 4 个时次，每个场 16 位加消息头 | 7 variables × 19 levels × 4 times, 16 bits per value plus header
+    assert estimate_bytes(PRESSURE) == 7 * 19 * 4 * (361 * 821 * 2 + 200)
+    assert estimate_bytes(SINGLE, 31) == 4 * 4 * 31 * (361 * 821 * 2 + 200)
+
+
+@pytest.mark.parametrize("year, month, last", [(1950, 1, 31), (1950, 4, 30), (2000, 2, 29), (1999, 2, 28)])
+def test_pressure_keeps_the_old_ten_day_split(year, month, last):
+    assert day_numbers(plan_month(year, month, PRESSURE, TARGET)) == [(1, 1, 10), (2, 11, 20), (3, 21, last)]
+
+
+def test_single_levels_come_in_one_request_per_month():
+    assert day_numbers(plan_month(1950, 1, SINGLE, TARGET)) == [(1, 1, 31)]
+    assert day_numbers(plan_month(2000, 2, SINGLE, TARGET)) == [(1, 1, 29)]
+
+
+@pytest.mark.parametrize("target_days", [0.5, 1, 3, 7, 10, 15, 16, 20, 40])
+@pytest.mark.parametrize("month", [1, 2, 4])
+def test_chunks_cover_the_month_once(target_days, month):
+    parts = plan_month(2001, month, PRESSURE, estimate_bytes(PRESSURE) * target_days)
+    days = [int(day) for _, chunk in parts for day in chunk]
+    assert days == list(range(1, calendar.monthrange(2001, month)[1] + 1))
+    assert [part for part, _ in parts] == list(range(1, len(parts) + 1))
+    size = max(1, min(int(target_days), len(days)))
+    # 除最后一块外都是 size 天，最后一块包含剩余天数 | Every chunk but the last holds size days; the last takes the rest
+    assert all(len(chunk) == size for _, chunk in parts[:-1])
+    assert len(parts) == max(1, int(len(days) / size + 0.5))
+
+
+def test_plan_round_trip_and_surface_lookup(tmp_path):
+    path = str(tmp_path / "chunk_plan.csv")
+    rows = [plan_row(f"north_6h_pressure_1950_01_p{part}.grib", "pressure", 1950, 1, part, days, PRESSURE)
+            for part, days in plan_month(1950, 1, PRESSURE, TARGET)]
+    rows += [plan_row("north_6h_single_1950_01_p1.grib", "single", 1950, 1, 1, days, SINGLE)
+             for _, days in plan_month(1950, 1, SINGLE, TARGET)]
+    write_plan(path, rows[:2])
+    write_plan(path, rows[1:])
+    plan = read_plan(path)
+    assert sorted(plan, key=lambda r: r["filename"]) == sorted(rows, key=lambda r: r["filename"])
+
+    # 三个气压层分块都由同一个整月的地面文件覆盖 | All three pressure chunks are covered by the one whole-month surface file
+    for part in (1, 2, 3):
+        assert surface_for(plan, f"north_6h_pressure_1950_01_p{part}.grib") == "north_6h_single_1950_01_p1.grib"
+    assert covering_file(plan, "single", 1950, 1, 21, 31) == "north_6h_single_1950_01_p1.grib"
+    assert covering_file(plan, "pressure", 1950, 1, 5, 15) is None
+    # 计划中没有的分块按同名规则 | Chunks missing from the plan fall back to the same-name rule
+    assert surface_for(plan, "north_6h_pressure_1950_02_p2.grib") == "north_6h_single_1950_02_p2.grib"
+    assert read_plan(str(tmp_path / "missing.csv")) == []
@@ -0,0 +1,129 @@
+"""
+task_ledger.py 的状态机 | The task_ledger.py state machine
+"""
+
+import itertools
+import types
+
+import pytest
+
+import task_ledger
+from task_ledger import STATES, TRANSITIONS, LedgerError, TaskLedger, parse_filename
+
+PRESSURE = "north_6h_pressure_1950_01_p1.grib"
+SINGLE = "north_6h_single_1950_01_p1.grib"
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = TaskLedger(str(tmp_path / "ledger.sqlite"))
+    yield ledger
+    ledger.close()
+
+
+def walk(ledger, filename, *states):
+    for state in states:
+        ledger.set_state(filename, state)
+
+
+def test_transition_table_covers_every_state():
+    assert set(TRANSITIONS) == {None, *STATES}
+    for targets in TRANSITIONS.values():
+        assert targets <= set(STATES)
+    # consumed 是终态；其余任何状态都可以转为 failed | consumed is final; every other state may fail
+    assert TRANSITIONS["consumed"] == {"consumed"}
+    assert all("failed" in targets for state, targets in TRANSITIONS.items() if state != "consumed")
+
+
+def test_happy_path_records_timestamps_and_fields(ledger):
+    walk(ledger, PRESSURE, "submitted")
+    ledger.set_state(PRESSURE, "ready", url="https://example/1", dataset="reanalysis-era5-pressure-levels",
+                     request={"year": ["1950"], "month": ["01"]})
+    walk(ledger, PRESSURE, "downloading")
+    ledger.set_state(PRESSURE, "verified", bytes=123, messages=4)
+    walk(ledger, PRESSURE, "converted", "consumed")
+    row = ledger.get(PRESSURE)
+    assert row["state"] == "consumed"
+    assert (row["product"], row["chunk"]) == ("pressure", "1950_01_p1")
+    assert (row["url"], row["bytes"], row["messages"]) == ("https://example/1", 123, 4)
+    assert row["request"] == '{"month": ["01"], "year": ["1950"]}'
+    assert row["url_at"] == row["ready_at"]
+    for state in ("submitted", "ready", "downloading", "verified", "converted", "consumed"):
+        assert row[f"{state}_at"] is not None
+
+
+@pytest.mark.parametrize("current, target", [
+    (state, target) for state in STATES for target in STATES if target not in TRANSITIONS[state]])
+def test_illegal_transitions_raise_and_leave_the_row(ledger, current, target):
+    paths = {
+        "submitted": ["submitted"], "ready": ["ready"], "downloading": ["downloading"],
+        "verified": ["downloading", "verified"], "converted": ["converted"],
+        "consumed": ["converted", "consumed"], "failed": ["failed"],
+    }
+    walk(ledger, PRESSURE, *paths[current])
+    with pytest.raises(LedgerError, match=f"illegal transition {current} -> {target}"):
+        ledger.set_state(PRESSURE, target)
+    assert ledger.state(PRESSURE) == current
+
+
+def test_failed_keeps_error_until_the_next_state(ledger):
+    walk(ledger, PRESSURE, "downloading")
+    ledger.set_state(PRESSURE, "failed", error="incomplete inventory: 1 missing")
+    assert ledger.get(PRESSURE)["error"] == "incomplete inventory: 1 missing"
+    walk(ledger, PRESSURE, "submitted")
+    assert ledger.get(PRESSURE)["error"] is None
+
+
+def test_unknown_state_and_fields(ledger):
+    with pytest.raises(LedgerError, match="unknown state"):
+        ledger.set_state(PRESSURE, "done")
+    with pytest.raises(LedgerError, match="unknown fields"):
+        ledger.set_state(PRESSURE, "ready", link="https://example/1")
+    assert ledger.get(PRESSURE) is None
+
+
+def test_url_at_changes_only_with_a_new_url(ledger, monkeypatch):
+    # 每次更新时间加一秒 | Each update one second later
+    monkeypatch.setattr(task_ledger, "time", types.SimpleNamespace(time=itertools.count(1000).__next__))
+    ledger.set_state(PRESSURE, "ready", url="https://example/1")
+    issued = ledger.get(PRESSURE)["url_at"]
+    ledger.set_state(PRESSURE, "downloading", url="https://example/1")
+    assert ledger.get(PRESSURE)["url_at"] == issued
+    ledger.set_state(PRESSURE, "submitted")
+    ledger.set_state(PRESSURE, "ready", url="https://example/2")
+    assert ledger.get(PRESSURE)["url_at"] == issued + 3
+
+
+def test_set_chunk_state_is_all_or_nothing(ledger):
+    walk(ledger, PRESSURE, "converted")
+    walk(ledger, SINGLE, "downloading")
+    # 地面文件还不能转为 consumed，整个分块保持不变 | The surface file cannot be consumed yet, so the chunk is unchanged
+    with pytest.raises(LedgerError):
+        ledger.set_chunk_state("1950_01_p1", "consumed")
+    assert (ledger.state(PRESSURE), ledger.state(SINGLE)) == ("converted", "downloading")
+    walk(ledger, SINGLE, "converted")
+    assert ledger.set_chunk_state("1950_01_p1", "consumed") == 2
+    assert [row["state"] for row in ledger.chunk_rows("1950_01_p1")] == ["consumed", "consumed"]
+    with pytest.raises(LedgerError, match="no ledger rows"):
+        ledger.set_chunk_state("1950_02_p1", "consumed")
+
+
+def test_import_legacy(ledger, tmp_path):
+    (tmp_path / PRESSURE).write_bytes(b"GRIB")
+    legacy = tmp_path / "submitted_tasks.txt"
+    legacy.write_text(f"{PRESSURE} | https://example/1\n{SINGLE} | https://example/2\n"
+                      "north_6h_single_1950_01_p2.grib\n")
+    walk(ledger, SINGLE, "converted")
+    assert ledger.import_legacy(str(legacy)) == 2
+    row = ledger.get(PRESSURE)
+    assert (row["state"], row["url"], row["bytes"]) == ("downloading", "https://example/1", 4)
+    # 已在台账中的文件不变 | Files already in the ledger are left alone
+    assert ledger.state(SINGLE) == "converted"
+    assert ledger.state("north_6h_single_1950_01_p2.grib") == "submitted"
+    assert ledger.import_legacy(str(tmp_path / "missing.txt")) == 0
+
+
+def test_parse_filename():
+    assert parse_filename(PRESSURE) == ("pressure", "1950_01_p1")
+    assert parse_filename("/mnt/g/" + SINGLE) == ("single", "1950_01_p1")
+    assert parse_filename("north_6h_1950_01_p1.arl") == (None, None)
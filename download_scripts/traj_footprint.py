@@ -0,0 +1,169 @@
+"""
+traj_footprint.py – 按已有轨迹的实际覆盖范围缩小每个月的下载区域
+Shrink each month's download area to the footprint the existing trajectories actually reach
+
+base_request 的区域固定为 [90, -25, 0, 180]，但从汉江十个起始点出发的 240 小时后向轨迹
+在多数月份只经过其中一部分。本工具读取轨迹存档，按轨迹点所在的月份（1–12 月，跨所有年份）
+统计实际到达的经纬度范围，加上安全边距并向外对齐到 0.25° 网格，写出 footprint_areas.csv。
+The base_request area is fixed at [90, -25, 0, 180], but the 240 h back
+trajectories from the ten Han River start points only cross part of it in
+most months. This tool reads the trajectory archive, collects the lat/lon
+range actually reached per calendar month (1–12, across all years, by the
+month each point falls in), adds a safety margin, snaps outward to the 0.25°
+grid and writes footprint_areas.csv.
+
+下载引擎在数据目录中找到 footprint_areas.csv 时，按月使用其中的区域下载气压层和地面数据，
+GRIB 文件、ARL 文件和 HYSPLIT 读取的数据量一起减少。轨迹到达原区域边界（在那里被截断）的一侧
+保留原边界。era52arl 按 GRIB 网格自动生成 arldata.cfg；--arldata-template 会为每个月写出
+相同格式的 arldata_MM.cfg，便于在下载前核对网格。
+When the download engine finds footprint_areas.csv in the data folder it
+downloads both products with that month's area, so GRIB files, ARL files and
+HYSPLIT met reads all shrink together. A side where trajectories reached the
+original boundary (and were cut off there) keeps the original boundary.
+era52arl derives arldata.cfg from the GRIB grid by itself; --arldata-template
+writes an arldata_MM.cfg of the same format per month for checking the grid
+before downloading.
+
+命令行 | Command line:
+    python traj_footprint.py G:\\traj --output F:\\ERA5_pressure_level --margin 5
+    python traj_footprint.py G:\\traj --output F:\\ERA5_pressure_level --arldata-template ..\\convert_era52arl\\arldata.cfg
+"""
+
+import argparse
+import csv
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from met_config import write_arldata
+from request_planner import grid_points
+from trajectory_archive import archive_files, read_tdump
+
+AREAS_NAME = "footprint_areas.csv"
+AREA_FIELDS = ["month", "north", "west", "south", "east", "points"]
+
+
+def file_extents(path):
+    """
+    一个轨迹文件中各月份的范围 → {月: [最南, 最北, 最西, 最东, 点数]}
+    Extent per month of one trajectory file → {month: [south, north, west, east, points]}
+    """
+    extents = {}
+    for p in read_tdump(path):
+        e = extents.get(p.time.month)
+        if e is None:
+            extents[p.time.month] = [p.lat, p.lat, p.lon, p.lon, 1]
+        else:
+            e[0], e[1] = min(e[0], p.lat), max(e[1], p.lat)
+            e[2], e[3] = min(e[2], p.lon), max(e[3], p.lon)
+            e[4] += 1
+    return extents
+
+
+def month_extents(paths, workers=None):
+    """
+    并行读取全部轨迹文件并合并各月份的范围
+    Read every trajectory file in parallel and merge the extents per month
+    """
+    merged = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for extents in pool.map(file_extents, paths, chunksize=64):
+            for month, (s, n, w, e, count) in extents.items():
+                m = merged.get(month)
+                if m is None:
+                    merged[month] = [s, n, w, e, count]
+                else:
+                    merged[month] = [min(m[0], s), max(m[1], n), min(m[2], w), max(m[3], e), m[4] + count]
+    return merged
+
+
+def footprint_area(extent, base_area, margin=5.0, grid=0.25):
+    """
+    范围加边距后向外对齐到网格，并限制在 base_area 内 → [北, 西, 南, 东]；
+    轨迹到达 base_area 边界的一侧保留原边界
+    Extent plus margin, snapped outward to the grid and clipped to base_area →
+    [north, west, south, east]; a side the trajectories reached keeps the base boundary
+    """
+    south, north, west, east = extent[:4]
+    b_north, b_west, b_south, b_east = (float(v) for v in base_area)
+    sides = []
+    for value, bound, sign in ((north, b_north, 1), (west, b_west, -1), (south, b_south, -1), (east, b_east, 1)):
+        if abs(value - bound) <= grid:
+            sides.append(bound)
+            continue
+        edge = value + sign * margin
+        edge = (math.ceil(edge / grid) if sign > 0 else math.floor(edge / grid)) * grid
+        sides.append(min(edge, bound) if sign > 0 else max(edge, bound))
+    return sides
+
+
+def read_areas(path):
+    """
+    footprint_areas.csv → {月: [北, 西, 南, 东]}
+    footprint_areas.csv → {month: [north, west, south, east]}
+    """
+    with open(path, "r", newline="") as f:
+        return {int(row["month"]): [float(row[k]) for k in ("north", "west", "south", "east")]
+                for row in csv.DictReader(f)}
+
+
+def write_areas(path, areas, points):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=AREA_FIELDS)
+        writer.writeheader()
+        for month in sorted(areas):
+            north, west, south, east = areas[month]
+            writer.writerow({"month": month, "north": north, "west": west, "south": south, "east": east,
+                             "points": points.get(month, 0)})
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    from era5_download import PRODUCTS
+
+    ap = argparse.ArgumentParser(description="按轨迹覆盖范围确定每月下载区域 | Per-month download area from the trajectory footprint")
+    ap.add_argument("traj_root", help="轨迹存档目录（如 G:\\traj）| trajectory archive folder (e.g. G:\\traj)")
+    ap.add_argument("--output", required=True, help=f"数据目录，写出 {AREAS_NAME} | data folder to write {AREAS_NAME} to")
+    ap.add_argument("--pattern", default="*", help="轨迹文件名模式 | trajectory filename pattern")
+    ap.add_argument("--margin", type=float, default=5.0, help="安全边距（度）| safety margin (degrees)")
+    ap.add_argument("--grid", type=float, default=0.25, help="网格间距（度）| grid spacing (degrees)")
+    ap.add_argument("--workers", type=int, default=None, help="并行进程数 | worker processes")
+    ap.add_argument("--arldata-template", help="写出每月 arldata_MM.cfg 所用的模板 | template for the per-month arldata_MM.cfg")
+    args = ap.parse_args(argv)
+
+    paths = archive_files(args.traj_root, args.pattern)
+    if not paths:
+        sys.exit(f"❌ 没有轨迹文件：{args.traj_root}")
+    print(f"读取 {len(paths)} 个轨迹文件……")
+    print(f"Reading {len(paths)} trajectory files...")
+    extents = month_extents(paths, args.workers)
+    if not extents:
+        sys.exit("❌ 轨迹文件中没有轨迹点。No trajectory points in the archive.")
+
+    base_area = PRODUCTS["pressure"]["request"]["area"]
+    base_points = grid_points(base_area, (args.grid, args.grid))
+    areas = {month: footprint_area(extent, base_area, args.margin, args.grid) for month, extent in extents.items()}
+    points = {month: extent[4] for month, extent in extents.items()}
+
+    os.makedirs(args.output, exist_ok=True)
+    write_areas(os.path.join(args.output, AREAS_NAME), areas, points)
+    print(f"\n{'month':>5s} {'north':>7s} {'west':>8s} {'south':>7s} {'east':>8s} {'points':>10s} {'grid':>7s}")
+    for month in sorted(areas):
+        north, west, south, east = areas[month]
+        share = grid_points(areas[month], (args.grid, args.grid)) / base_points
+        print(f"{month:5d} {north:7.2f} {west:8.2f} {south:7.2f} {east:8.2f} {points[month]:10d} {share:7.1%}")
+        if args.arldata_template:
+            write_arldata(os.path.join(args.output, f"arldata_{month:02d}.cfg"), args.arldata_template,
+                          areas[month], args.grid)
+    missing = sorted(set(range(1, 13)) - set(areas))
+    if missing:
+        print(f"没有轨迹的月份使用原区域：{missing}")
+        print(f"Months without trajectories keep the original area: {missing}")
+    print(f"\n✔ 已写出 {os.path.join(args.output, AREAS_NAME)}")
+    print(f"✔ Wrote {os.path.join(args.output, AREAS_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
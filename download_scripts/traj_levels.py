@@ -0,0 +1,161 @@
+"""
+traj_levels.py – 按轨迹实际经过的气压裁剪下载和转换的气压层
+Prune the downloaded and converted pressure levels to the pressures trajectories actually visit
+
+产品表下载 19 个气压层（直到 1 hPa，era52arl.cfg 的 plev，arldata.cfg 的 Numb Levels: 20），
+但 tdump 的 PRESSURE 列显示轨迹几乎不会高于几百 hPa（CONTROL 中的模式顶为 10000 m）。
+本工具统计轨迹存档中轨迹点所在气压的分布（按 ERA5 相邻层之间的层段），从地面向上保留各层，
+直到高于最高层的轨迹点比例不超过 --budget，再多保留 --headroom 层作为垂直插值的上边界。
+The product table downloads 19 pressure levels up to 1 hPa (plev in
+era52arl.cfg, Numb Levels: 20 in arldata.cfg), but the PRESSURE column of the
+tdump files shows trajectories hardly ever rise above a few hundred hPa (the
+CONTROL model top is 10000 m). This tool builds the histogram of visited
+pressures across the trajectory archive (per layer between adjacent ERA5
+levels), keeps levels from the surface upwards until the share of points
+above the top level is within --budget, and keeps --headroom more levels as
+the upper bound for vertical interpolation.
+
+结果写入数据目录：
+Results go to the data folder:
+    pressure_levels.txt   下载引擎使用的气压层 | the levels the download engine requests
+    era52arl.cfg          相同层次的转换配置（转换时优先于 era52arl 目录中的配置）
+                          | conversion settings with the same levels (used ahead of the one in the era52arl folder)
+    arldata.cfg           相同层次的 ARL 结构，供核对 | ARL layout with the same levels, for checking
+
+已下载的完整层次 GRIB 用新的 era52arl.cfg 转换时只会写出保留的层次。
+Full-level GRIB files already downloaded only get the kept levels written when
+converted with the new era52arl.cfg.
+
+命令行 | Command line:
+    python traj_levels.py G:\\traj --output F:\\ERA5_pressure_level --era52arl-dir ..\\convert_era52arl --budget 0.001
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from met_config import write_arldata, write_era52arl
+from trajectory_archive import archive_files, read_tdump
+
+LEVELS_NAME = "pressure_levels.txt"
+
+
+def file_pressures(path):
+    """
+    一个轨迹文件中轨迹点气压的计数（取整到 hPa）
+    Counts of trajectory-point pressures in one file (rounded to hPa)
+    """
+    return Counter(round(p.pressure) for p in read_tdump(path) if p.pressure is not None)
+
+
+def pressure_histogram(paths, workers=None):
+    total = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for counts in pool.map(file_pressures, paths, chunksize=64):
+            total.update(counts)
+    return total
+
+
+def layer_counts(histogram, levels):
+    """
+    按层段统计轨迹点：levels 从地面向上排列，第 i 段为 (levels[i+1], levels[i]]，
+    高于最高层的点计入最后一段 (0, levels[-1]]，低于最低层的点计入第一段
+    Points per layer: levels run from the surface upwards, layer i is
+    (levels[i+1], levels[i]] and points above the top level fall in the last
+    layer (0, levels[-1]]; the first layer also takes points below the lowest level
+    """
+    counts = [0] * len(levels)
+    for pressure, n in histogram.items():
+        i = 0
+        while i + 1 < len(levels) and pressure <= levels[i + 1]:
+            i += 1
+        counts[i] += n
+    return counts
+
+
+def select_levels(histogram, levels, budget=0.001, headroom=1):
+    """
+    从地面向上的最少层数，使高于最高层的轨迹点比例 ≤ budget，再加 headroom 层
+    The fewest levels from the surface upwards that leave at most budget of
+    the points above the top level, plus headroom levels
+    """
+    levels = sorted(levels, reverse=True)
+    total = sum(histogram.values())
+    if not total:
+        return levels
+    for top in range(len(levels)):
+        above = sum(n for pressure, n in histogram.items() if pressure < levels[top])
+        if above / total <= budget:
+            return levels[:min(len(levels), top + 1 + headroom)]
+    return levels
+
+
+def read_levels(path):
+    """
+    pressure_levels.txt → ["1000", "950", ...]（与 base_request 的 pressure_level 相同的写法）
+    pressure_levels.txt → ["1000", "950", ...] (written like pressure_level in base_request)
+    """
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_levels(path, levels):
+    with open(path, "w") as f:
+        f.writelines(f"{p:g}\n" for p in levels)
+
+
+def main(argv=None):
+    from era5_download import PRODUCTS
+
+    ap = argparse.ArgumentParser(description="按轨迹气压裁剪气压层 | Prune pressure levels to the trajectory pressures")
+    ap.add_argument("traj_root", help="轨迹存档目录（如 G:\\traj）| trajectory archive folder (e.g. G:\\traj)")
+    ap.add_argument("--output", required=True, help="数据目录 | data folder")
+    ap.add_argument("--era52arl-dir", required=True, help="era52arl.cfg / arldata.cfg 模板所在目录 | folder with the era52arl.cfg / arldata.cfg templates")
+    ap.add_argument("--pattern", default="*", help="轨迹文件名模式 | trajectory filename pattern")
+    ap.add_argument("--budget", type=float, default=0.001, help="允许高于最高层的轨迹点比例 | share of points allowed above the top level")
+    ap.add_argument("--headroom", type=int, default=1, help="最高轨迹层以上多保留的层数 | extra levels kept above the highest one reached")
+    ap.add_argument("--workers", type=int, default=None, help="并行进程数 | worker processes")
+    ap.add_argument("--dry-run", action="store_true", help="只打印统计和建议 | print the histogram and proposal only")
+    args = ap.parse_args(argv)
+
+    paths = archive_files(args.traj_root, args.pattern)
+    if not paths:
+        sys.exit(f"❌ 没有轨迹文件：{args.traj_root}")
+    print(f"读取 {len(paths)} 个轨迹文件……")
+    print(f"Reading {len(paths)} trajectory files...")
+    histogram = pressure_histogram(paths, args.workers)
+    total = sum(histogram.values())
+    if not total:
+        sys.exit("❌ 轨迹文件中没有 PRESSURE 列。No PRESSURE column in the trajectory files.")
+
+    levels = sorted((float(p) for p in PRODUCTS["pressure"]["request"]["pressure_level"]), reverse=True)
+    counts = layer_counts(histogram, levels)
+    print(f"\n{'layer_hPa':>14s} {'points':>12s} {'share':>8s} {'above':>8s}")
+    above = total
+    for i, level in enumerate(levels):
+        upper = levels[i + 1] if i + 1 < len(levels) else 0
+        above -= counts[i]
+        print(f"{f'{upper:g}-{level:g}':>14s} {counts[i]:12d} {counts[i] / total:8.2%} {above / total:8.2%}")
+    print(f"气压范围 | pressure range: {min(histogram)}–{max(histogram)} hPa, {total} points")
+
+    keep = select_levels(histogram, levels, args.budget, args.headroom)
+    share = len(keep) / len(levels)
+    print(f"\n保留 {len(keep)}/{len(levels)} 层：{', '.join(f'{p:g}' for p in keep)}")
+    print(f"Keeping {len(keep)}/{len(levels)} levels: {', '.join(f'{p:g}' for p in keep)} "
+          f"(download/convert/read volume ≈ {share:.0%})")
+    if args.dry_run:
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    write_levels(os.path.join(args.output, LEVELS_NAME), keep)
+    write_era52arl(os.path.join(args.output, "era52arl.cfg"), os.path.join(args.era52arl_dir, "era52arl.cfg"), keep)
+    write_arldata(os.path.join(args.output, "arldata.cfg"), os.path.join(args.era52arl_dir, "arldata.cfg"),
+                  pressure_levels=keep)
+    for name in (LEVELS_NAME, "era52arl.cfg", "arldata.cfg"):
+        print(f"✔ {os.path.join(args.output, name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+trajectory_archive.py – 读取 HYSPLIT 轨迹输出（tdump）
+Reader for HYSPLIT trajectory output (tdump)
+
+batch_hysplit_new.ps1 把每个起始时刻的 10 条后向轨迹写入 <TRAJ_BASE_DIR>\\<年>\\shitYYMMDDHH。
+文件头依次为：气象网格数及各网格行、"N BACKWARD OMEGA" 行、N 个起始点行、诊断变量标签行
+（如 "1 PRESSURE"），之后每行一个轨迹点：
+batch_hysplit_new.ps1 writes the 10 back-trajectories of every start time to
+<TRAJ_BASE_DIR>\\<year>\\shitYYMMDDHH. The header holds the number of met grids
+and one line per grid, the "N BACKWARD OMEGA" line, N start-point lines and
+the diagnostic label line (e.g. "1 PRESSURE"); after it, one trajectory point
+per line:
+    轨迹号 网格号 年 月 日 时 分 预报时 时长 纬度 经度 高度 诊断变量...
+    traj grid yy mm dd hh min fcst age lat lon height diagnostics...
+"""
+
+import datetime
+import fnmatch
+import os
+from collections import namedtuple
+
+Point = namedtuple("Point", "traj time lat lon height pressure")
+
+
+def _year(yy):
+    # tdump 只写两位年份；ERA5 从 1940 年开始
+    # tdump only writes two-digit years; ERA5 starts in 1940
+    return 1900 + yy if yy >= 40 else 2000 + yy
+
+
+def read_tdump(path):
+    """
+    返回文件中全部轨迹点；不是 tdump 格式的文件返回空列表
+    Return every trajectory point of a file; a file that is not a tdump gives an empty list
+    """
+    with open(path, "r", errors="ignore") as f:
+        lines = f.readlines()
+    try:
+        ngrids = int(lines[0].split()[0])
+        omega = 1 + ngrids
+        if "BACKWARD" not in lines[omega] and "FORWARD" not in lines[omega]:
+            return []
+        label = omega + 1 + int(lines[omega].split()[0])
+        names = lines[label].split()[1:]
+    except (IndexError, ValueError):
+        return []
+    pressure_col = 12 + names.index("PRESSURE") if "PRESSURE" in names else None
+
+    points = []
+    for line in lines[label + 1:]:
+        cols = line.split()
+        if len(cols) < 12:
+            continue
+        try:
+            time = datetime.datetime(_year(int(cols[2])), int(cols[3]), int(cols[4]), int(cols[5]), int(cols[6]))
+            pressure = float(cols[pressure_col]) if pressure_col is not None and len(cols) > pressure_col else None
+            points.append(Point(int(cols[0]), time, float(cols[9]), float(cols[10]), float(cols[11]), pressure))
+        except ValueError:
+            continue   # 写入中断的行 | line cut off by an interrupted run
+    return points
+
+
+def archive_files(root, pattern="*"):
+    """
+    递归列出 root 下文件名匹配 pattern 的轨迹文件（按路径排序）
+    List trajectory files under root whose names match pattern, recursively (sorted by path)
+    """
+    found = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if fnmatch.fnmatch(name, pattern):
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)